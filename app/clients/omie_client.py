@@ -1,14 +1,89 @@
 import requests
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.clients.records import parse_omie_products
+from app.clients.transport import get_transport
+from app.core.change_detection import ChangeDetector
+from app.mappings.mapping import map_product_update
+from app.utils.logger import get_logger
+from app.utils.metrics import get_metrics
+from app.utils.rate_limiter import TokenBucket
+
+LIST_PAGE_SIZE = 500
+# IncluirProduto timeout in seconds (connect and read)
+INSERT_TIMEOUT = 30
+# Fields UpsertProdutosLote requires on every record, updates included
+UPSERT_REQUIRED_FIELDS = ("codigo", "codigo_produto_integracao", "descricao", "unidade", "ncm")
+
+logger = get_logger(__name__)
+metrics = get_metrics()
+
+
+class OmieListingError(Exception):
+    """Raised when the OMIE catalog could not be listed completely."""
+
+    def __init__(self, message, failed_pages=None, blocked=False):
+        super().__init__(message)
+        self.failed_pages = failed_pages or []
+        self.blocked = blocked
+
+
+def call_outcome(result) -> str:
+    """Metrics label for the result (or raised exception) of an OMIE call."""
+    if result is None:
+        # A lot OMIE rejected as a whole (see `OmieClient._send_lot`)
+        return "error"
+    if isinstance(result, list):
+        # A lot reports its worst item
+        outcomes = {call_outcome(item) for item in result}
+        for outcome in ("rate_limited", "server_error", "timeout", "error", "skipped"):
+            if outcome in outcomes:
+                return outcome
+        return "success"
+    if isinstance(result, OmieListingError):
+        return "rate_limited" if result.blocked else "error"
+    if isinstance(result, Exception):
+        return "error"
+    if isinstance(result, dict):
+        if result.get("available") is False:
+            return "rate_limited"
+        status = result.get("status")
+        if status in ("rate_limited", "skipped"):
+            return status
+        if status == "error":
+            return result.get("reason") if result.get("reason") in ("server_error", "timeout") else "error"
+        if "faultcode" in result:
+            return "error"
+    return "success"
+
+
+def report_to_governor(governor, result):
+    """Feeds a `RateGovernor` (if any) the outcome of one OMIE request and returns `result`.
+
+    A lot is a single request, so it counts once, with the outcome of its worst item.
+    """
+    if governor is not None:
+        outcome = call_outcome(result)
+        items = result if isinstance(result, list) else [result]
+        message = next((item.get("message") for item in items if isinstance(item, dict) and item.get("message")), None)
+        governor.record("ok" if outcome in ("success", "skipped") else outcome, message)
+    return result
+
 
 class OmieClient:
-    def __init__(self, app_key, app_secret):
+    def __init__(self, app_key, app_secret, transport=None):
         self.app_key = app_key
         self.app_secret = app_secret
         self.endpoint = "https://app.omie.com.br/api/v1/geral/produtos/"
+        self.transport = transport or get_transport()
     
+    @metrics.timed_call("check_api_status", call_outcome)
     def check_api_status(self):
-        """Quick check if the API is available (not rate limited)."""
+        """Quick check if the API is available (not rate limited).
+
+        `blocked` is True only when OMIE answered with its misuse block; a probe
+        that failed (timeout, connection error, ...) is just unavailable.
+        """
         payload = {
             "call": "ListarProdutos",
             "app_key": self.app_key,
@@ -16,67 +91,142 @@ class OmieClient:
             "param": [{"pagina": 1, "registros_por_pagina": 1}]
         }
         try:
-            response = requests.post(self.endpoint, json=payload, timeout=10)
+            response = self.transport.post(self.endpoint, json=payload, timeout=10)
             data = response.json()
             if data.get("faultcode") == "MISUSE_API_PROCESS":
                 # Extract wait time from message if available
                 message = data.get("faultstring", "")
-                return {"available": False, "message": message}
+                return {"available": False, "blocked": True, "message": message}
             return {"available": True}
         except Exception as e:
-            return {"available": False, "message": str(e)}
+            return {"available": False, "blocked": False, "message": str(e)}
 
-    def list_products(self):
-        all_products = []
-        page = 1
-
-        while True:
-            payload = {
-                "call": "ListarProdutos",
-                "app_key": self.app_key,
-                "app_secret": self.app_secret,
-                "param": [
-                    {
-                        "pagina": page,
-                        "registros_por_pagina": 500,
-                        "apenas_importado_api": "N",
-                        "filtrar_apenas_omiepdv": "N"
-                    }
-                ]
-            }
+    @metrics.timed_call("list_products_page", call_outcome)
+    def _fetch_page(self, page, filters=None, max_retries=3):
+        """Fetches a single ListarProdutos page, retrying transient failures.
+
+        Returns the decoded response, with an empty `produto_servico_cadastro` when
+        OMIE reports that there are no records. Raises `OmieListingError` when the
+        API is blocked or the page keeps failing.
+        """
+        param = {
+            "pagina": page,
+            "registros_por_pagina": LIST_PAGE_SIZE,
+            "apenas_importado_api": "N",
+            "filtrar_apenas_omiepdv": "N"
+        }
+        param.update(filters or {})
+        payload = {
+            "call": "ListarProdutos",
+            "app_key": self.app_key,
+            "app_secret": self.app_secret,
+            "param": [param]
+        }
 
+        last_error = None
+        for attempt in range(max_retries):
             try:
-                response = requests.post(self.endpoint, json=payload)
-                response.raise_for_status()
+                response = self.transport.post(self.endpoint, json=payload)
                 data = response.json()
 
                 if "faultcode" in data:
-                    print(f"❌ Erro ao listar produtos (página {page}): {data}")
-                    break
+                    fault = data.get("faultcode")
+                    message = data.get("faultstring", "")
+                    if fault == "MISUSE_API_PROCESS":
+                        raise OmieListingError(f"API bloqueada ao listar a página {page}: {message}", [page], blocked=True)
+                    if "Não existem registros" in message:
+                        return {"pagina": page, "total_de_paginas": 0, "produto_servico_cadastro": []}
+                    last_error = f"{fault}: {message}"
+                else:
+                    response.raise_for_status()
+                    return data
+            except OmieListingError:
+                raise
+            except Exception as e:
+                last_error = str(e)
 
-                # Check for product_list_result structure
-                produto_servico_cadastro = data.get("produto_servico_cadastro", [])
-                if not produto_servico_cadastro:
-                    break
+            if attempt < max_retries - 1:
+                metrics.note_retry()
+                wait_time = (attempt + 1) * 2
+                logger.warning(f"⚠️ Erro ao buscar a página {page} ({last_error}). Tentativa {attempt + 1}/{max_retries}. Aguardando {wait_time}s...")
+                time.sleep(wait_time)
 
-                all_products.extend(produto_servico_cadastro)
-                print(f"📄 Página {page}: {len(produto_servico_cadastro)} produtos carregados...")
-                
-                # Check if there are more pages
-                total_paginas = data.get("total_de_paginas", 0)
-                if page >= total_paginas:
-                    break
-                    
-                page += 1
-                time.sleep(0.5)  # Rate limit prevention
+        raise OmieListingError(f"Falha ao buscar a página {page} após {max_retries} tentativas: {last_error}", [page])
 
-            except Exception as e:
-                print(f"❌ Erro ao buscar produtos da página {page}: {e}")
-                break
+    def iter_product_pages(self, filters=None, workers=1, limiter=None, max_retries=3):
+        """Yields the products of each ListarProdutos page (as `OmieProduct` records) as soon as it arrives.
+
+        Page 1 is fetched first to learn `total_de_paginas`; the remaining pages are
+        fetched by up to `workers` threads, each request paced by `limiter`. Pages
+        that still fail after `max_retries` are collected and reported together by
+        raising `OmieListingError` once every other page has been yielded, so a
+        partial catalog is never mistaken for a complete one.
+        """
+        limiter = limiter or TokenBucket(rate=2)  # Same pace as the old 0.5s sleep between pages
+
+        limiter.acquire()
+        first = self._fetch_page(1, filters, max_retries)
+        total_paginas = first.get("total_de_paginas") or 0
+        produtos = first.get("produto_servico_cadastro", [])
+        if produtos:
+            logger.info(f"📄 Página 1/{total_paginas}: {len(produtos)} produtos carregados...")
+            yield parse_omie_products(produtos)
+        if total_paginas <= 1:
+            return
+
+        def _fetch(page):
+            limiter.acquire()
+            return self._fetch_page(page, filters, max_retries)
+
+        failed_pages = []
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {executor.submit(_fetch, page): page for page in range(2, total_paginas + 1)}
+            try:
+                for future in as_completed(futures):
+                    page = futures[future]
+                    try:
+                        data = future.result()
+                    except OmieListingError as e:
+                        if e.blocked:
+                            raise
+                        logger.error(f"❌ {e}")
+                        failed_pages.append(page)
+                        continue
+                    produtos = data.get("produto_servico_cadastro", [])
+                    logger.info(f"📄 Página {page}/{total_paginas}: {len(produtos)} produtos carregados...")
+                    if produtos:
+                        yield parse_omie_products(produtos)
+            finally:
+                for future in futures:
+                    future.cancel()
+
+        if failed_pages:
+            raise OmieListingError(
+                f"Listagem incompleta: {len(failed_pages)} de {total_paginas} páginas falharam",
+                sorted(failed_pages),
+            )
+
+    def list_products(self, filters=None, workers=1, limiter=None):
+        """Lists the OMIE catalog.
 
+        `filters` is merged into the ListarProdutos parameters, e.g.
+        `{"filtrar_por_data_de": "01/12/2025"}` to list only recently changed products.
+        Raises `OmieListingError` instead of returning a partial catalog.
+        """
+        all_products = []
+        for produtos in self.iter_product_pages(filters, workers=workers, limiter=limiter):
+            all_products.extend(produtos)
         return all_products
 
-    def insert_product(self, product_data, max_retries=3):
+    def insert_product(self, product_data, max_retries=3, governor=None):
+        """Creates one product through `IncluirProduto`.
+
+        `governor` (`app.core.rate_governor.RateGovernor`), when given, is fed the outcome of the call.
+        """
+        return report_to_governor(governor, self._incluir_produto(product_data, max_retries))
+
+    @metrics.timed_call("insert_product", call_outcome)
+    def _incluir_produto(self, product_data, max_retries=3):
         payload = {
             "call": "IncluirProduto",
             "app_key": self.app_key,
@@ -86,7 +236,7 @@ class OmieClient:
         
         for attempt in range(max_retries):
             try:
-                response = requests.post(self.endpoint, json=payload, timeout=30)
+                response = self.transport.post(self.endpoint, json=payload, timeout=INSERT_TIMEOUT)
                 data = response.json()
 
                 if "faultcode" in data:
@@ -95,112 +245,229 @@ class OmieClient:
                     
                     # Handle specific error types
                     if fault == "MISUSE_API_PROCESS":
-                        print("📬 OMIE Response:", data)
-                        print("⚠️ OMIE API bloqueada por rate limit.")
+                        logger.debug(f"📬 OMIE Response: {data}")
+                        logger.warning("⚠️ OMIE API bloqueada por rate limit.")
                         # Return a special status so the sync can save progress and exit gracefully
                         return {"status": "rate_limited", "reason": "api_blocked", "message": message}
                     elif fault == "SOAP-ENV:Client-102":
                         # Product already exists - this is expected, not an error
-                        print(f"⏭️ Produto já existe na OMIE (será pulado)")
+                        logger.debug(f"⏭️ Produto já existe na OMIE (será pulado)")
                         return {"status": "skipped", "reason": "already_exists", "message": message}
                     elif fault == "SOAP-ENV:Server":
                         # Server-side error - retry
                         if attempt < max_retries - 1:
+                            metrics.note_retry()
                             wait_time = (attempt + 1) * 2  # 2s, 4s, 6s
-                            print(f"⚠️ Erro temporário do servidor OMIE. Tentativa {attempt + 1}/{max_retries}. Aguardando {wait_time}s...")
+                            logger.warning(f"⚠️ Erro temporário do servidor OMIE. Tentativa {attempt + 1}/{max_retries}. Aguardando {wait_time}s...")
                             time.sleep(wait_time)
                             continue
                         else:
                             # Max retries reached - skip this product
-                            print(f"⚠️ Falha após {max_retries} tentativas. Pulando produto.")
+                            logger.warning(f"⚠️ Falha após {max_retries} tentativas. Pulando produto.")
                             return {"status": "error", "reason": "server_error", "message": message, "fault": fault}
                     else:
                         # Other client errors - skip and continue
-                        print(f"⚠️ Erro da OMIE ({fault}): {message}")
+                        logger.warning(f"⚠️ Erro da OMIE ({fault}): {message}")
                         return {"status": "error", "reason": "client_error", "message": message, "fault": fault}
 
                 return data
                 
             except requests.exceptions.Timeout:
                 if attempt < max_retries - 1:
+                    metrics.note_retry()
                     wait_time = (attempt + 1) * 2
-                    print(f"⏱️ Timeout ao conectar com OMIE. Tentativa {attempt + 1}/{max_retries}. Aguardando {wait_time}s...")
+                    logger.warning(f"⏱️ Timeout ao conectar com OMIE. Tentativa {attempt + 1}/{max_retries}. Aguardando {wait_time}s...")
                     time.sleep(wait_time)
                     continue
                 else:
-                    print(f"⚠️ Timeout após {max_retries} tentativas. Pulando produto.")
+                    logger.warning(f"⚠️ Timeout após {max_retries} tentativas. Pulando produto.")
                     return {"status": "error", "reason": "timeout", "message": "Request timeout"}
                     
             except Exception as e:
-                print(f"⚠️ Erro inesperado ao inserir produto: {e}")
+                logger.error(f"⚠️ Erro inesperado ao inserir produto: {e}")
                 return {"status": "error", "reason": "exception", "message": str(e)}
         
         return {"status": "error", "reason": "max_retries_exceeded"}
 
-    def atualizar_produtos_existentes(self, produtos: list):
-        for produto in produtos:
+    def upsert_products_batch(self, payloads, lot_size=50, max_retries=3, limiter=None, governor=None):
+        """Sends products in lots through `UpsertProdutosLote` (one HTTP call per lot).
+
+        Returns one result per payload, in the same order, following the
+        `insert_product` contract: a `{"status": ...}` dict for rate limits and
+        errors, or the OMIE response for products that went through. If OMIE
+        rejects a lot because of its content, the lot is retried item by item
+        with `insert_product` so that only the offending products fail;
+        `limiter`, when given, paces those individual calls. `governor`, when
+        given, is fed one outcome per request (per lot, or per individual call).
+        """
+        return self._send_lots(payloads, lot_size, max_retries, limiter, governor, self._insert_individually)
+
+    def update_products_batch(self, changes, lot_size=50, max_retries=3, limiter=None, governor=None):
+        """Updates existing products in lots through `UpsertProdutosLote`.
+
+        `changes` are records with the fields to change plus the ones the upsert
+        requires (`UPSERT_REQUIRED_FIELDS`); a lot missing them is rejected. Results follow `upsert_products_batch`, except that a rejected
+        lot is retried item by item with `AlterarProduto`, which can never
+        create a product; those results carry `"sent_individually": True`.
+        """
+        return self._send_lots(changes, lot_size, max_retries, limiter, governor, self._alter_individually)
+
+    def _send_lots(self, payloads, lot_size, max_retries, limiter, governor, fallback):
+        results = []
+        for start in range(0, len(payloads), lot_size):
+            lot = payloads[start:start + lot_size]
+            lote = start // lot_size + 1
+            results.extend(self._upsert_lot(lot, lote, max_retries, limiter, governor, fallback))
+            if results and results[-1].get("status") == "rate_limited":
+                # Blocked - report the remaining products without calling the API again
+                remaining = payloads[start + lot_size:]
+                results.extend(dict(results[-1]) for _ in remaining)
+                break
+        return results
+
+    def _upsert_lot(self, lot, lote, max_retries, limiter, governor, fallback):
+        results = self._send_lot(lot, lote, max_retries)
+        if results is None:
+            # The lot was rejected as a whole - find the bad products one by one
+            metrics.inc("omie_lots_sent_individually_total", help_text="Lots OMIE rejected and resent item by item")
+            return fallback(lot, limiter, governor)
+        return report_to_governor(governor, results)
+
+    @metrics.timed_call("upsert_products_batch", call_outcome)
+    def _send_lot(self, lot, lote, max_retries):
+        """One `UpsertProdutosLote` request (retrying transient failures): a result per
+        item, or None when OMIE rejected the content of the lot."""
+        payload = {
+            "call": "UpsertProdutosLote",
+            "app_key": self.app_key,
+            "app_secret": self.app_secret,
+            "param": [{"lote": lote, "produto_servico_cadastro": lot}],
+        }
+
+        for attempt in range(max_retries):
             try:
-                peso = round(float(produto.get("Peso") or 0) / 1000, 3)
-                altura = float(produto.get("Altura") or 0)
-                largura = float(produto.get("Largura") or 0)
-                profundidade = float(produto.get("Profundidade") or 0)
-                quantidade = int(produto.get("QuantidadeDisponivelEstoquePrincipal") or 0)
-                if quantidade < 0:
-                    quantidade = 0
-
-                custo_str = str(produto.get("PrecoVendaFormatado") or "0").replace(",", ".")
-                custo = float(custo_str)
-
-                if quantidade >= 1000:
-                    markup = 1.80
-                elif 500 <= quantidade < 1000:
-                    markup = 1.85
-                elif 250 <= quantidade < 500:
-                    markup = 1.90
-                elif 150 <= quantidade < 250:
-                    markup = 2.15
-                elif 50 <= quantidade < 150:
-                    markup = 2.22
-                else:
-                    markup = 2.32
-
-                novo_valor = round(custo * markup, 2)
-
-                # Construção condicional dos campos
-                param_data = {
-                    "codigo_produto_integracao": produto.get("CodigoComposto"),
-                    "valor_unitario": novo_valor,
-                    "peso_bruto": peso,
-                    "quantidade_estoque": quantidade
-                }
-                if altura > 0:
-                    param_data["altura"] = altura
-                if largura > 0:
-                    param_data["largura"] = largura
-                if profundidade > 0:
-                    param_data["profundidade"] = profundidade
-
-                payload = {
-                    "call": "AlterarProduto",
-                    "app_key": self.app_key,
-                    "app_secret": self.app_secret,
-                    "param": [param_data]
-                }
-
-                response = requests.post(self.endpoint, json=payload)
+                response = self.transport.post(self.endpoint, json=payload)
                 data = response.json()
 
                 if "faultcode" in data:
-                    print(f"⚠️ Falha ao atualizar {produto.get('CodigoComposto')}: {data}")
-                else:
-                    print(f"✅ Produto {produto.get('CodigoComposto')} atualizado com sucesso. Valor antigo: R$ {custo}. Valor novo: R$ {novo_valor}")
-                    print(
-                        f"📦 Altura: {altura}, Largura: {largura}, Profundidade: {profundidade}, Estoque: {quantidade}, Peso: {peso}")
+                    fault = data.get("faultcode")
+                    message = data.get("faultstring", "Erro desconhecido")
+
+                    if fault == "MISUSE_API_PROCESS":
+                        logger.debug(f"📬 OMIE Response: {data}")
+                        logger.warning("⚠️ OMIE API bloqueada por rate limit.")
+                        return [{"status": "rate_limited", "reason": "api_blocked", "message": message} for _ in lot]
+                    elif fault == "SOAP-ENV:Server":
+                        if attempt < max_retries - 1:
+                            metrics.note_retry()
+                            wait_time = (attempt + 1) * 2
+                            logger.warning(f"⚠️ Erro temporário do servidor OMIE (lote {lote}). Tentativa {attempt + 1}/{max_retries}. Aguardando {wait_time}s...")
+                            time.sleep(wait_time)
+                            continue
+                        logger.warning(f"⚠️ Falha após {max_retries} tentativas. Pulando lote {lote}.")
+                        return [{"status": "error", "reason": "server_error", "message": message, "fault": fault} for _ in lot]
+                    else:
+                        logger.warning(f"⚠️ Lote {lote} rejeitado pela OMIE ({fault}): {message}. Enviando produtos individualmente...")
+                        return None
+
+                return [dict(data, codigo_produto_integracao=item.get("codigo_produto_integracao")) for item in lot]
+
+            except requests.exceptions.Timeout:
+                if attempt < max_retries - 1:
+                    metrics.note_retry()
+                    wait_time = (attempt + 1) * 2
+                    logger.warning(f"⏱️ Timeout ao enviar lote {lote}. Tentativa {attempt + 1}/{max_retries}. Aguardando {wait_time}s...")
+                    time.sleep(wait_time)
+                    continue
+                logger.warning(f"⚠️ Timeout após {max_retries} tentativas. Pulando lote {lote}.")
+                return [{"status": "error", "reason": "timeout", "message": "Request timeout"} for _ in lot]
+
+            except Exception as e:
+                logger.error(f"⚠️ Erro inesperado ao enviar lote {lote}: {e}")
+                return [{"status": "error", "reason": "exception", "message": str(e)} for _ in lot]
 
-                time.sleep(1.1)  # Para evitar rate limit
+        return [{"status": "error", "reason": "max_retries_exceeded"} for _ in lot]
 
+    def _insert_individually(self, lot, limiter, governor):
+        results = []
+        for item in lot:
+            if limiter is not None:
+                limiter.acquire()
+            result = self.insert_product(item, governor=governor)
+            results.append(result)
+            if isinstance(result, dict) and result.get("status") == "rate_limited":
+                results.extend(dict(result) for _ in lot[len(results):])
+                break
+        return results
+
+    def _alter_individually(self, lot, limiter, governor):
+        results = []
+        for item in lot:
+            if limiter is not None:
+                limiter.acquire()
+            try:
+                data = self._alterar_produto(item)
             except Exception as e:
-                print(f"❌ Erro ao atualizar produto {produto.get('CodigoComposto')}: {e}")
+                data = {"status": "error", "reason": "exception", "message": str(e)}
+            if data.get("faultcode") == "MISUSE_API_PROCESS":
+                data = {"status": "rate_limited", "reason": "api_blocked", "message": data.get("faultstring")}
+            elif "faultcode" in data:
+                logger.warning(f"⚠️ Falha ao atualizar {item.get('codigo_produto_integracao')}: {data.get('faultstring')}")
+                data = {"status": "error", "reason": "client_error", "message": data.get("faultstring"),
+                        "fault": data.get("faultcode")}
+            report_to_governor(governor, data)
+            if data.get("status") == "rate_limited":
+                results.append(data)
+                results.extend(dict(data) for _ in lot[len(results):])
+                break
+            results.append(dict(data, sent_individually=True))
+        return results
+
+    def atualizar_produtos_existentes(self, produtos: list, detector=None, limiter=None):
+        """Sends AlterarProduto for the given XBZ products.
 
+        Products whose price, stock, weight and dimensions did not change since
+        they were last pushed are not sent at all, and for the others only the
+        changed fields are sent. `detector` defaults to a `ChangeDetector`
+        backed by the state directory (`state/update_fingerprints.sqlite3`).
+        """
+        limiter = limiter or TokenBucket(rate=1 / 1.1)  # Para evitar rate limit
+        own_detector = detector is None
+        detector = ChangeDetector() if own_detector else detector
+        unchanged_count = 0
 
+        for produto in produtos:
+            try:
+                param_data = map_product_update(produto)
+                changes = detector.changes(param_data)
+                if changes is None:
+                    unchanged_count += 1
+                    continue
 
+                limiter.acquire()
+                data = self._alterar_produto(changes)
+
+                if "faultcode" in data:
+                    logger.warning(f"⚠️ Falha ao atualizar {produto.get('CodigoComposto')}: {data}")
+                else:
+                    logger.info(f"✅ Produto {produto.get('CodigoComposto')} atualizado com sucesso.")
+                    logger.debug(f"📦 Campos alterados: {', '.join(f'{k}={v}' for k, v in changes.items() if k != 'codigo_produto_integracao')}")
+                    detector.mark_pushed(param_data)
+
+            except Exception as e:
+                logger.error(f"❌ Erro ao atualizar produto {produto.get('CodigoComposto')}: {e}")
+
+        logger.info(f"⏭️ {unchanged_count} produtos sem alterações não foram enviados.")
+        if own_detector:
+            detector.store.close()
+
+    @metrics.timed_call("alterar_produto", call_outcome)
+    def _alterar_produto(self, changes):
+        payload = {
+            "call": "AlterarProduto",
+            "app_key": self.app_key,
+            "app_secret": self.app_secret,
+            "param": [changes]
+        }
+        response = self.transport.post(self.endpoint, json=payload)
+        return response.json()
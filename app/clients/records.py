@@ -0,0 +1,119 @@
+from collections.abc import Mapping
+
+from app.utils.json_stream import iter_json_array
+
+
+class _Record(Mapping):
+    """Read-only product record that keeps only `FIELDS`, in `__slots__`.
+
+    It behaves like the JSON dict it was projected from (`get`, `[]`, `in`,
+    iteration, `dict(record)`), so the mapping, diff and update code works on
+    it unchanged, but takes a fraction of the memory: no per-instance dict and
+    none of the fields the sync never reads. A field missing from the source is
+    missing from the record too (`get` returns the default).
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._field_set = frozenset(cls.FIELDS)
+        # Slot descriptors set values directly, bypassing the read-only __setattr__
+        cls._setters = [(field, cls.__dict__[field].__set__) for field in cls.FIELDS]
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        record = cls.__new__(cls)
+        for field, set_value in cls._setters:
+            if field in data:
+                set_value(record, data[field])
+        return record
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} é somente leitura")
+
+    @classmethod
+    def columns(cls, records, missing=None) -> dict:
+        """Field -> list of values of `records`, to build a frame without a dict per record."""
+        return {field: [getattr(record, field, missing) for record in records] for field in cls.FIELDS}
+
+    def __getitem__(self, key):
+        if key not in self._field_set:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        if key not in self._field_set:
+            return default
+        return getattr(self, key, default)
+
+    def __contains__(self, key):
+        return key in self._field_set and hasattr(self, key)
+
+    def __iter__(self):
+        return (field for field in self.FIELDS if hasattr(self, field))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+    def __reduce__(self):
+        return type(self).from_dict, (dict(self),)
+
+
+class XbzProduct(_Record):
+    """XBZ catalog product, with the fields read by `map_product`, `map_product_update` and the scheduler."""
+
+    FIELDS = (
+        "CodigoComposto", "Nome", "Descricao", "CorWebPrincipal", "Ncm",
+        "PrecoVenda", "PrecoVendaFormatado", "QuantidadeDisponivelEstoquePrincipal", "quantidade",
+        "Peso", "Altura", "Largura", "Profundidade",
+    )
+    __slots__ = FIELDS
+
+
+class OmieProduct(_Record):
+    """OMIE catalog product (ListarProdutos), with the fields used by the catalog index,
+    the change detection and the reconciliation. `info` keeps only the change timestamps."""
+
+    FIELDS = (
+        "codigo_produto", "codigo_produto_integracao", "codigo", "descricao", "descr_detalhada",
+        "ncm", "unidade", "valor_unitario", "quantidade_estoque", "peso_bruto",
+        "altura", "largura", "profundidade", "bloqueado", "inativo", "info",
+    )
+    INFO_FIELDS = ("dAlt", "hAlt", "dInc", "hInc")
+    __slots__ = FIELDS
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        record = super().from_dict(data)
+        info = data.get("info")
+        if isinstance(info, dict):
+            cls.info.__set__(record, {key: info[key] for key in cls.INFO_FIELDS if key in info})
+        return record
+
+
+def parse_xbz_products(body, snapshot=None) -> list:
+    """Parses a GetListaDeProdutos response body (bytes or text) straight into `XbzProduct` records,
+    so only one full product dict exists at a time.
+
+    With a `snapshot` (`app.utils.result_writer.SnapshotWriter`), each full
+    product dict is also written to it before being projected.
+    """
+    if snapshot is None:
+        return [XbzProduct.from_dict(product) for product in iter_json_array([body])]
+    records = []
+    for product in iter_json_array([body]):
+        snapshot.write(product)
+        records.append(XbzProduct.from_dict(product))
+    return records
+
+
+def parse_omie_products(produtos) -> list:
+    return [OmieProduct.from_dict(produto) for produto in produtos]
@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from app.utils.logger import get_logger
+
+# (connect, read) timeout in seconds applied to every request that does not override it
+DEFAULT_TIMEOUT = (10, 60)
+DEFAULT_POOL_SIZE = 10
+# Methods that can safely be sent twice
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+logger = get_logger(__name__)
+
+
+def never_sent(exception) -> bool:
+    """Whether a request failed while connecting, i.e. before the server could receive it."""
+    if isinstance(exception, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(exception.args[0], "reason", None) if exception.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class RetryPolicy:
+    """Decides whether a failed HTTP request is retried and how long to wait before it.
+
+    Idempotent requests (GET, ...) are retried on connection errors and gateway
+    errors. Other methods, such as the POSTs of IncluirProduto, are only retried
+    when the connection could not be established (connect timeout, connection
+    refused): a dropped connection or a 502/503/504 may come after the server
+    already received the request, and sending it again could insert twice.
+    Application-level faults (e.g. OMIE's SOAP-ENV:Server) are still handled by
+    the clients. Subclass and override `should_retry`/`backoff` for a different policy.
+    """
+
+    def __init__(self, max_retries=2, backoff_factor=1.0, max_backoff=30, retry_statuses=(502, 503, 504)):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.retry_statuses = set(retry_statuses)
+
+    def should_retry(self, attempt, response=None, exception=None, method="GET") -> bool:
+        if attempt >= self.max_retries:
+            return False
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        if exception is not None:
+            if idempotent:
+                return isinstance(exception, requests.exceptions.ConnectionError)
+            return never_sent(exception)
+        return idempotent and response is not None and response.status_code in self.retry_statuses
+
+    def backoff(self, attempt) -> float:
+        return min(self.max_backoff, self.backoff_factor * (2 ** attempt))
+
+
+class NoRetry(RetryPolicy):
+    def __init__(self):
+        super().__init__(max_retries=0)
+
+
+class HttpTransport:
+    """Pooled, keep-alive HTTP session shared by the XBZ and OMIE clients.
+
+    `host_pool_sizes` maps a host name to the number of connections kept open
+    to it (e.g. `{"app.omie.com.br": 8}`), other hosts use `pool_size`.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, pool_size=DEFAULT_POOL_SIZE, host_pool_sizes=None, retry_policy=None):
+        self.timeout = timeout
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.session = requests.Session()
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+
+        default_adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", default_adapter)
+        self.session.mount("http://", default_adapter)
+        for host, size in (host_pool_sizes or {}).items():
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size)
+            self.session.mount(f"https://{host}", adapter)
+            self.session.mount(f"http://{host}", adapter)
+
+    def request(self, method, url, timeout=None, retry_policy=None, **kwargs):
+        policy = retry_policy or self.retry_policy
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+            except requests.exceptions.RequestException as e:
+                if not policy.should_retry(attempt, exception=e, method=method):
+                    raise
+                wait_time = policy.backoff(attempt)
+                logger.warning(f"🔁 Falha de conexão com {urlsplit(url).netloc} ({e.__class__.__name__}). Nova tentativa em {wait_time:.1f}s...")
+            else:
+                if not policy.should_retry(attempt, response=response, method=method):
+                    return response
+                wait_time = policy.backoff(attempt)
+                logger.warning(f"🔁 {urlsplit(url).netloc} respondeu HTTP {response.status_code}. Nova tentativa em {wait_time:.1f}s...")
+                response.close()
+            time.sleep(wait_time)
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_default_transport = None
+_default_lock = threading.Lock()
+
+
+def _env_pool_sizes():
+    sizes = {}
+    for host, env_name in (("app.omie.com.br", "OMIE_POOL_SIZE"), ("api.minhaxbz.com.br", "XBZ_POOL_SIZE")):
+        if os.getenv(env_name):
+            sizes[host] = int(os.getenv(env_name))
+    return sizes
+
+
+def get_transport() -> HttpTransport:
+    """Returns the process-wide transport, created on first use.
+
+    HTTP_TIMEOUT (read timeout in seconds), OMIE_POOL_SIZE and XBZ_POOL_SIZE
+    can be used to tune it.
+    """
+    global _default_transport
+    with _default_lock:
+        if _default_transport is None:
+            timeout = DEFAULT_TIMEOUT
+            if os.getenv("HTTP_TIMEOUT"):
+                timeout = (DEFAULT_TIMEOUT[0], float(os.getenv("HTTP_TIMEOUT")))
+            _default_transport = HttpTransport(timeout=timeout, host_pool_sizes=_env_pool_sizes())
+        return _default_transport
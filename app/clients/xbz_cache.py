@@ -0,0 +1,97 @@
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+from app.utils.state import state_path
+
+# Seconds a downloaded catalog is served from disk without asking XBZ again
+# (0 = always revalidate, which costs little when XBZ answers 304 or the same content)
+XBZ_CACHE_TTL = 0
+# Oldest snapshot used as a fallback when the XBZ API is slow or down
+XBZ_CACHE_MAX_STALE = 7 * 24 * 60 * 60
+
+
+class XbzCatalogCache:
+    """Last good XBZ catalog response, kept gzipped in the state directory.
+
+    Alongside the body it keeps the HTTP validators (ETag, Last-Modified), a
+    SHA-256 of the content, when it was last checked against XBZ and which
+    content the sync last processed completely (see `mark_processed`).
+    """
+
+    def __init__(self, ttl=None, max_stale=None, body_path=None, meta_path=None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("XBZ_CACHE_TTL") or XBZ_CACHE_TTL)
+        self.max_stale = max_stale if max_stale is not None else XBZ_CACHE_MAX_STALE
+        self.body_path = body_path or state_path("xbz_catalog.json.gz")
+        self.meta_path = meta_path or state_path("xbz_catalog.meta.json")
+        try:
+            with open(self.meta_path, encoding="utf-8") as file:
+                self.meta = json.load(file)
+        except (OSError, ValueError):
+            self.meta = {}
+
+    def _save_meta(self):
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self.meta, file, indent=2)
+        os.replace(tmp_path, self.meta_path)
+
+    def has_snapshot(self) -> bool:
+        return bool(self.meta.get("content_hash")) and os.path.exists(self.body_path)
+
+    def age(self) -> float:
+        """Seconds since the snapshot was last confirmed by XBZ (infinite without one)."""
+        if not self.has_snapshot():
+            return float("inf")
+        return (datetime.now() - datetime.fromisoformat(self.meta["checked_at"])).total_seconds()
+
+    def is_fresh(self) -> bool:
+        return self.age() < self.ttl
+
+    def is_usable_fallback(self) -> bool:
+        return self.age() <= self.max_stale
+
+    def validators(self) -> dict:
+        """Conditional request headers for the cached response."""
+        headers = {}
+        if not self.has_snapshot():
+            return headers
+        if self.meta.get("etag"):
+            headers["If-None-Match"] = self.meta["etag"]
+        if self.meta.get("last_modified"):
+            headers["If-Modified-Since"] = self.meta["last_modified"]
+        return headers
+
+    def load_body(self) -> bytes:
+        """The cached response body, as XBZ sent it."""
+        with gzip.open(self.body_path, "rb") as file:
+            return file.read()
+
+    def store(self, body: bytes, etag=None, last_modified=None) -> bool:
+        """Saves a fresh response; returns False when its content is the one already cached."""
+        content_hash = hashlib.sha256(body).hexdigest()
+        changed = content_hash != self.meta.get("content_hash") or not os.path.exists(self.body_path)
+        if changed:
+            tmp_path = f"{self.body_path}.tmp"
+            with gzip.open(tmp_path, "wb", compresslevel=5) as file:
+                file.write(body)
+            os.replace(tmp_path, self.body_path)
+            self.meta["content_hash"] = content_hash
+            self.meta["changed_at"] = datetime.now().isoformat()
+        self.meta.update({"etag": etag, "last_modified": last_modified, "checked_at": datetime.now().isoformat()})
+        self._save_meta()
+        return changed
+
+    def touch(self):
+        """Records that XBZ confirmed the cached content (e.g. answered 304)."""
+        self.meta["checked_at"] = datetime.now().isoformat()
+        self._save_meta()
+
+    def is_processed(self) -> bool:
+        """Whether the cached content was already diffed to the end by a sync."""
+        return self.has_snapshot() and self.meta.get("processed_hash") == self.meta.get("content_hash")
+
+    def mark_processed(self):
+        self.meta["processed_hash"] = self.meta.get("content_hash")
+        self._save_meta()
@@ -1,19 +1,91 @@
+from typing import List, Iterator
+
 import requests
-from typing import List, Dict
+
+from app.clients.records import XbzProduct, parse_xbz_products
+from app.clients.transport import HttpTransport, get_transport
+from app.clients.xbz_cache import XbzCatalogCache
+from app.utils.json_stream import iter_json_array
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 class XBZClient:
 
-    def __init__(self, token: str, cnpj: str):
+    def __init__(self, token: str, cnpj: str, transport: HttpTransport = None, cache: XbzCatalogCache = None):
         self.token = token
         self.cnpj = cnpj
         self.base_url = "https://api.minhaxbz.com.br:5001/api/clientes"
+        self.transport = transport or get_transport()
+        self.cache = cache
+        # How the last get_products was served: "downloaded", or with a cache "cached",
+        # "not_modified", "unchanged", "changed" or "fallback"
+        self.last_fetch_status = None
+
+    def get_products(self, snapshot=None) -> List[XbzProduct]:
+        """Downloads the catalog, keeping only the fields the sync uses (see `XbzProduct`).
+
+        With a `snapshot` (`SnapshotWriter`), the full products are written to it as they are parsed.
+        """
+        url = f"{self.base_url}/GetListaDeProdutos"
+        params = {
+            "token": self.token,
+            "cnpj": self.cnpj
+        }
+        if self.cache is None:
+            response = self.transport.get(url, params=params)
+            response.raise_for_status()
+            self.last_fetch_status = "downloaded"
+            return parse_xbz_products(response.content, snapshot)
+        return self._get_products_cached(url, params, snapshot)
+
+    def _get_products_cached(self, url, params, snapshot) -> List[XbzProduct]:
+        cache = self.cache
+        if cache.is_fresh():
+            self.last_fetch_status = "cached"
+            logger.info(f"💾 Catálogo XBZ lido do cache (verificado há {cache.age() / 60:.0f} min).")
+            return parse_xbz_products(cache.load_body(), snapshot)
+        try:
+            response = self.transport.get(url, params=params, headers=cache.validators())
+            if response.status_code == 304:
+                cache.touch()
+                self.last_fetch_status = "not_modified"
+                logger.info("💾 Catálogo XBZ sem alterações (304), lido do cache.")
+                return parse_xbz_products(cache.load_body(), snapshot)
+            response.raise_for_status()
+            body = response.content
+            products = parse_xbz_products(body, snapshot)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            if not cache.is_usable_fallback():
+                raise
+            if snapshot is not None:
+                # Part of the broken download may already be in it
+                snapshot.reset()
+            self.last_fetch_status = "fallback"
+            # The exception text may carry the request URL, token included
+            logger.warning(f"⚠️ API da XBZ indisponível ({type(e).__name__}). Usando o último catálogo salvo "
+                           f"(verificado há {cache.age() / 3600:.1f} h).")
+            return parse_xbz_products(cache.load_body(), snapshot)
+
+        changed = cache.store(body, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        self.last_fetch_status = "changed" if changed else "unchanged"
+        if not changed:
+            logger.info("💾 Catálogo XBZ baixado, mas idêntico ao da última execução.")
+        return products
+
+    def iter_products(self, chunk_size: int = 64 * 1024, snapshot=None) -> Iterator[XbzProduct]:
+        """Streams the catalog, yielding each product as soon as it has been downloaded.
 
-    def get_products(self) -> List[Dict]:
+        With a `snapshot`, each full product is written to it before being yielded.
+        """
         url = f"{self.base_url}/GetListaDeProdutos"
         params = {
             "token": self.token,
             "cnpj": self.cnpj
         }
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json()
+        with self.transport.get(url, params=params, stream=True) as response:
+            response.raise_for_status()
+            for product in iter_json_array(response.iter_content(chunk_size=chunk_size)):
+                if snapshot is not None:
+                    snapshot.write(product)
+                yield XbzProduct.from_dict(product)
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from app.utils.logger import get_logger
+from app.utils.state import state_path
+
+# A full rebuild is the only way to notice products deleted in OMIE,
+# so the incremental refresh is only trusted for this long.
+FULL_REBUILD_AFTER = timedelta(days=7)
+
+logger = get_logger(__name__)
+
+
+def content_hash(omie_product: dict) -> str:
+    raw = json.dumps(dict(omie_product), sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def altered_at(omie_product: dict):
+    """Last change timestamp of an OMIE product (from `info.dAlt/hAlt`, or the inclusion date)."""
+    info = omie_product.get("info") or {}
+    for date_key, time_key in (("dAlt", "hAlt"), ("dInc", "hInc")):
+        if info.get(date_key):
+            try:
+                return datetime.strptime(f"{info[date_key]} {info.get(time_key) or '00:00:00'}", "%d/%m/%Y %H:%M:%S")
+            except ValueError:
+                continue
+    return None
+
+
+class CatalogIndex:
+    """On-disk index of the OMIE catalog keyed by `codigo_produto_integracao`.
+
+    Stores only what the sync needs (codigo_produto, a content hash and the
+    last-altered timestamp) so that each run can refresh it with the products
+    changed since the newest timestamp it has seen, instead of listing the
+    whole catalog again.
+    """
+
+    def __init__(self, path=None, full_rebuild_after=FULL_REBUILD_AFTER):
+        self.path = path or state_path("omie_catalog.sqlite3")
+        self.full_rebuild_after = full_rebuild_after
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS products (
+                codigo_produto_integracao TEXT PRIMARY KEY,
+                codigo_produto TEXT,
+                content_hash TEXT,
+                alterado_em TEXT
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def codes(self) -> set:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT codigo_produto_integracao FROM products")}
+
+    def get(self, codigo_produto_integracao):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT codigo_produto, content_hash, alterado_em FROM products WHERE codigo_produto_integracao = ?",
+                (codigo_produto_integracao,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"codigo_produto": row[0], "content_hash": row[1], "alterado_em": row[2]}
+
+    def _get_meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @staticmethod
+    def _rows(omie_products):
+        rows = []
+        for product in omie_products:
+            codigo = product.get("codigo_produto_integracao")
+            if not codigo:
+                continue
+            alterado_em = altered_at(product)
+            rows.append((
+                codigo,
+                str(product.get("codigo_produto") or ""),
+                content_hash(product),
+                alterado_em.isoformat(sep=" ") if alterado_em else None,
+            ))
+        return rows
+
+    def _write_rows(self, rows):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO products (codigo_produto_integracao, codigo_produto, content_hash, alterado_em) "
+            "VALUES (?, ?, ?, ?)",
+            rows,
+        )
+
+    def upsert(self, omie_products):
+        """Adds or updates OMIE product records. Products without an integration code are ignored."""
+        rows = self._rows(omie_products)
+        with self._lock:
+            self._write_rows(rows)
+            self._conn.commit()
+        return len(rows)
+
+    def add(self, codigo_produto_integracao, codigo_produto=None):
+        """Records a product we just created, before OMIE lists it back to us."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO products (codigo_produto_integracao, codigo_produto) VALUES (?, ?)",
+                (codigo_produto_integracao, str(codigo_produto or "")),
+            )
+            self._conn.commit()
+
+    def watermark(self):
+        """Newest OMIE change timestamp present in the index."""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(alterado_em) FROM products").fetchone()
+        return datetime.fromisoformat(row[0]) if row and row[0] else None
+
+    def needs_full_rebuild(self) -> bool:
+        with self._lock:
+            last_full = self._get_meta("last_full_rebuild")
+        if not last_full or len(self) == 0 or self.watermark() is None:
+            return True
+        return datetime.now() - datetime.fromisoformat(last_full) > self.full_rebuild_after
+
+    def rebuild(self, pages):
+        """Replaces the index with the products in `pages` (an iterable of product lists).
+
+        The rows are collected while listing, without holding the lock, and swapped
+        in once all pages were read; if listing fails halfway the previous index is kept.
+        """
+        rows = []
+        for produtos in pages:
+            rows.extend(self._rows(produtos))
+        with self._lock:
+            try:
+                self._conn.execute("DELETE FROM products")
+                self._write_rows(rows)
+                self._set_meta("last_full_rebuild", datetime.now().isoformat())
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return len(rows)
+
+    def refresh(self, omie_client, force_full=False, workers=1, limiter=None):
+        """Brings the index up to date and returns "full" or "incremental".
+
+        Raises `OmieListingError` if the catalog could not be listed completely;
+        the index is then left as it was.
+        """
+        if force_full or self.needs_full_rebuild():
+            logger.info("🔄 Reconstruindo índice local do catálogo OMIE (listagem completa)...")
+            self.rebuild(omie_client.iter_product_pages(workers=workers, limiter=limiter))
+            return "full"
+
+        since = self.watermark()
+        logger.info(f"🔄 Atualizando índice local com produtos alterados desde {since:%d/%m/%Y %H:%M:%S}...")
+        changed = omie_client.list_products(
+            filters={
+                "filtrar_por_data_de": since.strftime("%d/%m/%Y"),
+                "filtrar_por_hora_de": since.strftime("%H:%M:%S"),
+            },
+            workers=workers,
+            limiter=limiter,
+        )
+        self.upsert(changed)
+        logger.info(f"✅ {len(changed)} produtos alterados desde a última sincronização.")
+        return "incremental"
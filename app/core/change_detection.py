@@ -0,0 +1,119 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from app.utils.state import state_path
+
+# Fields sent by AlterarProduto and how many decimals matter when comparing them
+UPDATE_FIELDS = {
+    "valor_unitario": 2,
+    "peso_bruto": 3,
+    "quantidade_estoque": 0,
+    "altura": 3,
+    "largura": 3,
+    "profundidade": 3,
+}
+
+
+def fingerprint(fields: dict) -> str:
+    raw = json.dumps({key: fields.get(key) for key in UPDATE_FIELDS}, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _normalize(value, decimals):
+    try:
+        return round(float(value or 0), decimals)
+    except (TypeError, ValueError):
+        return None
+
+
+def changed_fields(new: dict, known: dict) -> dict:
+    """Returns the fields of `new` whose value differs from `known`."""
+    changes = {}
+    for key, decimals in UPDATE_FIELDS.items():
+        if key not in new:
+            continue
+        if _normalize(new[key], decimals) != _normalize(known.get(key), decimals):
+            changes[key] = new[key]
+    return changes
+
+
+class FingerprintStore:
+    """Persists, per product, the update fields last pushed to OMIE."""
+
+    def __init__(self, path=None):
+        self.path = path or state_path("update_fingerprints.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                codigo_produto_integracao TEXT PRIMARY KEY,
+                fingerprint TEXT,
+                fields TEXT,
+                updated_at TEXT
+            )
+        """)
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def get(self, codigo):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, fields FROM fingerprints WHERE codigo_produto_integracao = ?", (codigo,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def put(self, codigo, fields: dict):
+        known = {key: fields[key] for key in UPDATE_FIELDS if key in fields}
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fingerprints (codigo_produto_integracao, fingerprint, fields, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (codigo, fingerprint(fields), json.dumps(known), datetime.now().isoformat()),
+            )
+            self._conn.commit()
+
+
+class ChangeDetector:
+    """Decides which AlterarProduto fields actually need to be sent for a product.
+
+    The known OMIE state comes from `omie_state` (OMIE product records keyed by
+    `codigo_produto_integracao`, e.g. a fresh listing) when available, otherwise
+    from the fields last pushed by a previous run, kept in `store`.
+    """
+
+    def __init__(self, store: FingerprintStore = None, omie_state: dict = None):
+        self.store = store or FingerprintStore()
+        self.omie_state = omie_state or {}
+
+    def changes(self, param_data: dict):
+        """Returns the parameters to send (only the changed fields), or None if nothing changed."""
+        codigo = param_data["codigo_produto_integracao"]
+
+        known = self.omie_state.get(codigo)
+        if known is None:
+            stored = self.store.get(codigo)
+            if stored is not None:
+                stored_fingerprint, known = stored
+                if stored_fingerprint == fingerprint(param_data):
+                    return None
+
+        if known is None:
+            # Never pushed and not listed: send everything
+            return dict(param_data)
+
+        changes = changed_fields(param_data, known)
+        if not changes:
+            return None
+        return {"codigo_produto_integracao": codigo, **changes}
+
+    def mark_pushed(self, param_data: dict):
+        codigo = param_data["codigo_produto_integracao"]
+        self.store.put(codigo, param_data)
+        if codigo in self.omie_state:
+            self.omie_state[codigo] = {**self.omie_state[codigo], **param_data}
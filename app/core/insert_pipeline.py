@@ -0,0 +1,119 @@
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from app.mappings.mapping import map_product
+from app.utils.logger import get_logger
+from app.utils.metrics import get_metrics
+
+logger = get_logger(__name__)
+
+# Marker returned by a worker that gave up waiting for a token because the run is stopping
+_CANCELLED = object()
+
+
+def response_status(response) -> str:
+    """Normalizes an `OmieClient.insert_product` response to a single status string."""
+    if response is None:
+        return "rate_limited"
+    if isinstance(response, dict) and response.get("status") in ("rate_limited", "skipped", "error"):
+        return response["status"]
+    return "inserted"
+
+
+def run_insert_pipeline(omie_client, products, limiter, max_inserts, workers=3, lot_size=None, mapper=None,
+                        preflight=None, governor=None):
+    """Inserts `products` concurrently, pacing every request through the shared `limiter`.
+
+    Yields `(product, payload, response)` in completion order. At most `workers`
+    requests are in flight and no more than `max_inserts` successful inserts are
+    attempted. A `rate_limited` response stops the pipeline: queued requests are
+    dropped and only the ones already sent are reported.
+
+    With `lot_size`, products are grouped and sent through
+    `OmieClient.upsert_products_batch`, one token per lot instead of one per product.
+
+    `mapper` turns a product into its OMIE payload (`map_product` by default).
+    With a `preflight` (`app.core.preflight.Preflight`), payloads it holds back
+    are reported with its error response without being sent or using a token;
+    products that could not be mapped are reported with a None payload.
+    A `governor` (`app.core.rate_governor.RateGovernor`) is fed one outcome per
+    request, so a lot counts once however many products it carries.
+    """
+    stop_event = threading.Event()
+    products = iter(products)
+    in_flight = {}
+    held_back = []
+    inserted = 0
+    exhausted = False
+    metrics = get_metrics()
+    mapper = mapper or map_product
+
+    def _send(payloads):
+        if not limiter.acquire(stop_event):
+            return _CANCELLED
+        if lot_size:
+            return omie_client.upsert_products_batch(payloads, lot_size=len(payloads), limiter=limiter,
+                                                     governor=governor)
+        return [omie_client.insert_product(payloads[0], governor=governor)]
+
+    def _in_flight_count():
+        return sum(len(items) for items in in_flight.values())
+
+    def _next_unit():
+        nonlocal exhausted
+        budget = max_inserts - inserted - _in_flight_count()
+        unit = []
+        while len(unit) < min(lot_size or 1, budget):
+            try:
+                product = next(products)
+            except StopIteration:
+                exhausted = True
+                break
+            with metrics.phase("mapping"):
+                if preflight is not None:
+                    payload, rejection = preflight.prepare(product, mapper)
+                else:
+                    payload, rejection = mapper(product), None
+            if logger.isEnabledFor(logging.DEBUG) and payload is not None:
+                logger.debug("🧾 OMIE Payload: " + json.dumps(payload, indent=2, ensure_ascii=False))
+            if rejection is not None:
+                held_back.append((product, payload, rejection))
+                continue
+            unit.append((product, payload))
+        return unit
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            while True:
+                while (not exhausted and not stop_event.is_set()
+                       and len(in_flight) < workers
+                       and inserted + _in_flight_count() < max_inserts):
+                    unit = _next_unit()
+                    if not unit:
+                        break
+                    in_flight[executor.submit(_send, [payload for _, payload in unit])] = unit
+
+                while held_back:
+                    yield held_back.pop(0)
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    unit = in_flight.pop(future)
+                    responses = future.result()
+                    if responses is _CANCELLED:
+                        continue
+                    for (product, payload), response in zip(unit, responses):
+                        status = response_status(response)
+                        if preflight is not None:
+                            preflight.record(payload, status, response)
+                        if status == "rate_limited":
+                            stop_event.set()
+                        elif status == "inserted":
+                            inserted += 1
+                        yield product, payload, response
+        finally:
+            # Also reached when the consumer stops iterating early
+            stop_event.set()
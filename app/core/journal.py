@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+from datetime import datetime
+from app.utils.state import state_path
+
+# Outcomes that prove a product exists in OMIE
+KNOWN_OUTCOMES = ("inserted", "skipped", "known")
+
+# Failures worth retrying, by a resumed plan or the work queue; client errors would fail again
+RETRYABLE_REASONS = ("server_error", "timeout", "exception", "max_retries_exceeded")
+
+
+class JournalState:
+    """What a journal replay tells us about previous runs."""
+
+    def __init__(self, known_codes, pending, plan_started):
+        self.known_codes = known_codes
+        self.pending = pending
+        self.plan_started = plan_started
+
+    @property
+    def plan_age(self):
+        if self.plan_started is None:
+            return None
+        return datetime.now() - self.plan_started
+
+
+class SyncJournal:
+    """Append-only, fsync'd JSON-lines journal of the sync progress.
+
+    Record types:
+    - `plan_start` / `plan`: the pending products found by the last full scan;
+    - `outcome`: what happened to one product (inserted, skipped or failed).
+
+    Replaying it gives the codes known to exist in OMIE and the products of the
+    last plan that have no outcome yet, so an interrupted run can be resumed
+    without downloading either catalog again. A new plan compacts the file down
+    to the known codes.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or state_path("sync_journal.jsonl")
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def _write(self, lines):
+        self._file.write("".join(lines))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    @staticmethod
+    def _line(record):
+        record = {"ts": datetime.now().isoformat(timespec="seconds"), **record}
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+    def load(self) -> JournalState:
+        known_codes = set()
+        plan = {}
+        done = set()
+        plan_started = None
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Last line of a run killed mid-write
+                        continue
+                    record_type = record.get("type")
+                    if record_type == "plan_start":
+                        plan = {}
+                        done = set()
+                        plan_started = datetime.fromisoformat(record["ts"])
+                    elif record_type == "plan":
+                        plan[record["codigo"]] = record["product"]
+                    elif record_type == "outcome":
+                        outcome = record.get("outcome")
+                        if outcome in KNOWN_OUTCOMES:
+                            known_codes.add(record["codigo"])
+                        if outcome != "failed" or record.get("reason") not in RETRYABLE_REASONS:
+                            done.add(record["codigo"])
+        except FileNotFoundError:
+            pass
+        pending = {codigo: product for codigo, product in plan.items() if codigo not in done}
+        return JournalState(known_codes, pending, plan_started)
+
+    def start_plan(self):
+        """Compacts the journal to the known codes and opens a new plan."""
+        with self._lock:
+            known_codes = self.load().known_codes
+            self._file.close()
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                for codigo in sorted(known_codes):
+                    file.write(self._line({"type": "outcome", "codigo": codigo, "outcome": "known"}))
+                file.write(self._line({"type": "plan_start"}))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
+
+    def add_to_plan(self, product):
+        """Buffers a pending product; written on the next `flush` (or outcome)."""
+        with self._lock:
+            self._buffer.append(self._line({"type": "plan", "codigo": product.get("CodigoComposto"), "product": dict(product)}))
+            if len(self._buffer) >= 500:
+                self._write(self._buffer)
+                self._buffer = []
+
+    def flush(self):
+        with self._lock:
+            if self._buffer:
+                self._write(self._buffer)
+                self._buffer = []
+
+    def record(self, codigo, outcome, reason=None, message=None):
+        record = {"type": "outcome", "codigo": codigo, "outcome": outcome}
+        if reason:
+            record["reason"] = reason
+        if message:
+            record["message"] = message
+        with self._lock:
+            self._write(self._buffer + [self._line(record)])
+            self._buffer = []
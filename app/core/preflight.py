@@ -0,0 +1,126 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from app.mappings.mapping import map_product
+from app.mappings.validation import validate_payload
+from app.utils.metrics import get_metrics
+from app.utils.state import state_path
+
+# Failures that would happen again with the same payload
+NON_TRANSIENT_REASONS = ("client_error",)
+
+# Reasons of the responses made up by `Preflight.prepare`/`check` (no request was sent)
+PREFLIGHT_REASONS = ("invalid_payload", "known_rejection")
+
+# What a mapper raises on a product it cannot map (missing or malformed fields)
+MAPPING_ERRORS = (KeyError, TypeError, ValueError, AttributeError)
+
+
+def payload_fingerprint(payload: dict) -> str:
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class RejectionCache:
+    """Persists the payloads OMIE rejected for good, keyed by product code and payload fingerprint."""
+
+    def __init__(self, path=None):
+        self.path = path or state_path("rejected_payloads.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS rejected (
+                codigo TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                reason TEXT,
+                message TEXT,
+                rejected_at TEXT
+            )
+        """)
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rejected").fetchone()[0]
+
+    def lookup(self, payload: dict):
+        """The (reason, message) this exact payload was rejected with, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, reason, message FROM rejected WHERE codigo = ?",
+                (payload.get("codigo_produto_integracao"),),
+            ).fetchone()
+        if row is None or row[0] != payload_fingerprint(payload):
+            return None
+        return row[1], row[2]
+
+    def add(self, payload: dict, reason, message=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rejected (codigo, fingerprint, reason, message, rejected_at) VALUES (?, ?, ?, ?, ?)",
+                (payload.get("codigo_produto_integracao"), payload_fingerprint(payload), reason, message,
+                 datetime.now().isoformat()),
+            )
+            self._conn.commit()
+
+    def forget(self, codigo):
+        with self._lock:
+            self._conn.execute("DELETE FROM rejected WHERE codigo = ?", (codigo,))
+            self._conn.commit()
+
+
+class Preflight:
+    """Stops payloads OMIE would reject before they use up rate budget.
+
+    `check` runs between `map_product` and the insert: a payload is held back
+    when it breaks the OMIE field rules (`validate_payload`) or when OMIE
+    already rejected this exact payload with a non-transient fault. Once the
+    XBZ data changes, the payload (and its fingerprint) changes and it is sent
+    again. `record` feeds the cache with the insert results.
+    """
+
+    def __init__(self, cache: RejectionCache = None):
+        self.cache = cache if cache is not None else RejectionCache()
+        self.metrics = get_metrics()
+
+    def prepare(self, product, mapper=None):
+        """Maps `product` and checks the payload; returns `(payload, rejection)`.
+
+        A product the mapper cannot handle (e.g. a missing field) is held back as
+        `invalid_payload` with a None payload instead of aborting the run.
+        """
+        try:
+            payload = (mapper or map_product)(product)
+        except MAPPING_ERRORS as e:
+            return None, self._reject("invalid_payload", f"falha no mapeamento ({type(e).__name__}: {e})")
+        return payload, self.check(payload)
+
+    def check(self, payload: dict):
+        """None when the payload may be sent, otherwise an `insert_product`-style error response."""
+        problems = validate_payload(payload)
+        if problems:
+            return self._reject("invalid_payload", "; ".join(problems))
+        rejected = self.cache.lookup(payload)
+        if rejected is None:
+            return None
+        reason, message = rejected
+        return self._reject("known_rejection", f"rejeitado anteriormente pela OMIE ({reason}): {message}")
+
+    def _reject(self, reason, message):
+        self.metrics.inc("preflight_rejected_total", help_text="Payloads held back before reaching OMIE, by reason",
+                         reason=reason)
+        return {"status": "error", "reason": reason, "message": message}
+
+    def record(self, payload: dict, status, response):
+        if status == "error" and response.get("reason") in NON_TRANSIENT_REASONS:
+            self.cache.add(payload, response.get("reason"), response.get("message"))
+        elif status in ("inserted", "skipped"):
+            self.cache.forget(payload.get("codigo_produto_integracao"))
+
+    def close(self):
+        self.cache.close()
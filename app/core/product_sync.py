@@ -1,202 +1,429 @@
-import json
-import time
-from app.clients.omie_client import OmieClient
-from app.clients.xbz_client import XBZClient
-from app.mappings.mapping import map_product
-import csv
-import os
-
-# Maximum number of products to INSERT per workflow run
-# This prevents hitting OMIE's rate limits
-# With 3-hour intervals and ~500 products per run, we can sync ~4000 new products/day
-MAX_INSERTS_PER_RUN = 500
-
-
-def sync_products(token, cnpj, omie_app_key, omie_app_secret, dry_run=False, preview_count=None, max_inserts=None):
-    xbz_client = XBZClient(token=token, cnpj=cnpj)
-    omie_client = OmieClient(app_key=omie_app_key, app_secret=omie_app_secret)
-    skipped_products = []
-    failed_products = []
-    inserted_count = 0
-    skipped_count = 0
-    failed_count = 0
-    rate_limited = False
-    
-    # Use provided max_inserts or default
-    max_inserts_limit = max_inserts if max_inserts is not None else MAX_INSERTS_PER_RUN
-
-    print("📦 Buscando produtos da XBZ...")
-    xbz_products = xbz_client.get_products()
-    print(f"✅ {len(xbz_products)} produtos carregados da XBZ.")
-    if xbz_products:
-        salvar_produtos_xbz_csv(xbz_products, "produtos_xbz.csv")
-
-    print("\n📦 Buscando produtos da OMIE...")
-    omie_products = omie_client.list_products()
-    existing_codes = set(
-        p.get("codigo_produto_integracao")
-        for p in omie_products
-        if p.get("codigo_produto_integracao")
-    )
-    print(f"✅ {len(existing_codes)} produtos carregados da OMIE.\n")
-    
-    # Count how many products need to be inserted
-    products_to_insert = [p for p in xbz_products if p.get("CodigoComposto") not in existing_codes]
-    print(f"📊 Produtos novos para inserir: {len(products_to_insert)}")
-    
-    # If there are products to insert, check if API is available first
-    if len(products_to_insert) > 0:
-        print("🔍 Verificando disponibilidade da API OMIE...")
-        api_status = omie_client.check_api_status()
-        if not api_status.get("available"):
-            print(f"⚠️ API OMIE bloqueada: {api_status.get('message', 'Rate limit ativo')}")
-            print(f"💡 Aguarde o desbloqueio e tente novamente na próxima execução.")
-            print("\n" + "="*60)
-            print("📊 RESUMO DA SINCRONIZAÇÃO")
-            print("="*60)
-            print(f"📦 Total de produtos XBZ: {len(xbz_products)}")
-            print(f"✅ Produtos já sincronizados: {len(existing_codes)}")
-            print(f"⏳ Produtos aguardando sincronização: {len(products_to_insert)}")
-            print(f"⚠️ Nenhuma inserção realizada - API bloqueada.")
-            print("="*60)
-            return
-        print("✅ API OMIE disponível.\n")
-    else:
-        print("✅ Todos os produtos já estão sincronizados!\n")
-        print("\n" + "="*60)
-        print("📊 RESUMO DA SINCRONIZAÇÃO")
-        print("="*60)
-        print(f"📦 Total de produtos XBZ: {len(xbz_products)}")
-        print(f"✅ Todos os {len(existing_codes)} produtos já estão na OMIE.")
-        print("="*60)
-        return
-    
-    print(f"📊 Limite de inserções por execução: {max_inserts_limit}")
-    if len(products_to_insert) > max_inserts_limit:
-        print(f"⚠️ Serão inseridos até {max_inserts_limit} produtos nesta execução.")
-        print(f"💡 Os demais serão inseridos nas próximas execuções.\n")
-
-    if preview_count is not None:
-        print(f"⚠️ Modo preview: processando apenas {preview_count} produtos.\n")
-        xbz_products = xbz_products[:preview_count]
-
-    for idx, product in enumerate(xbz_products, 1):
-        codigo = product.get("CodigoComposto")
-        print(f"\n[{idx}/{len(xbz_products)}] Processando produto: {codigo}")
-
-        if codigo in existing_codes:
-            print(f"⏭️ Pulando {codigo} — já existe na OMIE.")
-            skipped_count += 1
-            skipped_products.append({
-                "codigo": codigo,
-                "motivo": "já existe na OMIE (verificado localmente)"
-            })
-            continue
-        
-        # Check if we've reached the insert limit
-        if inserted_count >= max_inserts_limit:
-            print(f"⏸️ Limite de {max_inserts_limit} inserções atingido. Continuará na próxima execução.")
-            break
-
-        omie_payload = map_product(product)
-        print("🧾 OMIE Payload:", json.dumps(omie_payload, indent=2, ensure_ascii=False))
-
-        if not dry_run:
-            response = omie_client.insert_product(omie_payload)
-            
-            # Check if we got rate limited
-            if response is None:
-                # Rate limited - exit gracefully
-                print("⏸️ API bloqueada. Salvando progresso e encerrando.")
-                rate_limited = True
-                break
-            
-            # Check response status
-            if isinstance(response, dict):
-                status = response.get("status")
-                
-                if status == "rate_limited":
-                    print("⏸️ API bloqueada. Salvando progresso e encerrando.")
-                    rate_limited = True
-                    break
-                elif status == "skipped":
-                    print(f"⏭️ Produto {codigo} já existe na OMIE (confirmado pela API)")
-                    skipped_count += 1
-                    skipped_products.append({
-                        "codigo": codigo,
-                        "motivo": response.get("reason", "já existe")
-                    })
-                elif status == "error":
-                    print(f"❌ Falha ao inserir produto {codigo}: {response.get('message')}")
-                    failed_count += 1
-                    failed_products.append({
-                        "codigo": codigo,
-                        "motivo": response.get("reason", "erro desconhecido"),
-                        "mensagem": response.get("message", ""),
-                        "fault_code": response.get("fault", "")
-                    })
-                else:
-                    # Success
-                    print(f"✅ Produto {codigo} inserido com sucesso!")
-                    print(f"📬 OMIE Response: {response}")
-                    inserted_count += 1
-            else:
-                # Success (old format response)
-                print(f"✅ Produto {codigo} inserido com sucesso!")
-                print(f"📬 OMIE Response: {response}")
-                inserted_count += 1
-
-        time.sleep(1.1)  # Para evitar o rate limit
-
-    # Summary
-    print("\n" + "="*60)
-    print("📊 RESUMO DA SINCRONIZAÇÃO")
-    print("="*60)
-    print(f"📦 Total de produtos XBZ: {len(xbz_products)}")
-    print(f"✅ Produtos inseridos nesta execução: {inserted_count}")
-    print(f"⏭️ Produtos pulados (já existem): {skipped_count}")
-    print(f"❌ Produtos com erro: {failed_count}")
-    remaining = len(products_to_insert) - inserted_count
-    if remaining > 0:
-        print(f"⏳ Produtos restantes para próximas execuções: {remaining}")
-    if rate_limited:
-        print(f"⚠️ Execução interrompida por rate limit. Continuará na próxima execução.")
-    print("="*60)
-    
-    # Save logs
-    if skipped_products:
-        save_skipped_products(skipped_products, "skipped_products.csv")
-        print(f"📝 Log de produtos pulados salvo em 'skipped_products.csv'")
-    
-    if failed_products:
-        save_failed_products(failed_products, "failed_products.csv")
-        print(f"📝 Log de produtos com erro salvo em 'failed_products.csv'")
-        print(f"💡 Você pode tentar sincronizar novamente esses produtos mais tarde.")
-    
-    # Exit gracefully even if rate limited - we saved progress
-    # The next run will pick up where we left off
-    if rate_limited:
-        print(f"\n✅ Progresso salvo. A sincronização continuará na próxima execução agendada.")
-
-def salvar_produtos_xbz_csv(produtos, nome_arquivo="produtos_xbz.csv"):
-    caminho_arquivo = os.path.join(os.getcwd(), nome_arquivo)
-    with open(caminho_arquivo, mode="w", newline="", encoding="utf-8") as file:
-        writer = csv.DictWriter(file, fieldnames=produtos[0].keys())
-        writer.writeheader()
-        writer.writerows(produtos)
-
-def save_skipped_products(skipped_products, nome_arquivo="skipped_products.csv"):
-    caminho_arquivo = os.path.join(os.getcwd(), nome_arquivo)
-    with open(caminho_arquivo, mode="w", newline="", encoding="utf-8") as file:
-        fieldnames = ["codigo", "motivo"]
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(skipped_products)
-
-def save_failed_products(failed_products, nome_arquivo="failed_products.csv"):
-    caminho_arquivo = os.path.join(os.getcwd(), nome_arquivo)
-    with open(caminho_arquivo, mode="w", newline="", encoding="utf-8") as file:
-        fieldnames = ["codigo", "motivo", "mensagem", "fault_code"]
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(failed_products)
+import itertools
+import json
+import logging
+from datetime import timedelta
+from app.clients.omie_client import OmieClient, OmieListingError
+from app.clients.xbz_cache import XbzCatalogCache
+from app.clients.xbz_client import XBZClient
+from app.core.catalog_index import CatalogIndex
+from app.core.journal import SyncJournal
+from app.core.insert_pipeline import run_insert_pipeline, response_status
+from app.core.preflight import MAPPING_ERRORS, PREFLIGHT_REASONS, Preflight
+from app.core.rate_governor import RateGovernor
+from app.core.scheduler import schedule
+from app.mappings.mapping import map_product
+from app.mappings.validation import validate_payload
+from app.utils.logger import get_logger, log_event
+from app.utils.metrics import get_metrics, exports_run_metrics
+from app.utils.rate_limiter import TokenBucket
+from app.utils.result_writer import CsvResultWriter, SnapshotWriter, write_csv
+import os
+import time
+
+# Maximum number of products to INSERT per workflow run
+# This prevents hitting OMIE's rate limits
+# With 3-hour intervals and ~500 products per run, we can sync ~4000 new products/day
+MAX_INSERTS_PER_RUN = 500
+
+# Inserts are paced by a shared token bucket instead of a fixed sleep after each call,
+# so request latency no longer adds to the time between inserts.
+# OMIE_REQUESTS_PER_SECOND is the sustained rate, OMIE_RATE_BURST how many requests
+# may go out back-to-back, and INSERT_WORKERS how many requests can be in flight.
+OMIE_REQUESTS_PER_SECOND = 1.0
+OMIE_RATE_BURST = 3
+INSERT_WORKERS = 3
+
+# When set, new products are sent in lots through UpsertProdutosLote
+# (one request and one rate-limit token per lot) instead of one IncluirProduto per product.
+OMIE_LOT_SIZE = None
+
+# Number of ListarProdutos pages fetched concurrently (through the same token bucket)
+OMIE_LIST_WORKERS = 4
+
+# How long a run may sleep waiting for a known OMIE block to end before giving up
+# (0 = exit right away and let the next scheduled run continue)
+OMIE_BLOCK_WAIT_SECONDS = 0
+
+# An interrupted run is resumed from the journal's pending products (without
+# downloading either catalog) as long as its plan is younger than this
+RESUME_MAX_AGE = timedelta(hours=24)
+
+# Order in which pending products spend the insert budget (see app.core.scheduler):
+# "value" (stock x sale price), "stock", "recent" (newest in the XBZ catalog) or "fifo" (XBZ order)
+INSERT_PRIORITY = "value"
+
+logger = get_logger(__name__)
+
+
+@exports_run_metrics
+def sync_products(token, cnpj, omie_app_key, omie_app_secret, dry_run=False, preview_count=None, max_inserts=None,
+                  rate_limit=None, rate_burst=None, workers=None, lot_size=None, full_refresh=False,
+                  list_workers=None, stream=False, xbz_client=None, omie_client=None, block_wait=None,
+                  resume=True, priority=None, xbz_catalog=None, mapper=None):
+    """Inserts in OMIE the XBZ products it does not have yet.
+
+    `xbz_catalog` replaces the XBZ download with products already fetched (e.g.
+    the shared snapshot of the multi-account mode) and `mapper` replaces
+    `map_product` (e.g. with payloads mapped once for every account).
+    """
+    xbz_client = xbz_client or XBZClient(token=token, cnpj=cnpj, cache=XbzCatalogCache())
+    omie_client = omie_client or OmieClient(app_key=omie_app_key, app_secret=omie_app_secret)
+    failed_products = []
+    inserted_count = 0
+    skipped_count = 0
+    failed_count = 0
+    rate_limited = False
+    api_unavailable_message = None
+    api_blocked = False
+    xbz_count = 0
+    pending_count = 0
+    metrics = get_metrics()
+    
+    # Use provided max_inserts or default
+    max_inserts_limit = max_inserts if max_inserts is not None else MAX_INSERTS_PER_RUN
+
+    # Shared by the catalog listing and the inserts
+    limiter = TokenBucket(
+        rate=rate_limit if rate_limit is not None else OMIE_REQUESTS_PER_SECOND,
+        burst=rate_burst if rate_burst is not None else OMIE_RATE_BURST,
+    )
+    # Starts from the pace learned in previous runs and knows about blocks still in effect
+    governor = RateGovernor(limiter)
+
+    if not governor.wait_if_blocked(block_wait if block_wait is not None else OMIE_BLOCK_WAIT_SECONDS):
+        logger.warning(f"⏸️ API OMIE bloqueada até {governor.blocked_until:%d/%m/%Y %H:%M:%S} "
+              f"({governor.blocked_remaining() / 60:.0f} min restantes). Nenhuma chamada será feita nesta execução.")
+        return
+
+    # Per-product outcomes are journaled so an interrupted run can pick up where it stopped
+    journal = None if dry_run else SyncJournal()
+    journal_state = journal.load() if journal else None
+    resuming = (
+        resume and journal_state is not None and bool(journal_state.pending)
+        and not full_refresh and journal_state.plan_age < RESUME_MAX_AGE
+    )
+    catalog_index = CatalogIndex()
+
+    # With a catalog cache, XBZ is asked first: an unchanged catalog that was already
+    # fully diffed, with nothing left pending, means there is nothing to do
+    xbz_cache = getattr(xbz_client, "cache", None)
+    prefetched = None
+    if not resuming and xbz_catalog is None and not stream and xbz_cache is not None:
+        logger.info("📦 Buscando produtos da XBZ...")
+        snapshot = open_produtos_xbz_snapshot()
+        with metrics.phase("xbz_fetch"):
+            prefetched = xbz_client.get_products(snapshot=snapshot)
+        logger.info(f"✅ {len(prefetched)} produtos carregados da XBZ.")
+        close_produtos_xbz_snapshot(snapshot)
+        if (not full_refresh and journal_state is not None and not journal_state.pending
+                and xbz_cache.is_processed()):
+            logger.info("✅ Catálogo XBZ sem alterações desde a última sincronização completa e nada pendente. "
+                        "Nada a fazer nesta execução.")
+            metrics.set_gauge("sync_short_circuit", 1, help_text="1 when the run stopped early on an unchanged XBZ catalog")
+            journal.close()
+            return
+
+    if resuming:
+        existing_codes = catalog_index.codes() | journal_state.known_codes
+        xbz_products = [p for p in journal_state.pending.values() if p.get("CodigoComposto") not in existing_codes]
+        total_hint = len(xbz_products)
+        xbz_feed = iter(xbz_products)
+        xbz_products = xbz_feed
+        logger.info(f"♻️ Retomando a execução anterior: {total_hint} produtos pendentes no journal "
+              f"(catálogos não serão baixados novamente).")
+    else:
+        # The OMIE catalog is loaded first so that XBZ products can be filtered
+        # (and inserted) while the supplier catalog is still being downloaded
+        logger.info("📦 Buscando produtos da OMIE...")
+        try:
+            with metrics.phase("omie_listing"):
+                catalog_index.refresh(
+                    omie_client,
+                    force_full=full_refresh,
+                    workers=list_workers if list_workers is not None else OMIE_LIST_WORKERS,
+                    limiter=limiter,
+                )
+        except OmieListingError as e:
+            if e.blocked:
+                governor.record("rate_limited", str(e))
+            # Inserting against a partial catalog would only produce duplicates
+            logger.error(f"❌ Não foi possível carregar o catálogo completo da OMIE: {e}")
+            logger.info(f"💡 Nenhuma inserção realizada. Tente novamente na próxima execução.")
+            return
+        existing_codes = catalog_index.codes()
+        if journal_state is not None:
+            existing_codes |= journal_state.known_codes
+        logger.info(f"✅ {len(existing_codes)} produtos carregados da OMIE.")
+        if journal is not None:
+            journal.start_plan()
+
+        if prefetched is not None:
+            xbz_products = prefetched
+            total_hint = len(xbz_products)
+            xbz_feed = iter(xbz_products)
+        elif xbz_catalog is not None:
+            total_hint = len(xbz_catalog) if hasattr(xbz_catalog, "__len__") else None
+            logger.info(f"✅ {total_hint if total_hint is not None else '?'} produtos XBZ recebidos do catálogo compartilhado.")
+            # Its snapshot was already written by whoever downloaded it
+            xbz_feed = iter(xbz_catalog)
+        else:
+            logger.info("📦 Buscando produtos da XBZ...")
+            snapshot = open_produtos_xbz_snapshot()
+            if stream:
+                logger.info("🌊 Modo streaming: os produtos são processados enquanto o catálogo é baixado.")
+                xbz_feed = _close_snapshot_when_exhausted(
+                    metrics.timed_iter(xbz_client.iter_products(snapshot=snapshot), "xbz_fetch"), snapshot)
+                total_hint = None
+            else:
+                with metrics.phase("xbz_fetch"):
+                    xbz_products = xbz_client.get_products(snapshot=snapshot)
+                total_hint = len(xbz_products)
+                logger.info(f"✅ {total_hint} produtos carregados da XBZ.")
+                close_produtos_xbz_snapshot(snapshot)
+                xbz_feed = iter(xbz_products)
+        xbz_products = xbz_feed
+
+    if preview_count is not None:
+        logger.info(f"⚠️ Modo preview: processando apenas {preview_count} produtos.")
+        xbz_products = itertools.islice(xbz_feed, preview_count)
+        total_hint = min(total_hint, preview_count) if total_hint is not None else None
+
+    logger.info(f"📊 Limite de inserções por execução: {max_inserts_limit}")
+    if lot_size or OMIE_LOT_SIZE:
+        logger.info(f"📦 Envio em lotes de até {lot_size or OMIE_LOT_SIZE} produtos (UpsertProdutosLote).")
+
+    # Products already in OMIE are streamed to the CSV instead of being kept until the end;
+    # a resumed run appends to the rows of the interrupted one
+    skipped_products = CsvResultWriter(os.path.join(os.getcwd(), "skipped_products.csv"),
+                                       mode="a" if resuming else "w")
+
+    def pending_products():
+        nonlocal skipped_count, xbz_count, pending_count, api_unavailable_message, api_blocked
+        for product in xbz_products:
+            xbz_count += 1
+            codigo = product.get("CodigoComposto")
+            logger.debug(f"[{xbz_count}/{total_hint or '?'}] Processando produto: {codigo}")
+
+            with metrics.phase("diff"):
+                if codigo in existing_codes:
+                    log_event(logger, logging.DEBUG, f"⏭️ Pulando {codigo} — já existe na OMIE.",
+                              event="product", codigo=codigo, status="known")
+                    skipped_count += 1
+                    skipped_products.write({
+                        "codigo": codigo,
+                        "motivo": "já existe na OMIE (verificado localmente)"
+                    })
+                    continue
+
+                pending_count += 1
+                if journal is not None and not resuming:
+                    journal.add_to_plan(product)
+            if pending_count == 1:
+                # Only probe the API once we know there is something to insert
+                logger.info("🔍 Verificando disponibilidade da API OMIE...")
+                api_status = omie_client.check_api_status()
+                if not api_status.get("available"):
+                    api_unavailable_message = api_status.get("message") or "Rate limit ativo"
+                    if api_status.get("blocked"):
+                        # Only a real OMIE block is remembered; a failed probe says nothing about the rate
+                        api_blocked = True
+                        governor.record("rate_limited", api_unavailable_message)
+                        logger.warning(f"⚠️ API OMIE bloqueada: {api_unavailable_message}")
+                        logger.info(f"💡 Aguarde o desbloqueio e tente novamente na próxima execução.")
+                    else:
+                        logger.warning(f"⚠️ API OMIE indisponível: {api_unavailable_message}")
+                        logger.info(f"💡 Nenhuma inserção realizada. Tente novamente na próxima execução.")
+                    return
+                logger.info("✅ API OMIE disponível.")
+
+            yield product
+
+    def count_remaining():
+        # Consumes the rest of the feed (snapshot and totals) without processing it
+        nonlocal xbz_count, pending_count
+        for product in xbz_products:
+            with metrics.phase("diff"):
+                xbz_count += 1
+                if product.get("CodigoComposto") not in existing_codes:
+                    pending_count += 1
+                    if journal is not None and not resuming:
+                        journal.add_to_plan(product)
+
+    # Any other order has to see every pending product first, which would
+    # undo the constant memory of streaming: stream mode defaults to XBZ order
+    priority = priority or ("fifo" if stream else INSERT_PRIORITY)
+    scheduled = schedule(pending_products(), priority)
+    if priority != "fifo":
+        logger.info(f"🎯 Prioridade de inserção: {priority} (todos os pendentes são avaliados antes do envio).")
+
+    if dry_run:
+        for product in scheduled:
+            try:
+                with metrics.phase("mapping"):
+                    omie_payload = (mapper or map_product)(product)
+            except MAPPING_ERRORS as e:
+                logger.warning(f"🚫 Produto {product.get('CodigoComposto')} seria rejeitado: falha no mapeamento "
+                               f"({type(e).__name__}: {e})")
+                continue
+            problems = validate_payload(omie_payload)
+            if problems:
+                logger.warning(f"🚫 Produto {product.get('CodigoComposto')} seria rejeitado pela OMIE: {'; '.join(problems)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("🧾 OMIE Payload: " + json.dumps(omie_payload, indent=2, ensure_ascii=False))
+            else:
+                log_event(logger, logging.INFO, f"🧾 Produto {product.get('CodigoComposto')} pronto para envio (dry run)",
+                          event="product", codigo=product.get("CodigoComposto"), status="dry_run")
+    else:
+        inserts_started = time.perf_counter()
+        # Payloads OMIE would reject (locally invalid or rejected before) are not sent
+        preflight = Preflight()
+        results = run_insert_pipeline(
+            omie_client,
+            scheduled,
+            limiter,
+            max_inserts=max_inserts_limit,
+            workers=workers if workers is not None else INSERT_WORKERS,
+            lot_size=lot_size if lot_size is not None else OMIE_LOT_SIZE,
+            mapper=mapper,
+            preflight=preflight,
+            governor=governor,
+        )
+        for product, omie_payload, response in results:
+            codigo = product.get("CodigoComposto")
+            status = response_status(response)
+            held_back = status == "error" and response.get("reason") in PREFLIGHT_REASONS
+
+            if status == "rate_limited":
+                # Requests already in flight still get reported after this one
+                if not rate_limited:
+                    logger.warning("⏸️ API bloqueada. Salvando progresso e encerrando.")
+                rate_limited = True
+            elif status == "skipped":
+                log_event(logger, logging.INFO, f"⏭️ Produto {codigo} já existe na OMIE (confirmado pela API)",
+                          event="product", codigo=codigo, status="skipped", reason=response.get("reason"))
+                journal.record(codigo, "skipped", response.get("reason"))
+                skipped_count += 1
+                skipped_products.write({
+                    "codigo": codigo,
+                    "motivo": response.get("reason", "já existe")
+                })
+            elif status == "error":
+                if held_back:
+                    log_event(logger, logging.WARNING, f"🚫 Produto {codigo} não enviado: {response.get('message')}",
+                              event="product", codigo=codigo, status="held_back", reason=response.get("reason"),
+                              message=response.get("message"))
+                else:
+                    log_event(logger, logging.WARNING, f"❌ Falha ao inserir produto {codigo}: {response.get('message')}",
+                              event="product", codigo=codigo, status="failed", reason=response.get("reason"),
+                              message=response.get("message"), fault=response.get("fault"))
+                journal.record(codigo, "failed", response.get("reason"), response.get("message"))
+                failed_count += 1
+                failed_products.append({
+                    "codigo": codigo,
+                    "motivo": response.get("reason", "erro desconhecido"),
+                    "mensagem": response.get("message", ""),
+                    "fault_code": response.get("fault", "")
+                })
+            else:
+                codigo_produto = response.get("codigo_produto") if isinstance(response, dict) else None
+                log_event(logger, logging.INFO, f"✅ Produto {codigo} inserido com sucesso!",
+                          event="product", codigo=codigo, status="inserted", codigo_produto=codigo_produto)
+                logger.debug(f"📬 OMIE Response: {response}")
+                inserted_count += 1
+                journal.record(codigo, "inserted")
+                catalog_index.add(codigo, codigo_produto)
+
+        # Wall time of the insert loop; it includes the diff and mapping (and, when
+        # streaming, the XBZ download) of the products it pulled
+        metrics.add_phase_time("inserts", time.perf_counter() - inserts_started)
+        preflight.close()
+        if inserted_count >= max_inserts_limit:
+            logger.info(f"⏸️ Limite de {max_inserts_limit} inserções atingido. Continuará na próxima execução.")
+    count_remaining()
+    for _ in xbz_feed:
+        # When streaming, products left out by the preview still go to the catalog snapshot
+        pass
+    skipped_products.close()
+    if journal is not None:
+        journal.close()
+        if prefetched is not None and preview_count is None:
+            # Every product of this catalog content has been diffed and journaled
+            xbz_cache.mark_processed()
+
+    for result, count in (("xbz_total", xbz_count), ("already_in_omie", len(existing_codes)),
+                          ("pending", pending_count), ("inserted", inserted_count),
+                          ("skipped", skipped_count), ("failed", failed_count)):
+        metrics.set_gauge("sync_products", count, help_text="Products per sync result in this run", result=result)
+    metrics.set_gauge("sync_rate_limited", int(rate_limited or api_blocked),
+                      help_text="1 when the run was stopped by an OMIE block")
+    metrics.set_gauge("omie_rate_limit_rps", round(governor.rate, 4), help_text="Token bucket rate at the end of the run")
+    log_event(logger, logging.INFO, "📊 Totais da execução", event="summary", xbz_total=xbz_count,
+              already_in_omie=len(existing_codes), pending=pending_count, inserted=inserted_count,
+              skipped=skipped_count, failed=failed_count, rate_limited=rate_limited or api_blocked)
+
+    # Summary
+    logger.info("="*60)
+    logger.info("📊 RESUMO DA SINCRONIZAÇÃO")
+    logger.info("="*60)
+    logger.info(f"📦 Total de produtos XBZ: {xbz_count}")
+    if api_unavailable_message is not None:
+        logger.info(f"✅ Produtos já sincronizados: {len(existing_codes)}")
+        logger.info(f"⏳ Produtos aguardando sincronização: {pending_count}")
+        logger.warning(f"⚠️ Nenhuma inserção realizada - API {'bloqueada' if api_blocked else 'indisponível'}.")
+        logger.info("="*60)
+        return
+    if pending_count == 0:
+        logger.info(f"✅ Todos os {len(existing_codes)} produtos já estão na OMIE.")
+        logger.info("="*60)
+        return
+    logger.info(f"✅ Produtos inseridos nesta execução: {inserted_count}")
+    logger.info(f"⏭️ Produtos pulados (já existem): {skipped_count}")
+    logger.info(f"❌ Produtos com erro: {failed_count}")
+    remaining = pending_count - inserted_count
+    if remaining > 0:
+        logger.info(f"⏳ Produtos restantes para próximas execuções: {remaining}")
+    if rate_limited:
+        logger.warning(f"⚠️ Execução interrompida por rate limit. Continuará na próxima execução.")
+    logger.info("="*60)
+    
+    # Save logs
+    if skipped_count:
+        logger.info(f"📝 Log de produtos pulados salvo em 'skipped_products.csv'")
+    
+    if failed_products:
+        save_failed_products(failed_products, "failed_products.csv")
+        logger.info(f"📝 Log de produtos com erro salvo em 'failed_products.csv'")
+        logger.info(f"💡 Você pode tentar sincronizar novamente esses produtos mais tarde.")
+    
+    # Exit gracefully even if rate limited - we saved progress
+    # The next run will pick up where we left off
+    if rate_limited:
+        logger.info(f"✅ Progresso salvo. A sincronização continuará na próxima execução agendada.")
+
+def salvar_produtos_xbz_csv(produtos, nome_arquivo="produtos_xbz.csv"):
+    write_csv(os.path.join(os.getcwd(), nome_arquivo), produtos)
+
+def open_produtos_xbz_snapshot(nome_base="produtos_xbz"):
+    """Compressed snapshot of the XBZ catalog with every supplier field.
+
+    The XBZ client writes each full product to it while parsing the download
+    (`get_products(snapshot=...)`), before projecting it to `XbzProduct`. It
+    goes to `produtos_xbz.parquet`, or `produtos_xbz.csv.gz` without pyarrow,
+    once `close_produtos_xbz_snapshot` is called.
+    """
+    return SnapshotWriter(os.path.join(os.getcwd(), nome_base))
+
+def close_produtos_xbz_snapshot(snapshot):
+    caminho = snapshot.close()
+    logger.info(f"📝 Catálogo XBZ salvo em '{os.path.basename(caminho)}' ({snapshot.count} produtos)")
+
+def _close_snapshot_when_exhausted(produtos, snapshot):
+    # Streaming: the snapshot is complete once the download has been read to the end
+    yield from produtos
+    close_produtos_xbz_snapshot(snapshot)
+
+def save_skipped_products(skipped_products, nome_arquivo="skipped_products.csv"):
+    write_csv(os.path.join(os.getcwd(), nome_arquivo), skipped_products, ["codigo", "motivo"])
+
+def save_failed_products(failed_products, nome_arquivo="failed_products.csv"):
+    write_csv(os.path.join(os.getcwd(), nome_arquivo), failed_products, ["codigo", "motivo", "mensagem", "fault_code"])
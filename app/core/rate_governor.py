@@ -0,0 +1,130 @@
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from app.utils.logger import get_logger
+from app.utils.state import state_path
+
+# Used when OMIE blocks us without saying for how long
+DEFAULT_BLOCK_SECONDS = 30 * 60
+
+logger = get_logger(__name__)
+
+_WAIT_PATTERN = re.compile(r"(\d+)\s*(segundos?|seg|s\b|minutos?|min|horas?|h\b)", re.IGNORECASE)
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_block_seconds(faultstring: str):
+    """Extracts the wait time from an OMIE MISUSE_API_PROCESS faultstring, in seconds.
+
+    Handles messages like "Tente novamente em 1800 segundos" or "Aguarde 30 minutos".
+    Returns None when the message has no wait time.
+    """
+    match = _WAIT_PATTERN.search(faultstring or "")
+    if not match:
+        return None
+    return int(match.group(1)) * _UNIT_SECONDS[match.group(2)[0].lower()]
+
+
+class RateGovernor:
+    """Adapts the pace of a `TokenBucket` to what OMIE tolerates and remembers it between runs.
+
+    - a MISUSE_API_PROCESS block halves the rate and records when the block ends;
+    - transient server errors and timeouts (usually the first sign of overload) slow it down a bit;
+    - every `increase_after` clean calls in a row speed it up by `step`, up to `max_rate`.
+
+    The block expiry and the last safe rate are kept in a small JSON file, so a
+    run that starts during a block can stop (or wait) without calling the API.
+    """
+
+    def __init__(self, limiter, path=None, max_rate=None, min_rate=0.1, increase_after=50, step=0.1,
+                 decrease_factor=0.5, slowdown_factor=0.8):
+        self.limiter = limiter
+        self.path = path or state_path("rate_governor.json")
+        self.max_rate = max_rate or limiter.rate
+        self.min_rate = min_rate
+        self.increase_after = increase_after
+        self.step = step
+        self.decrease_factor = decrease_factor
+        self.slowdown_factor = slowdown_factor
+        self._lock = threading.Lock()
+        self._clean_streak = 0
+        self.blocked_until = None
+
+        state = self._load()
+        if state.get("blocked_until"):
+            self.blocked_until = datetime.fromisoformat(state["blocked_until"])
+        if state.get("safe_rate"):
+            limiter.set_rate(max(self.min_rate, min(self.max_rate, float(state["safe_rate"]))))
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save(self):
+        state = {
+            "blocked_until": self.blocked_until.isoformat() if self.blocked_until else None,
+            "safe_rate": round(self.limiter.rate, 4),
+            "updated_at": datetime.now().isoformat(),
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(state, file)
+        os.replace(tmp_path, self.path)
+
+    @property
+    def rate(self) -> float:
+        return self.limiter.rate
+
+    def blocked_remaining(self) -> float:
+        """Seconds until the last known OMIE block ends (0 when not blocked)."""
+        if self.blocked_until is None:
+            return 0.0
+        return max(0.0, (self.blocked_until - datetime.now()).total_seconds())
+
+    def wait_if_blocked(self, max_wait: float = 0) -> bool:
+        """Sleeps through a known block if it ends within `max_wait` seconds.
+
+        Returns True when the API can be used now, False when the caller should give up.
+        """
+        remaining = self.blocked_remaining()
+        if remaining <= 0:
+            return True
+        if remaining > max_wait:
+            return False
+        logger.warning(f"⏳ API OMIE bloqueada. Aguardando {remaining:.0f}s até o desbloqueio...")
+        time.sleep(remaining)
+        return True
+
+    def _set_rate(self, rate):
+        self.limiter.set_rate(max(self.min_rate, min(self.max_rate, rate)))
+
+    def record(self, status: str, message: str = None):
+        """Feeds the outcome of one OMIE call: "ok", "rate_limited", "server_error", "timeout" or "error"."""
+        with self._lock:
+            if status == "rate_limited":
+                self._clean_streak = 0
+                if self.blocked_remaining() > 0:
+                    # Other requests that were in flight when the block started
+                    return
+                wait_seconds = parse_block_seconds(message) or DEFAULT_BLOCK_SECONDS
+                self.blocked_until = datetime.now() + timedelta(seconds=wait_seconds)
+                self._set_rate(self.limiter.rate * self.decrease_factor)
+                logger.warning(f"🐢 Bloqueio da OMIE até {self.blocked_until:%H:%M:%S}. Ritmo reduzido para {self.limiter.rate:.2f} req/s.")
+                self._save()
+            elif status in ("server_error", "timeout"):
+                self._clean_streak = 0
+                self._set_rate(self.limiter.rate * self.slowdown_factor)
+                self._save()
+            elif status == "ok":
+                self._clean_streak += 1
+                if self._clean_streak >= self.increase_after:
+                    self._clean_streak = 0
+                    if self.limiter.rate < self.max_rate:
+                        self._set_rate(self.limiter.rate + self.step)
+                        self._save()
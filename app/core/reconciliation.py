@@ -0,0 +1,220 @@
+import json
+import os
+import re
+from datetime import datetime
+from app.clients.omie_client import UPSERT_REQUIRED_FIELDS
+from app.core.insert_pipeline import response_status
+from app.mappings.batch_mapping import map_products
+from app.utils.logger import get_logger
+from app.utils.result_writer import write_csv
+
+# `map_product` fields compared with the OMIE record: text, NCM (digits only) or
+# a number compared at the given precision
+COMPARED_FIELDS = {
+    "descricao": "text",
+    "descr_detalhada": "text",
+    "ncm": "ncm",
+    "unidade": "text",
+    "valor_unitario": 2,
+    "quantidade_estoque": 0,
+    "peso_bruto": 3,
+    "altura": 3,
+    "largura": 3,
+    "profundidade": 3,
+}
+# Like `map_product_update`, an unknown (zero) dimension in XBZ never counts as drift
+OPTIONAL_FIELDS = ("altura", "largura", "profundidade")
+
+REPORT_FILE = "reconciliation_report.json"
+MISMATCHES_FILE = "reconciliation_mismatches.csv"
+UPDATE_PLAN_FILE = "reconciliation_update_plan.jsonl"
+
+logger = get_logger(__name__)
+
+
+def _text(value):
+    return "" if value is None else str(value).strip()
+
+
+def _ncm(value):
+    return re.sub(r"\D", "", str(value or ""))
+
+
+def _number(decimals):
+    def normalize(value):
+        try:
+            return round(float(value or 0), decimals)
+        except (TypeError, ValueError):
+            return None
+    return normalize
+
+
+def _normalizers(fields):
+    return [
+        (field, _text if rule == "text" else _ncm if rule == "ncm" else _number(rule))
+        for field, rule in fields.items()
+    ]
+
+
+def expected_records(xbz_products, unmappable=None) -> dict:
+    """`map_product` output per code (vectorized), with the stock `map_product_update` sends.
+
+    Codes of the products that cannot be mapped are appended to `unmappable` (if given).
+    """
+    expected = {}
+    for product, payload in zip(xbz_products, map_products(xbz_products)):
+        if payload is None:
+            if unmappable is not None:
+                unmappable.append(product.get("CodigoComposto"))
+            continue
+        try:
+            quantidade = int(product.get("QuantidadeDisponivelEstoquePrincipal") or 0)
+        except (TypeError, ValueError):
+            quantidade = 0
+        payload["quantidade_estoque"] = max(quantidade, 0)
+        expected[payload["codigo_produto_integracao"]] = payload
+    return expected
+
+
+class Reconciliation:
+    """Categorized diff between the XBZ catalog (as `map_product` would send it) and OMIE.
+
+    - `missing_in_omie`: XBZ codes with no OMIE product;
+    - `orphaned_in_omie`: OMIE products whose code is not in the XBZ catalog;
+    - `mismatches`: code -> {field: (value in OMIE, value expected from XBZ)};
+    - `unmappable`: XBZ codes `map_product` cannot map (e.g. a non-numeric price),
+      so there is nothing to compare them with.
+
+    OMIE products without `codigo_produto_integracao` cannot be joined and are
+    only counted (`sem_codigo_integracao`).
+    """
+
+    def __init__(self):
+        self.missing_in_omie = []
+        self.orphaned_in_omie = []
+        self.mismatches = {}
+        # code -> the fields an upsert requires, with the XBZ values (mismatched products only)
+        self.required_fields = {}
+        self.unmappable = []
+        self.matched = 0
+        self.xbz_total = 0
+        self.omie_total = 0
+        self.sem_codigo_integracao = 0
+        self.created_at = datetime.now()
+
+    def field_counts(self) -> dict:
+        counts = {}
+        for fields in self.mismatches.values():
+            for field in fields:
+                counts[field] = counts.get(field, 0) + 1
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+    def summary(self) -> dict:
+        return {
+            "created_at": self.created_at.isoformat(timespec="seconds"),
+            "xbz_total": self.xbz_total,
+            "omie_total": self.omie_total,
+            "sem_codigo_integracao": self.sem_codigo_integracao,
+            "matched": self.matched,
+            "in_sync": self.matched - len(self.mismatches),
+            "missing_in_omie": len(self.missing_in_omie),
+            "orphaned_in_omie": len(self.orphaned_in_omie),
+            "unmappable": len(self.unmappable),
+            "with_mismatches": len(self.mismatches),
+            "mismatches_by_field": self.field_counts(),
+        }
+
+    def update_plan(self) -> list:
+        """`update_products_batch` records: the fields to change plus the ones the upsert requires (XBZ values)."""
+        return [
+            {**self.required_fields.get(codigo, {"codigo_produto_integracao": codigo}),
+             **{field: expected for field, (_, expected) in fields.items()}}
+            for codigo, fields in self.mismatches.items()
+        ]
+
+    def write(self, directory=None) -> list:
+        """Writes the JSON report, the mismatches CSV and the update plan; returns their paths."""
+        directory = directory or os.getcwd()
+        report_path = os.path.join(directory, REPORT_FILE)
+        with open(report_path, "w", encoding="utf-8") as file:
+            json.dump({
+                **self.summary(),
+                "missing_in_omie": self.missing_in_omie,
+                "orphaned_in_omie": self.orphaned_in_omie,
+                "unmappable": self.unmappable,
+            }, file, indent=2, ensure_ascii=False, default=str)
+
+        mismatches_path = write_csv(
+            os.path.join(directory, MISMATCHES_FILE),
+            ({"codigo": codigo, "campo": field, "omie": omie_value, "xbz": expected}
+             for codigo, fields in self.mismatches.items() for field, (omie_value, expected) in fields.items()),
+            ["codigo", "campo", "omie", "xbz"],
+        )
+
+        plan_path = os.path.join(directory, UPDATE_PLAN_FILE)
+        with open(plan_path, "w", encoding="utf-8") as file:
+            for record in self.update_plan():
+                file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        return [report_path, mismatches_path, plan_path]
+
+
+def reconcile(xbz_products, omie_products, fields=None) -> Reconciliation:
+    """Joins both catalogs on `codigo_produto_integracao` in a single pass over hash indexes."""
+    xbz_products = list(xbz_products)
+    normalizers = _normalizers(fields or COMPARED_FIELDS)
+    result = Reconciliation()
+
+    expected_by_code = expected_records(xbz_products, result.unmappable)
+    omie_by_code = {}
+    for product in omie_products:
+        codigo = product.get("codigo_produto_integracao")
+        # Empty in the API; None or NaN when the catalog comes from a file
+        if not codigo or codigo != codigo:
+            result.sem_codigo_integracao += 1
+            continue
+        omie_by_code[codigo] = product
+    result.xbz_total = len(expected_by_code) + len(result.unmappable)
+    result.omie_total = len(omie_by_code)
+
+    for codigo, expected in expected_by_code.items():
+        omie = omie_by_code.get(codigo)
+        if omie is None:
+            result.missing_in_omie.append(codigo)
+            continue
+        result.matched += 1
+        diff = {}
+        for field, normalize in normalizers:
+            expected_value = expected.get(field)
+            omie_value = omie.get(field)
+            if omie_value == expected_value:
+                # Most fields of a product in sync: no need to normalize
+                continue
+            if field in OPTIONAL_FIELDS and not normalize(expected_value):
+                continue
+            if normalize(omie_value) != normalize(expected_value):
+                diff[field] = (omie_value, expected_value)
+        if diff:
+            result.mismatches[codigo] = diff
+            result.required_fields[codigo] = {field: expected.get(field) for field in UPSERT_REQUIRED_FIELDS}
+
+    unmappable = set(result.unmappable)
+    result.orphaned_in_omie = [codigo for codigo in omie_by_code
+                               if codigo not in expected_by_code and codigo not in unmappable]
+    return result
+
+
+def apply_update_plan(omie_client, plan, limiter, lot_size=50) -> dict:
+    """Sends an update plan in `UpsertProdutosLote` lots; returns how many records were updated or failed."""
+    counts = {"updated": 0, "failed": 0, "not_sent": 0}
+    for start in range(0, len(plan), lot_size):
+        lot = plan[start:start + lot_size]
+        limiter.acquire()
+        responses = omie_client.update_products_batch(lot, lot_size=lot_size, limiter=limiter)
+        statuses = [response_status(response) for response in responses]
+        counts["updated"] += statuses.count("inserted")
+        counts["failed"] += sum(status == "error" for status in statuses)
+        if "rate_limited" in statuses:
+            counts["not_sent"] = len(plan) - counts["updated"] - counts["failed"]
+            logger.warning("⏸️ API bloqueada. O restante do plano não foi enviado.")
+            break
+    return counts
@@ -0,0 +1,133 @@
+import heapq
+import itertools
+import sqlite3
+import threading
+from datetime import datetime
+from app.mappings.mapping import aplicar_markup
+from app.utils.state import state_path
+
+STRATEGIES = ("fifo", "stock", "value", "recent")
+
+
+def _number(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def stock_priority(product: dict) -> float:
+    return max(0.0, _number(product.get("QuantidadeDisponivelEstoquePrincipal")))
+
+
+def value_priority(product: dict) -> float:
+    """Stock valued at the OMIE sale price (same markup as `map_product`)."""
+    quantidade = stock_priority(product)
+    return aplicar_markup(_number(product.get("PrecoVenda")), quantidade) * quantidade
+
+
+class FirstSeenStore:
+    """Remembers when each XBZ product code was first seen pending, for the "recent" strategy."""
+
+    def __init__(self, path=None):
+        self.path = path or state_path("xbz_first_seen.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS first_seen (
+                codigo TEXT PRIMARY KEY,
+                seen_at TEXT
+            )
+        """)
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def stamp(self, codes) -> dict:
+        """Records `codes` not seen before (as of now) and returns code -> first seen timestamp."""
+        codes = list(codes)
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO first_seen (codigo, seen_at) VALUES (?, ?)", ((code, now) for code in codes)
+            )
+            self._conn.commit()
+            seen = {}
+            for start in range(0, len(codes), 500):
+                chunk = codes[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                seen.update(self._conn.execute(
+                    f"SELECT codigo, seen_at FROM first_seen WHERE codigo IN ({placeholders})", chunk
+                ).fetchall())
+        return seen
+
+
+class PriorityScheduler:
+    """Orders pending products so the insert budget goes to the most important ones first.
+
+    `priority` maps a product to a number (higher goes first); ties keep the XBZ
+    order. All pending products are collected before the first one is released,
+    but the heap is only popped as far as the pipeline consumes it.
+    """
+
+    def __init__(self, priority):
+        self.priority = priority
+        self._heap = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def extend(self, products):
+        for product in products:
+            self._heap.append((-self.priority(product), next(self._counter), product))
+        heapq.heapify(self._heap)
+        return self
+
+    def __iter__(self):
+        while self._heap:
+            yield heapq.heappop(self._heap)[2]
+
+
+def schedule(products, strategy="fifo", first_seen_store=None):
+    """Returns an iterator over `products` (pending products only) in the order of `strategy`.
+
+    - "fifo": XBZ order, streamed without waiting for the whole feed;
+    - "stock": highest available stock first;
+    - "value": highest stock value at sale price (stock x marked-up price) first;
+    - "recent": products that appeared most recently in the XBZ catalog first.
+
+    `products` is only consumed once the iterator is.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Estratégia de prioridade desconhecida: {strategy} (use {', '.join(STRATEGIES)})")
+    if strategy == "fifo":
+        return iter(products)
+    return _prioritized(products, strategy, first_seen_store)
+
+
+def priority_function(strategy, products=(), first_seen_store=None):
+    """Key function of a non-fifo `strategy`; "recent" needs the `products` it will rank."""
+    if strategy == "stock":
+        return stock_priority
+    if strategy == "value":
+        return value_priority
+    if strategy == "recent":
+        store = first_seen_store or FirstSeenStore()
+        seen = store.stamp(product.get("CodigoComposto") for product in products)
+        if first_seen_store is None:
+            store.close()
+
+        def recent_priority(product):
+            seen_at = seen.get(product.get("CodigoComposto"))
+            return datetime.fromisoformat(seen_at).timestamp() if seen_at else 0.0
+        return recent_priority
+    raise ValueError(f"Estratégia de prioridade desconhecida: {strategy} (use {', '.join(STRATEGIES)})")
+
+
+def _prioritized(products, strategy, first_seen_store):
+    if strategy == "recent":
+        products = list(products)
+    priority = priority_function(strategy, products, first_seen_store)
+    yield from PriorityScheduler(priority).extend(products)
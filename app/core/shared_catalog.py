@@ -0,0 +1,91 @@
+import json
+import mmap
+import os
+from datetime import datetime
+from app.mappings.batch_mapping import map_products
+from app.mappings.mapping import map_product
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class SharedCatalog:
+    """XBZ catalog fetched and mapped once, read by several processes through a memory map.
+
+    The file is one JSON line per product holding the XBZ product and its OMIE
+    payload, after a header line with the product count. Readers map it
+    read-only, so every process shares the same page cache instead of holding
+    its own copy of the raw catalog; a product is only decoded when iterated and
+    its payload only when `payload_for` asks for it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        header_end = self._map.find(b"\n")
+        header = json.loads(self._map[:header_end])
+        self.count = header["count"]
+        self.created_at = header.get("created_at")
+        self._body_start = header_end + 1
+        # code -> (start, end) of its line, filled while iterating
+        self._offsets = {}
+
+    @classmethod
+    def write(cls, path, products):
+        """Maps `products` (vectorized) and writes them with their payloads to `path` (atomically).
+
+        Products that cannot be mapped are kept with a None payload, so each
+        account's preflight holds them back as `invalid_payload`.
+        """
+        products = list(products)
+        payloads = map_products(products)
+        unmappable = [product.get("CodigoComposto") for product, payload in zip(products, payloads) if payload is None]
+        if unmappable:
+            logger.warning(f"⚠️ {len(unmappable)} produtos XBZ não puderam ser mapeados e não serão enviados: "
+                           f"{', '.join(str(codigo) for codigo in unmappable[:20])}"
+                           f"{' ...' if len(unmappable) > 20 else ''}")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as file:
+            header = {"count": len(products), "created_at": datetime.now().isoformat(timespec="seconds")}
+            file.write(json.dumps(header).encode() + b"\n")
+            for product, payload in zip(products, payloads):
+                line = json.dumps({"produto": dict(product), "payload": payload}, ensure_ascii=False, default=str)
+                file.write(line.encode("utf-8") + b"\n")
+        os.replace(tmp_path, path)
+        return path
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        position = self._body_start
+        size = len(self._map)
+        while position < size:
+            end = self._map.find(b"\n", position)
+            if end < 0:
+                end = size
+            product = json.loads(self._map[position:end])["produto"]
+            self._offsets[product.get("CodigoComposto")] = (position, end)
+            yield product
+            position = end + 1
+
+    def payload_for(self, product: dict) -> dict:
+        """OMIE payload mapped when the catalog was written (`map_product` for products not in it).
+
+        A product that could not be mapped then goes through `map_product`
+        again, so it raises the same error as in a single-account run.
+        """
+        offsets = self._offsets.get(product.get("CodigoComposto"))
+        payload = None if offsets is None else json.loads(self._map[offsets[0]:offsets[1]])["payload"]
+        return payload if payload is not None else map_product(product)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
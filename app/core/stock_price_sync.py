@@ -0,0 +1,192 @@
+import logging
+import sqlite3
+from datetime import datetime
+from app.clients.omie_client import UPSERT_REQUIRED_FIELDS
+from app.core.catalog_index import CatalogIndex
+from app.core.insert_pipeline import response_status
+from app.core.preflight import MAPPING_ERRORS
+from app.core.product_sync import OMIE_RATE_BURST, OMIE_REQUESTS_PER_SECOND
+from app.core.rate_governor import RateGovernor
+from app.mappings.mapping import map_product, map_product_update
+from app.utils.logger import get_logger, log_event
+from app.utils.rate_limiter import TokenBucket
+from app.utils.state import state_path
+
+# Products per UpsertProdutosLote call (one rate-limit token per lot)
+STOCK_PRICE_LOT_SIZE = 50
+
+logger = get_logger(__name__)
+
+
+def stock_and_price(xbz_product: dict) -> tuple:
+    """(stock, price in centavos) as `map_product_update` sends them to OMIE."""
+    param_data = map_product_update(xbz_product)
+    return param_data["quantidade_estoque"], round(param_data["valor_unitario"] * 100)
+
+
+def update_record(xbz_product: dict, value: tuple) -> dict:
+    """The `UpsertProdutosLote` record that sets `value` (stock, price in centavos) on an existing product.
+
+    The required fields carry the values the regular sync created the product
+    with; no other field of the OMIE record is sent.
+    """
+    payload = map_product(xbz_product)
+    estoque, preco = value
+    record = {field: payload[field] for field in UPSERT_REQUIRED_FIELDS}
+    record.update(quantidade_estoque=estoque, valor_unitario=preco / 100)
+    return record
+
+
+class StockPriceTable:
+    """Last (stock, price) pushed to OMIE per product code.
+
+    Kept in memory as a dict of small int tuples (a few dozen bytes per code) and
+    persisted in `state/stock_price.sqlite3`; only rows that changed are written back.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or state_path("stock_price.sqlite3")
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS stock_price (
+                codigo TEXT PRIMARY KEY,
+                estoque INTEGER NOT NULL,
+                preco_centavos INTEGER NOT NULL,
+                updated_at TEXT
+            )
+        """)
+        self._conn.commit()
+        self._values = {
+            codigo: (estoque, preco)
+            for codigo, estoque, preco in self._conn.execute("SELECT codigo, estoque, preco_centavos FROM stock_price")
+        }
+        self._dirty = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def get(self, codigo):
+        return self._values.get(codigo)
+
+    def put(self, codigo, value: tuple):
+        self._values[codigo] = value
+        self._dirty[codigo] = value
+
+    def save(self):
+        if not self._dirty:
+            return
+        now = datetime.now().isoformat()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO stock_price (codigo, estoque, preco_centavos, updated_at) VALUES (?, ?, ?, ?)",
+            ((codigo, estoque, preco, now) for codigo, (estoque, preco) in self._dirty.items()),
+        )
+        self._conn.commit()
+        self._dirty = {}
+
+    def close(self):
+        self.save()
+        self._conn.close()
+
+
+def find_deltas(xbz_products, table, known_codes) -> list:
+    """Single pass over the XBZ feed: `(codigo, (stock, price), record)` of the products in OMIE
+    whose stock or price differ from what was last pushed (`record` as `update_record` builds it)."""
+    deltas = []
+    for product in xbz_products:
+        codigo = product.get("CodigoComposto")
+        if codigo not in known_codes:
+            # Not in OMIE yet: the regular sync inserts it with every field
+            continue
+        try:
+            value = stock_and_price(product)
+        except (TypeError, ValueError) as e:
+            logger.debug(f"⚠️ Estoque/preço inválido para {codigo}: {e}")
+            continue
+        if table.get(codigo) != value:
+            try:
+                record = update_record(product, value)
+            except MAPPING_ERRORS as e:
+                logger.warning(f"⚠️ Produto {codigo} não pode ser mapeado, estoque/preço não enviados: {e!r}")
+                continue
+            deltas.append((codigo, value, record))
+    return deltas
+
+
+def sync_stock_and_prices(xbz_client, omie_client, rate_limit=None, rate_burst=None, lot_size=None,
+                          table=None, catalog_index=None):
+    """Pushes to OMIE only the stock and prices that changed since the last push.
+
+    Cheap enough to run every few minutes: the XBZ catalog is streamed once, no
+    OMIE listing is made (products are matched against the local catalog index
+    kept by the regular sync) and changes go out in `UpsertProdutosLote` lots,
+    each record carrying the fields the upsert requires (`update_record`).
+    Lots OMIE rejects are resent item by item with `AlterarProduto`; those
+    products are counted and reported. Products that fail keep their old value in the table, so they are sent
+    again next time. Returns the number of products updated.
+    """
+    limiter = TokenBucket(
+        rate=rate_limit if rate_limit is not None else OMIE_REQUESTS_PER_SECOND,
+        burst=rate_burst if rate_burst is not None else OMIE_RATE_BURST,
+    )
+    governor = RateGovernor(limiter)
+    if not governor.wait_if_blocked(0):
+        logger.warning(f"⏸️ API OMIE bloqueada até {governor.blocked_until:%d/%m/%Y %H:%M:%S}. "
+                       f"Estoque e preços não serão enviados nesta execução.")
+        return 0
+
+    own_table = table is None
+    own_index = catalog_index is None
+    table = StockPriceTable() if own_table else table
+    catalog_index = CatalogIndex() if own_index else catalog_index
+    lot_size = lot_size or STOCK_PRICE_LOT_SIZE
+    updated = failed = sent_individually = 0
+    try:
+        known_codes = catalog_index.codes()
+        if not len(table):
+            logger.info("ℹ️ Primeira execução: estoque e preço de todos os produtos serão enviados.")
+        deltas = find_deltas(xbz_client.iter_products(), table, known_codes)
+        logger.info(f"📊 {len(deltas)} produtos com estoque ou preço alterado ({len(known_codes)} na OMIE).")
+
+        for start in range(0, len(deltas), lot_size):
+            lot = deltas[start:start + lot_size]
+            limiter.acquire()
+            responses = omie_client.update_products_batch(
+                [record for _, _, record in lot],
+                lot_size=lot_size,
+                limiter=limiter,
+                governor=governor,
+            )
+            blocked = False
+            for (codigo, value, _), response in zip(lot, responses):
+                status = response_status(response)
+                if isinstance(response, dict) and response.get("sent_individually"):
+                    sent_individually += 1
+                if status == "inserted":
+                    table.put(codigo, value)
+                    updated += 1
+                elif status == "rate_limited":
+                    blocked = True
+                else:
+                    failed += 1
+                    log_event(logger, logging.WARNING, f"❌ Falha ao atualizar estoque/preço de {codigo}: "
+                              f"{response.get('message')}", event="stock_price", codigo=codigo, status="failed",
+                              reason=response.get("reason"))
+            # Progress survives an interrupted run
+            table.save()
+            if blocked:
+                logger.warning("⏸️ API bloqueada. O restante será enviado na próxima execução.")
+                break
+    finally:
+        if own_table:
+            table.close()
+        else:
+            table.save()
+        if own_index:
+            catalog_index.close()
+
+    if sent_individually:
+        logger.warning(f"⚠️ {sent_individually} produtos foram enviados um a um (AlterarProduto) porque a OMIE "
+                       f"rejeitou o lote.")
+    log_event(logger, logging.INFO, f"✅ Estoque e preço atualizados: {updated} produtos ({failed} com erro).",
+              event="stock_price_summary", updated=updated, failed=failed, sent_individually=sent_individually)
+    return updated
@@ -0,0 +1,152 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from app.core.journal import RETRYABLE_REASONS
+from app.utils.state import state_path
+
+MAX_ATTEMPTS = 5
+
+
+class WorkQueue:
+    """Persistent queue of XBZ products waiting to be inserted in OMIE.
+
+    Items are keyed by `CodigoComposto` and claimed in priority order (highest
+    first, then oldest). Claimed items are marked `in_flight` until completed
+    or released; `recover` puts the ones left by a crash back in the queue.
+    """
+
+    def __init__(self, path=None, max_attempts=MAX_ATTEMPTS):
+        self.path = path or state_path("work_queue.sqlite3")
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS items (
+                codigo TEXT PRIMARY KEY,
+                product TEXT NOT NULL,
+                priority REAL NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                enqueued_at TEXT,
+                updated_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS items_by_priority ON items (status, priority DESC, enqueued_at);
+        """)
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def recover(self) -> int:
+        """Puts items claimed by a process that died before completing them back in the queue."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE items SET status = 'pending', updated_at = ? WHERE status = 'in_flight'",
+                (datetime.now().isoformat(),),
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def enqueue(self, products, priority=None) -> int:
+        """Adds new pending products; products already queued get their data and priority refreshed.
+
+        Returns how many products were new to the queue.
+        """
+        now = datetime.now().isoformat()
+        rows = [
+            (product.get("CodigoComposto"), json.dumps(dict(product), ensure_ascii=False),
+             float(priority(product)) if priority else 0.0)
+            for product in products if product.get("CodigoComposto")
+        ]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO items (codigo, product, priority, status, enqueued_at, updated_at) "
+                "VALUES (?, ?, ?, 'pending', ?, ?)",
+                ((codigo, product, prio, now, now) for codigo, product, prio in rows),
+            )
+            added = self._conn.total_changes - before
+            self._conn.executemany(
+                "UPDATE items SET product = ?, priority = ? WHERE codigo = ? AND status = 'pending'",
+                ((product, prio, codigo) for codigo, product, prio in rows),
+            )
+            # A product that failed is tried again once its XBZ data changes
+            self._conn.executemany(
+                "UPDATE items SET product = ?, priority = ?, status = 'pending', attempts = 0, updated_at = ? "
+                "WHERE codigo = ? AND status = 'failed' AND product != ?",
+                ((product, prio, now, codigo, product) for codigo, product, prio in rows),
+            )
+            self._conn.commit()
+        return added
+
+    def discard(self, codes) -> int:
+        """Marks queued products that turned out to exist in OMIE as done."""
+        now = datetime.now().isoformat()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "UPDATE items SET status = 'done', last_error = 'already_exists', updated_at = ? "
+                "WHERE codigo = ? AND status = 'pending'",
+                ((now, code) for code in codes),
+            )
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def claim(self, limit=1) -> list:
+        """Takes up to `limit` pending products (highest priority first) and marks them in flight."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT codigo, product FROM items WHERE status = 'pending' "
+                "ORDER BY priority DESC, enqueued_at LIMIT ?",
+                (limit,),
+            ).fetchall()
+            if rows:
+                now = datetime.now().isoformat()
+                self._conn.executemany(
+                    "UPDATE items SET status = 'in_flight', attempts = attempts + 1, updated_at = ? WHERE codigo = ?",
+                    ((now, codigo) for codigo, _ in rows),
+                )
+                self._conn.commit()
+        return [json.loads(product) for _, product in rows]
+
+    def release(self, codes):
+        """Puts claimed products back without counting the attempt (e.g. OMIE blocked the request)."""
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE items SET status = 'pending', attempts = MAX(attempts - 1, 0), updated_at = ? "
+                "WHERE codigo = ? AND status = 'in_flight'",
+                ((now, code) for code in codes),
+            )
+            self._conn.commit()
+
+    def complete(self, codigo, outcome, reason=None, message=None):
+        """Records the result of an insert.
+
+        `outcome` is "inserted", "skipped" or "failed"; failures with a retryable
+        `reason` go back to the queue until `max_attempts` is reached.
+        """
+        now = datetime.now().isoformat()
+        error = f"{reason}: {message}" if message else reason
+        with self._lock:
+            if outcome == "failed":
+                self._conn.execute(
+                    "UPDATE items SET status = CASE WHEN ? AND attempts < ? THEN 'pending' ELSE 'failed' END, "
+                    "last_error = ?, updated_at = ? WHERE codigo = ?",
+                    (reason in RETRYABLE_REASONS, self.max_attempts, error, now, codigo),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE items SET status = 'done', last_error = ?, updated_at = ? WHERE codigo = ?",
+                    (None if outcome == "inserted" else error, now, codigo),
+                )
+            self._conn.commit()
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM items GROUP BY status").fetchall()
+        counts = {"pending": 0, "in_flight": 0, "done": 0, "failed": 0}
+        counts.update(dict(rows))
+        return counts
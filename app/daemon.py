@@ -0,0 +1,362 @@
+"""Service mode: keeps draining the insert backlog instead of running every few hours.
+
+    python -m app.daemon
+
+- a refresh thread updates the OMIE catalog index and downloads the XBZ catalog
+  every XBZ_REFRESH_SECONDS, queueing the products missing in OMIE in a
+  persistent work queue (state/work_queue.sqlite3);
+- INSERT_WORKERS writer threads drain the queue, highest priority first, at the
+  pace allowed by the shared token bucket and the rate governor;
+- GET /health (JSON) and GET /metrics (Prometheus) are served on HEALTH_PORT;
+- SIGTERM/SIGINT stop it gracefully: requests in flight finish and unfinished
+  items stay queued for the next start.
+"""
+import json
+import logging
+import os
+import signal
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from app.clients.omie_client import OmieClient, OmieListingError
+from app.clients.xbz_cache import XbzCatalogCache
+from app.clients.xbz_client import XBZClient
+from app.core.catalog_index import CatalogIndex
+from app.core.insert_pipeline import response_status
+from app.core.product_sync import (
+    INSERT_PRIORITY, INSERT_WORKERS, OMIE_LIST_WORKERS, OMIE_LOT_SIZE, OMIE_RATE_BURST,
+    OMIE_REQUESTS_PER_SECOND,
+)
+from app.core.preflight import PREFLIGHT_REASONS, Preflight
+from app.core.rate_governor import RateGovernor
+from app.core.scheduler import priority_function
+from app.core.work_queue import WorkQueue
+from app.utils.logger import get_logger, flush_logs, log_event
+from app.utils.env import env_number
+from app.utils.metrics import get_metrics
+from app.utils.rate_limiter import TokenBucket
+
+XBZ_REFRESH_SECONDS = 60 * 60
+# Retry delay after a failed refresh (capped by XBZ_REFRESH_SECONDS)
+REFRESH_RETRY_SECONDS = 5 * 60
+HEALTH_PORT = 8080
+# How long an idle writer waits before looking at the queue again
+IDLE_POLL_SECONDS = 5
+
+logger = get_logger(__name__)
+metrics = get_metrics()
+
+
+class SyncDaemon:
+    def __init__(self, xbz_client, omie_client, rate_limit=None, rate_burst=None, workers=None, lot_size=None,
+                 list_workers=None, priority=None, refresh_seconds=XBZ_REFRESH_SECONDS, health_port=HEALTH_PORT,
+                 work_queue=None, catalog_index=None, preflight=None):
+        self.xbz_client = xbz_client
+        self.omie_client = omie_client
+        self.limiter = TokenBucket(
+            rate=rate_limit if rate_limit is not None else OMIE_REQUESTS_PER_SECOND,
+            burst=rate_burst if rate_burst is not None else OMIE_RATE_BURST,
+        )
+        self.governor = RateGovernor(self.limiter)
+        self.workers = workers if workers is not None else INSERT_WORKERS
+        self.lot_size = lot_size if lot_size is not None else OMIE_LOT_SIZE
+        self.list_workers = list_workers if list_workers is not None else OMIE_LIST_WORKERS
+        self.priority = priority or INSERT_PRIORITY
+        self.refresh_seconds = refresh_seconds
+        self.health_port = health_port
+        self.queue = work_queue or WorkQueue()
+        self.catalog_index = catalog_index if catalog_index is not None else CatalogIndex()
+        self.preflight = preflight if preflight is not None else Preflight()
+        self.existing_codes = set()
+
+        self.stop_event = threading.Event()
+        self.work_available = threading.Event()
+        self._threads = []
+        self._httpd = None
+        self._lock = threading.Lock()
+        self.started_at = datetime.now()
+        self.last_refresh = None
+        self.last_refresh_error = None
+        self.totals = {"inserted": 0, "skipped": 0, "failed": 0}
+
+    # -- refresh ----------------------------------------------------------------------
+
+    def refresh(self):
+        """Brings the catalog index up to date and queues the XBZ products missing in OMIE."""
+        with metrics.phase("omie_listing"):
+            self.catalog_index.refresh(self.omie_client, workers=self.list_workers, limiter=self.limiter)
+        existing_codes = self.catalog_index.codes()
+        with metrics.phase("xbz_fetch"):
+            xbz_products = self.xbz_client.get_products()
+        pending = [product for product in xbz_products if product.get("CodigoComposto") not in existing_codes]
+
+        priority = None if self.priority == "fifo" else priority_function(self.priority, pending)
+        added = self.queue.enqueue(pending, priority)
+        discarded = self.queue.discard(existing_codes)
+        with self._lock:
+            self.existing_codes = existing_codes
+            self.last_refresh = datetime.now()
+            self.last_refresh_error = None
+        logger.info(f"🔄 Catálogos atualizados: {len(xbz_products)} produtos XBZ, {len(pending)} pendentes "
+                    f"({added} novos na fila, {discarded} já cadastrados removidos).")
+        self.work_available.set()
+
+    def _refresh_loop(self):
+        while not self.stop_event.is_set():
+            wait_time = self.refresh_seconds
+            if self.governor.blocked_remaining() > 0:
+                wait_time = min(self.governor.blocked_remaining() + 1, self.refresh_seconds)
+            else:
+                try:
+                    self.refresh()
+                except OmieListingError as e:
+                    if e.blocked:
+                        self.governor.record("rate_limited", str(e))
+                    self._refresh_failed(e)
+                    wait_time = min(REFRESH_RETRY_SECONDS, self.refresh_seconds)
+                except Exception as e:
+                    self._refresh_failed(e)
+                    wait_time = min(REFRESH_RETRY_SECONDS, self.refresh_seconds)
+            self.stop_event.wait(wait_time)
+
+    def _refresh_failed(self, error):
+        with self._lock:
+            self.last_refresh_error = str(error)
+        logger.error(f"❌ Falha ao atualizar os catálogos: {error}")
+
+    # -- writers ----------------------------------------------------------------------
+
+    def _writer_loop(self):
+        while not self.stop_event.is_set():
+            blocked_for = self.governor.blocked_remaining()
+            if blocked_for > 0:
+                self.stop_event.wait(min(blocked_for, 60))
+                continue
+
+            batch = self.queue.claim(self.lot_size or 1)
+            with self._lock:
+                existing_codes = self.existing_codes
+            known = [product for product in batch if product.get("CodigoComposto") in existing_codes]
+            for product in known:
+                # Inserted by another writer or listed by a refresh since it was queued
+                self.queue.complete(product.get("CodigoComposto"), "skipped", "already_exists")
+            batch = [product for product in batch if product.get("CodigoComposto") not in existing_codes]
+            if not batch:
+                if not known:
+                    self.work_available.clear()
+                    self.work_available.wait(IDLE_POLL_SECONDS)
+                continue
+
+            sendable = []
+            for product in batch:
+                try:
+                    payload, rejection = self.preflight.prepare(product)
+                except Exception as e:
+                    self._fail(product, "mapping_error", e)
+                    continue
+                if rejection is not None:
+                    self._handle_result(product, rejection)
+                else:
+                    sendable.append((product, payload))
+            if not sendable:
+                continue
+
+            if not self.limiter.acquire(self.stop_event):
+                self.queue.release(product.get("CodigoComposto") for product, _ in sendable)
+                break
+            payloads = [payload for _, payload in sendable]
+            try:
+                if self.lot_size:
+                    responses = self.omie_client.upsert_products_batch(payloads, lot_size=len(payloads),
+                                                                       limiter=self.limiter, governor=self.governor)
+                else:
+                    responses = [self.omie_client.insert_product(payloads[0], governor=self.governor)]
+            except Exception as e:
+                for product, _ in sendable:
+                    self._fail(product, "exception", e)
+                continue
+            for (product, payload), response in zip(sendable, responses):
+                try:
+                    self.preflight.record(payload, response_status(response), response)
+                    self._handle_result(product, response)
+                except Exception as e:
+                    self._fail(product, "exception", e)
+
+    def _fail(self, product, reason, error):
+        """Completes an item that raised instead of producing a response, so the writer keeps going."""
+        codigo = product.get("CodigoComposto")
+        self.queue.complete(codigo, "failed", reason, f"{type(error).__name__}: {error}")
+        metrics.inc("daemon_products_total", help_text="Products processed by the daemon, by result", result="error")
+        log_event(logger, logging.ERROR, f"❌ Erro ao processar produto {codigo}: {error}",
+                  event="product", codigo=codigo, status="failed", reason=reason, error=type(error).__name__)
+        self._count("failed")
+
+    def _handle_result(self, product, response):
+        codigo = product.get("CodigoComposto")
+        status = response_status(response)
+        held_back = status == "error" and response.get("reason") in PREFLIGHT_REASONS
+        metrics.inc("daemon_products_total", help_text="Products processed by the daemon, by result", result=status)
+
+        if status == "rate_limited":
+            self.queue.release([codigo])
+            return
+        if status == "error":
+            self.queue.complete(codigo, "failed", response.get("reason"), response.get("message"))
+            if held_back:
+                logger.warning(f"🚫 Produto {codigo} não enviado: {response.get('message')}")
+            else:
+                logger.warning(f"❌ Falha ao inserir produto {codigo}: {response.get('message')}")
+            self._count("failed")
+            return
+
+        codigo_produto = response.get("codigo_produto") if isinstance(response, dict) else None
+        self.catalog_index.add(codigo, codigo_produto)
+        with self._lock:
+            self.existing_codes.add(codigo)
+        if status == "skipped":
+            self.queue.complete(codigo, "skipped", response.get("reason"))
+            self._count("skipped")
+        else:
+            self.queue.complete(codigo, "inserted")
+            logger.info(f"✅ Produto {codigo} inserido com sucesso!")
+            self._count("inserted")
+
+    def _count(self, key):
+        with self._lock:
+            self.totals[key] += 1
+
+    # -- health -----------------------------------------------------------------------
+
+    def health(self) -> dict:
+        with self._lock:
+            last_refresh = self.last_refresh
+            report = {
+                "started_at": self.started_at.isoformat(timespec="seconds"),
+                "last_refresh": last_refresh.isoformat(timespec="seconds") if last_refresh else None,
+                "last_refresh_error": self.last_refresh_error,
+                "processed_since_start": dict(self.totals),
+            }
+        threads_alive = all(thread.is_alive() for thread in self._threads)
+        # A refresh is expected every refresh_seconds; allow for a slow or blocked one
+        reference = last_refresh or self.started_at
+        refresh_overdue = (datetime.now() - reference).total_seconds() > 3 * self.refresh_seconds + 600
+        blocked_for = self.governor.blocked_remaining()
+        report.update({
+            "status": "ok" if threads_alive and not refresh_overdue else "unhealthy",
+            "omie_blocked_for_s": round(blocked_for),
+            "rate_limit_rps": round(self.limiter.rate, 3),
+            "queue": self.queue.counts(),
+        })
+        return report
+
+    def _prometheus(self) -> str:
+        for state, count in self.queue.counts().items():
+            metrics.set_gauge("daemon_queue_items", count, help_text="Work queue items by state", state=state)
+        metrics.set_gauge("omie_rate_limit_rps", round(self.limiter.rate, 4), help_text="Current token bucket rate")
+        return metrics.prometheus_text()
+
+    def _start_health_server(self):
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body, content_type):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.startswith("/health"):
+                    report = daemon.health()
+                    self._send(200 if report["status"] == "ok" else 503,
+                               json.dumps(report, ensure_ascii=False), "application/json; charset=utf-8")
+                elif self.path.startswith("/metrics"):
+                    self._send(200, daemon._prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+                else:
+                    self._send(404, "not found", "text/plain")
+
+        self._httpd = ThreadingHTTPServer(("0.0.0.0", self.health_port), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name="health", daemon=True).start()
+        logger.info(f"🩺 Health check em http://0.0.0.0:{self._httpd.server_address[1]}/health")
+
+    # -- lifecycle --------------------------------------------------------------------
+
+    def start(self):
+        recovered = self.queue.recover()
+        if recovered:
+            logger.info(f"♻️ {recovered} produtos da execução anterior voltaram para a fila.")
+        with self._lock:
+            self.existing_codes = self.catalog_index.codes()
+        if self.health_port is not None:
+            self._start_health_server()
+        self._threads = [threading.Thread(target=self._refresh_loop, name="refresh", daemon=True)]
+        self._threads += [
+            threading.Thread(target=self._writer_loop, name=f"writer-{i + 1}", daemon=True)
+            for i in range(max(1, self.workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"🚀 Serviço iniciado: {self.workers} writers, {self.limiter.rate:.2f} req/s, "
+                    f"atualização dos catálogos a cada {self.refresh_seconds / 60:.0f} min.")
+        return self
+
+    def stop(self, timeout=60):
+        """Stops the threads, letting the requests in flight finish."""
+        logger.info("🛑 Encerrando serviço...")
+        self.stop_event.set()
+        self.work_available.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+        self.queue.recover()
+        logger.info(f"✅ Serviço encerrado. Fila: {self.queue.counts()}")
+
+    def run_forever(self):
+        def _handle_signal(signum, frame):
+            logger.info(f"📴 Sinal {signal.Signals(signum).name} recebido.")
+            self.stop_event.set()
+
+        signal.signal(signal.SIGTERM, _handle_signal)
+        signal.signal(signal.SIGINT, _handle_signal)
+        self.start()
+        while not self.stop_event.wait(1):
+            pass
+        self.stop()
+
+
+def main():
+    from dotenv import load_dotenv
+    from app.utils.logger import configure_logging
+
+    load_dotenv()
+    configure_logging()
+
+    daemon = SyncDaemon(
+        xbz_client=XBZClient(token=os.getenv("XBZ_TOKEN"), cnpj=os.getenv("XBZ_CNPJ"), cache=XbzCatalogCache()),
+        omie_client=OmieClient(app_key=os.getenv("OMIE_APP_KEY"), app_secret=os.getenv("OMIE_APP_SECRET")),
+        rate_limit=env_number("OMIE_RATE_LIMIT", float),
+        rate_burst=env_number("OMIE_RATE_BURST", int),
+        workers=env_number("INSERT_WORKERS", int),
+        lot_size=env_number("OMIE_LOT_SIZE", int),
+        list_workers=env_number("OMIE_LIST_WORKERS", int),
+        priority=os.getenv("INSERT_PRIORITY") or None,
+        refresh_seconds=env_number("XBZ_REFRESH_SECONDS", float) or XBZ_REFRESH_SECONDS,
+        health_port=env_number("HEALTH_PORT", int) or HEALTH_PORT,
+    )
+    try:
+        daemon.run_forever()
+    finally:
+        flush_logs()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,18 +2,64 @@ if __name__ == "__main__":
     import os
     from dotenv import load_dotenv
     from app.core.product_sync import sync_products
+    from app.utils.env import env_number
+    from app.utils.logger import configure_logging
 
     load_dotenv()
 
+    # LOG_LEVEL=DEBUG also dumps every OMIE payload and response;
+    # LOG_FORMAT=json writes one JSON object per line (one per product) for machine parsing
+    configure_logging()
+
     token = os.getenv("XBZ_TOKEN")
     cnpj = os.getenv("XBZ_CNPJ")
     omie_app_key = os.getenv("OMIE_APP_KEY")
     omie_app_secret = os.getenv("OMIE_APP_SECRET")
     
     # Optional: override the default max inserts per run via environment variable
-    max_inserts = os.getenv("MAX_INSERTS_PER_RUN")
-    if max_inserts:
-        max_inserts = int(max_inserts)
+    max_inserts = env_number("MAX_INSERTS_PER_RUN", int)
+
+    # Optional: tune the OMIE request pacing (requests/second, burst size and concurrent workers)
+    rate_limit = env_number("OMIE_RATE_LIMIT", float)
+    rate_burst = env_number("OMIE_RATE_BURST", int)
+    workers = env_number("INSERT_WORKERS", int)
+
+    # Optional: ignore the local OMIE catalog index and list the whole catalog again
+    full_refresh = os.getenv("OMIE_FULL_REFRESH", "").lower() in ("1", "true", "yes")
+
+    # Optional: number of OMIE catalog pages fetched in parallel
+    list_workers = env_number("OMIE_LIST_WORKERS", int)
+
+    # Optional: process XBZ products while the catalog is still downloading
+    stream = os.getenv("XBZ_STREAM", "").lower() in ("1", "true", "yes")
+
+    # Optional: seconds to wait for a known OMIE block to end instead of exiting
+    block_wait = env_number("OMIE_WAIT_ON_BLOCK", float)
+
+    # Optional: set SYNC_RESUME=0 to always start from a full scan instead of the journal
+    resume = os.getenv("SYNC_RESUME", "1").lower() not in ("0", "false", "no")
+
+    # Optional: order in which pending products use the insert budget (value, stock, recent or fifo)
+    priority = os.getenv("INSERT_PRIORITY") or None
+
+    # Optional: send new products in lots of this size (UpsertProdutosLote)
+    lot_size = env_number("OMIE_LOT_SIZE", int)
+
+    # Optional: SYNC_MODE=stock_price only pushes stock and price changes of products
+    # already in OMIE (no catalog listing, batched), cheap enough to run every few minutes
+    if os.getenv("SYNC_MODE", "").lower() == "stock_price":
+        from app.clients.omie_client import OmieClient
+        from app.clients.xbz_client import XBZClient
+        from app.core.stock_price_sync import sync_stock_and_prices
+
+        sync_stock_and_prices(
+            XBZClient(token=token, cnpj=cnpj),
+            OmieClient(app_key=omie_app_key, app_secret=omie_app_secret),
+            rate_limit=rate_limit,
+            rate_burst=rate_burst,
+            lot_size=lot_size,
+        )
+        raise SystemExit(0)
 
     sync_products(
         token=token,
@@ -22,5 +68,15 @@ if __name__ == "__main__":
         omie_app_secret=omie_app_secret,
         dry_run=False,
         preview_count=None,
-        max_inserts=max_inserts  # Uses default (500) if not set
+        max_inserts=max_inserts,  # Uses default (500) if not set
+        rate_limit=rate_limit,
+        rate_burst=rate_burst,
+        workers=workers,
+        lot_size=lot_size,
+        full_refresh=full_refresh,
+        list_workers=list_workers,
+        stream=stream,
+        block_wait=block_wait,
+        resume=resume,
+        priority=priority
     )
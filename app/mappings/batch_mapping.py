@@ -0,0 +1,172 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from app.clients.records import XbzProduct
+
+# Same tiers as mapping.aplicar_markup: (minimum stock, markup), checked in order
+MARKUP_TIERS = [
+    (1000, 1.80),
+    (500, 1.85),
+    (250, 1.90),
+    (150, 2.15),
+    (50, 2.22),
+]
+DEFAULT_MARKUP = 2.32
+
+OUTPUT_COLUMNS = [
+    "codigo", "codigo_produto_integracao", "descricao", "descr_detalhada", "altura", "largura",
+    "profundidade", "peso_bruto", "valor_unitario", "ncm", "quantidade_estoque", "unidade",
+    "bloqueado", "importado_api",
+]
+
+
+def _column(df: pd.DataFrame, name: str, default=np.nan) -> np.ndarray:
+    if name in df.columns:
+        return df[name].to_numpy(dtype=object)
+    return np.full(len(df), default, dtype=object)
+
+
+def _or_zero(values: np.ndarray) -> np.ndarray:
+    """Vectorized `value or 0`: keeps truthy values untouched, replaces None/NaN/0/"" with 0."""
+    falsy = pd.isna(values) | (values == 0) | (values == "")
+    result = values.copy()
+    result[falsy] = 0
+    return result
+
+
+def _numbers(values: np.ndarray):
+    """Vectorized `mapping._number`: floats, plus a mask of the values `float()` rejects (mapped as 0)."""
+    values = _or_zero(values)
+    invalid = np.zeros(len(values), dtype=bool)
+    try:
+        numbers = values.astype(float)
+    except (TypeError, ValueError):
+        numbers = np.zeros(len(values))
+        for i, value in enumerate(values):
+            try:
+                numbers[i] = float(value)
+            except (TypeError, ValueError):
+                invalid[i] = True
+    numbers[np.isnan(numbers)] = 0.0
+    return numbers, invalid
+
+
+def _absent(values: np.ndarray) -> np.ndarray:
+    """Keys missing from the product (NaN in the frame; an explicit None is a value)."""
+    return pd.isna(values) & ~np.equal(values, None)
+
+
+_str = np.frompyfunc(str, 1, 1)
+_len = np.frompyfunc(len, 1, 1)
+
+
+def _as_text(values: np.ndarray, missing: str = "") -> np.ndarray:
+    """Vectorized `str(value)`, with absent values (NaN in the frame) replaced by `missing`."""
+    text = _str(values)
+    text[_absent(values)] = missing
+    return text
+
+
+def _to_none(values: np.ndarray) -> np.ndarray:
+    result = values.copy()
+    result[pd.isna(values)] = None
+    return result
+
+
+def _per_unique(values: np.ndarray, func) -> np.ndarray:
+    """Applies `func` once per distinct value (NCMs and colors repeat across thousands of products)."""
+    codes, uniques = pd.factorize(values)
+    return np.asarray([func(value) for value in uniques], dtype=object)[codes]
+
+
+def _round(values: np.ndarray, decimals: int) -> np.ndarray:
+    """Vectorized `round(value, decimals)` that matches Python's result exactly.
+
+    numpy rounds `value * 10**decimals` to the nearest integer, which only
+    disagrees with Python's correctly rounded `round()` when the scaled value
+    sits on (or within float error of) a .5 tie; those few are recomputed.
+    """
+    raw = np.asarray(values, dtype=float)
+    scaled = raw * 10 ** decimals
+    rounded = np.rint(scaled) / 10 ** decimals
+    near_tie = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_tie):
+        rounded[i] = round(float(raw[i]), decimals)
+    return np.asarray(rounded.tolist(), dtype=object)
+
+
+def _clean_ncm(text: str) -> str:
+    return re.sub(r"[^\d]", "", text.upper().replace("O", "0"))[:8]
+
+
+def markup_factors(quantidade: np.ndarray) -> np.ndarray:
+    conditions = [quantidade >= minimum for minimum, _ in MARKUP_TIERS]
+    choices = [markup for _, markup in MARKUP_TIERS]
+    return np.select(conditions, choices, default=DEFAULT_MARKUP)
+
+
+def map_products_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Columnar version of `mapping.map_product` for a frame of XBZ products.
+
+    Returns one row per product with the same columns and values that
+    `map_product` produces. Build the frame with `dtype=object` (as
+    `map_products` does) to also keep the original Python types of the
+    pass-through fields. Products `map_product` would raise on (a missing
+    CodigoComposto, Nome or Descricao, a price, stock or weight that is not a
+    number) are left out; the index tells which rows were kept.
+    """
+    codigo = _column(df, "CodigoComposto")
+    nome = _column(df, "Nome")
+    descr_detalhada = _column(df, "Descricao")
+
+    ncm = _per_unique(_as_text(_column(df, "Ncm")), _clean_ncm)
+
+    cor = _column(df, "CorWebPrincipal")
+    cor = _per_unique(_as_text(np.where(np.equal(cor, None), "", cor)), str.strip)
+    descricao = _as_text(nome) + " - Cor: " + cor + " - Codigo: " + _as_text(codigo)
+    for i in np.flatnonzero(_len(descricao).astype(int) > 120):
+        descricao[i] = descricao[i][:120]
+
+    custo, bad_custo = _numbers(_column(df, "PrecoVenda"))
+    quantidade, bad_quantidade = _numbers(_column(df, "QuantidadeDisponivelEstoquePrincipal"))
+    peso, bad_peso = _numbers(_column(df, "Peso"))
+    unmappable = _absent(codigo) | _absent(nome) | _absent(descr_detalhada) | bad_custo | bad_quantidade | bad_peso
+
+    mapped = pd.DataFrame({
+        "codigo": codigo,
+        "codigo_produto_integracao": codigo,
+        "descricao": descricao,
+        "descr_detalhada": _to_none(descr_detalhada),
+        "altura": _or_zero(_column(df, "Altura")),
+        "largura": _or_zero(_column(df, "Largura")),
+        "profundidade": _or_zero(_column(df, "Profundidade")),
+        "peso_bruto": _round(peso / 1000, 3),
+        "valor_unitario": _round(custo * markup_factors(quantidade), 2),
+        "ncm": ncm,
+        "quantidade_estoque": _to_none(_column(df, "quantidade", None)),
+        "unidade": "UN",
+        "bloqueado": "N",
+        "importado_api": "S",
+    }, index=df.index, dtype=object)
+    return mapped.loc[~unmappable, OUTPUT_COLUMNS]
+
+
+def map_products(xbz_products) -> list:
+    """Maps a list of XBZ products at once; equivalent to `[map_product(p) for p in xbz_products]`.
+
+    A product `map_product` would raise on gets None instead of failing the whole batch.
+    """
+    if not xbz_products:
+        return []
+    xbz_products = list(xbz_products)
+    if all(type(product) is XbzProduct for product in xbz_products):
+        df = pd.DataFrame(XbzProduct.columns(xbz_products, np.nan), dtype=object)
+    else:
+        df = pd.DataFrame(xbz_products, dtype=object)
+    payloads = [None] * len(df)
+    mapped = map_products_frame(df)
+    for position, payload in zip(mapped.index, mapped.to_dict("records")):
+        payloads[position] = payload
+    return payloads
@@ -1,5 +1,15 @@
+import math
 import re
 
+def _number(value) -> float:
+    """`float(value or 0)` that also reads numeric strings and NaN (a missing value in a pandas frame) as 0."""
+    number = float(value or 0)
+    return 0.0 if math.isnan(number) else number
+
+def _or_zero(value):
+    """`value or 0`, with NaN also replaced by 0."""
+    return value if value and value == value else 0
+
 def aplicar_markup(custo: float, quantidade: int) -> float:
     if quantidade >= 1000:
         markup = 1.80
@@ -24,12 +34,14 @@ def map_product(xbz_product: dict) -> dict:
     # Remove everything except digits and truncate to 8 characters
     clean_ncm = re.sub(r"[^\d]", "", ncm_fixed)[:8]     #Eu fiz isso para corrigir alguns erros de digitação existentes no código cnm de alguns produtos
 
-    descricao = f"{xbz_product['Nome']} - Cor: {xbz_product.get('CorWebPrincipal', '').strip()} - Codigo: {xbz_product.get('CodigoComposto')}"
+    cor = xbz_product.get("CorWebPrincipal")
+    cor = "" if cor is None else str(cor).strip()
+    descricao = f"{xbz_product['Nome']} - Cor: {cor} - Codigo: {xbz_product.get('CodigoComposto')}"
 
     # Ensure descricao is at most 120 characters
     descricao = descricao[:120]
-    custo = xbz_product.get("PrecoVenda") or 0
-    quantidade = xbz_product.get("QuantidadeDisponivelEstoquePrincipal") or 0
+    custo = _number(xbz_product.get("PrecoVenda"))
+    quantidade = _number(xbz_product.get("QuantidadeDisponivelEstoquePrincipal"))
     preco_final = aplicar_markup(custo, quantidade)
 
     return {
@@ -37,10 +49,10 @@ def map_product(xbz_product: dict) -> dict:
         "codigo_produto_integracao": xbz_product["CodigoComposto"],
         "descricao": descricao,
         "descr_detalhada": xbz_product["Descricao"],
-        "altura": xbz_product.get("Altura") or 0,
-        "largura": xbz_product.get("Largura") or 0,
-        "profundidade": xbz_product.get("Profundidade") or 0,
-        "peso_bruto": round((xbz_product.get("Peso") or 0) / 1000, 3),
+        "altura": _or_zero(xbz_product.get("Altura")),
+        "largura": _or_zero(xbz_product.get("Largura")),
+        "profundidade": _or_zero(xbz_product.get("Profundidade")),
+        "peso_bruto": round(_number(xbz_product.get("Peso")) / 1000, 3),
         "valor_unitario": preco_final,
         "ncm": clean_ncm,
         "quantidade_estoque": xbz_product.get("quantidade"),
@@ -48,3 +60,30 @@ def map_product(xbz_product: dict) -> dict:
         "bloqueado": "N",
         "importado_api": "S"
     }
+
+def map_product_update(xbz_product: dict) -> dict:
+    """Builds the AlterarProduto parameters (price, stock, weight and dimensions) for an existing product."""
+    peso = round(float(xbz_product.get("Peso") or 0) / 1000, 3)
+    altura = float(xbz_product.get("Altura") or 0)
+    largura = float(xbz_product.get("Largura") or 0)
+    profundidade = float(xbz_product.get("Profundidade") or 0)
+    quantidade = int(xbz_product.get("QuantidadeDisponivelEstoquePrincipal") or 0)
+    if quantidade < 0:
+        quantidade = 0
+
+    custo = float(str(xbz_product.get("PrecoVendaFormatado") or "0").replace(",", "."))
+
+    param_data = {
+        "codigo_produto_integracao": xbz_product.get("CodigoComposto"),
+        "valor_unitario": aplicar_markup(custo, quantidade),
+        "peso_bruto": peso,
+        "quantidade_estoque": quantidade
+    }
+    # Dimensions are only sent when known, so a missing value never erases the one in OMIE
+    if altura > 0:
+        param_data["altura"] = altura
+    if largura > 0:
+        param_data["largura"] = largura
+    if profundidade > 0:
+        param_data["profundidade"] = profundidade
+    return param_data
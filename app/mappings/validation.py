@@ -0,0 +1,60 @@
+import math
+import numbers
+import re
+
+# Field limits of IncluirProduto / UpsertProdutosLote
+MAX_LENGTHS = {
+    "codigo": 60,
+    "codigo_produto_integracao": 60,
+    "descricao": 120,
+    "unidade": 6,
+}
+REQUIRED_TEXT = ("codigo", "codigo_produto_integracao", "descricao", "descr_detalhada", "unidade")
+NON_NEGATIVE_NUMBERS = ("valor_unitario", "peso_bruto", "altura", "largura", "profundidade")
+NCM_PATTERN = re.compile(r"\d{8}")
+
+
+def _as_number(value):
+    """`value` as a float (numeric strings included), or None when it is not a finite number."""
+    if isinstance(value, bool):
+        return None
+    if not isinstance(value, numbers.Real):
+        try:
+            value = float(str(value).strip())
+        except ValueError:
+            return None
+    return float(value) if math.isfinite(value) else None
+
+
+def validate_payload(payload: dict) -> list:
+    """Checks a `map_product` payload against the OMIE field rules.
+
+    Returns the problems found (empty when OMIE should accept it), so products
+    that would be rejected are never sent.
+    """
+    problems = []
+    for field in REQUIRED_TEXT:
+        value = payload.get(field)
+        if value is None or not str(value).strip():
+            problems.append(f"{field} vazio")
+    for field, limit in MAX_LENGTHS.items():
+        value = payload.get(field)
+        if value is not None and len(str(value)) > limit:
+            problems.append(f"{field} com mais de {limit} caracteres")
+
+    ncm = str(payload.get("ncm") or "")
+    if not NCM_PATTERN.fullmatch(ncm):
+        problems.append(f"NCM inválido: '{ncm}' (precisa ter 8 dígitos)")
+    elif ncm == "00000000":
+        problems.append("NCM zerado")
+
+    for field in NON_NEGATIVE_NUMBERS:
+        value = payload.get(field)
+        if value is None:
+            continue
+        number = _as_number(value)
+        if number is None:
+            problems.append(f"{field} não numérico: {value!r}")
+        elif number < 0:
+            problems.append(f"{field} negativo: {value}")
+    return problems
@@ -0,0 +1,212 @@
+"""Multi-account mode: one XBZ catalog synced to several OMIE accounts at once.
+
+    OMIE_ACCOUNTS_FILE=accounts.json python -m app.multi_tenant
+
+- the XBZ catalog is downloaded and mapped once and written to a shared,
+  memory-mapped snapshot (state/xbz_shared_catalog.jsonl);
+- each account is synced by its own process, with its own token bucket, rate
+  governor, catalog index and journal (state/accounts/<name>/) and its own
+  result files (accounts/<name>/), so the run takes as long as the slowest
+  account instead of the sum of all of them.
+
+The accounts file is a JSON list of objects with `name`, `app_key` and
+`app_secret` (or `app_key_env` / `app_secret_env` naming environment
+variables) plus optional per-account overrides of the sync settings
+(`max_inserts`, `rate_limit`, `rate_burst`, `workers`, `lot_size`,
+`list_workers`, `priority`).
+"""
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.clients.xbz_cache import XbzCatalogCache
+from app.clients.xbz_client import XBZClient
+from app.core.product_sync import close_produtos_xbz_snapshot, open_produtos_xbz_snapshot
+from app.core.shared_catalog import SharedCatalog
+from app.utils.env import env_number
+from app.utils.logger import get_logger, flush_logs
+from app.utils.metrics import REPORT_FILE
+from app.utils.state import state_path
+
+ACCOUNTS_FILE = "accounts.json"
+ACCOUNTS_DIR = "accounts"
+SHARED_CATALOG_FILE = "xbz_shared_catalog.jsonl"
+REPORT_FILE_NAME = "multi_tenant_report.json"
+
+# Settings an account may override
+ACCOUNT_SETTINGS = ("max_inserts", "rate_limit", "rate_burst", "workers", "lot_size", "list_workers", "priority")
+
+logger = get_logger(__name__)
+
+
+def load_accounts(path) -> list:
+    """Reads and validates the accounts file, resolving `*_env` credentials."""
+    with open(path, encoding="utf-8") as file:
+        accounts = json.load(file)
+    if not isinstance(accounts, list) or not accounts:
+        raise ValueError(f"{path}: esperada uma lista não vazia de contas")
+    names = set()
+    for account in accounts:
+        name = account.get("name")
+        if not name or not re.fullmatch(r"[A-Za-z0-9_.-]+", name):
+            raise ValueError(f"{path}: nome de conta inválido: {name!r} (use letras, números, '.', '_' ou '-')")
+        if name in names:
+            raise ValueError(f"{path}: conta repetida: {name}")
+        names.add(name)
+        for field in ("app_key", "app_secret"):
+            if not account.get(field) and account.get(f"{field}_env"):
+                account[field] = os.getenv(account[f"{field}_env"])
+            if not account.get(field):
+                raise ValueError(f"{path}: conta {name} sem {field}")
+        unknown = set(account) - {"name", "app_key", "app_secret", "app_key_env", "app_secret_env", *ACCOUNT_SETTINGS}
+        if unknown:
+            raise ValueError(f"{path}: conta {name} com campos desconhecidos: {', '.join(sorted(unknown))}")
+    return accounts
+
+
+def _default_omie_client(account):
+    from app.clients.omie_client import OmieClient
+    return OmieClient(app_key=account["app_key"], app_secret=account["app_secret"])
+
+
+def _sync_account(account, catalog_path, base_dir, settings, omie_client_factory=None):
+    """Runs in a worker process: syncs one OMIE account from the shared catalog."""
+    name = account["name"]
+    work_dir = os.path.join(base_dir, ACCOUNTS_DIR, name)
+    os.makedirs(work_dir, exist_ok=True)
+    # Separate journal, catalog index, rate governor state and result files per account
+    os.environ["SYNC_STATE_DIR"] = os.path.join(os.path.dirname(catalog_path), ACCOUNTS_DIR, name)
+    os.chdir(work_dir)
+
+    from app.core.product_sync import sync_products
+    from app.utils.logger import configure_logging
+    configure_logging(context={"account": name})
+
+    options = dict(settings)
+    options.update({key: account[key] for key in ACCOUNT_SETTINGS if account.get(key) is not None})
+    started = time.perf_counter()
+    error = None
+    try:
+        with SharedCatalog(catalog_path) as catalog:
+            sync_products(
+                token=None,
+                cnpj=None,
+                omie_app_key=account["app_key"],
+                omie_app_secret=account["app_secret"],
+                omie_client=(omie_client_factory or _default_omie_client)(account),
+                xbz_catalog=catalog,
+                mapper=catalog.payload_for,
+                **options,
+            )
+    except Exception as e:
+        get_logger(__name__).exception(f"❌ Falha na sincronização da conta {name}: {e}")
+        error = str(e)
+    finally:
+        flush_logs()
+
+    result = {"account": name, "seconds": round(time.perf_counter() - started, 3), "error": error}
+    try:
+        with open(REPORT_FILE, encoding="utf-8") as file:
+            result["products"] = json.load(file).get("gauges", {}).get("sync_products", {})
+    except (OSError, ValueError):
+        result["products"] = {}
+    return result
+
+
+def fetch_shared_catalog(xbz_client, path=None) -> str:
+    """Downloads the XBZ catalog once, saves its snapshot and writes the shared, pre-mapped catalog."""
+    path = path or state_path(SHARED_CATALOG_FILE)
+    logger.info("📦 Buscando produtos da XBZ (uma vez para todas as contas)...")
+    snapshot = open_produtos_xbz_snapshot()
+    products = xbz_client.get_products(snapshot=snapshot)
+    close_produtos_xbz_snapshot(snapshot)
+    SharedCatalog.write(path, products)
+    logger.info(f"✅ {len(products)} produtos XBZ mapeados e compartilhados em '{path}'.")
+    return path
+
+
+def sync_accounts(accounts, xbz_client, settings=None, max_processes=None, omie_client_factory=None) -> list:
+    """Syncs every account in parallel processes from a single XBZ download; returns one result per account.
+
+    `omie_client_factory(account)` builds each account's OMIE client (it runs in
+    the worker process, so it must be picklable).
+    """
+    # Absolute, since the workers run from their account's directory
+    catalog_path = os.path.abspath(fetch_shared_catalog(xbz_client))
+    settings = settings or {}
+    processes = max_processes or len(accounts)
+    logger.info(f"🚀 Sincronizando {len(accounts)} contas OMIE em {min(processes, len(accounts))} processos...")
+
+    started = time.perf_counter()
+    # spawn: workers start clean instead of inheriting the parent's threads and locks
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+        futures = [
+            executor.submit(_sync_account, account, catalog_path, os.getcwd(), settings, omie_client_factory)
+            for account in accounts
+        ]
+        results = []
+        for account, future in zip(accounts, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # The worker process itself died (e.g. out of memory)
+                results.append({"account": account["name"], "seconds": None, "error": str(e), "products": {}})
+    elapsed = time.perf_counter() - started
+
+    logger.info("=" * 60)
+    logger.info("📊 RESUMO POR CONTA")
+    logger.info("=" * 60)
+    for result in results:
+        products = result["products"]
+        status = f"❌ {result['error']}" if result["error"] else "✅"
+        logger.info(f"{status} {result['account']}: {products.get('result=inserted', 0)} inseridos, "
+                    f"{products.get('result=failed', 0)} com erro, {products.get('result=pending', 0)} pendentes "
+                    f"({result['seconds'] if result['seconds'] is not None else '?'}s)")
+    logger.info(f"⏱️ Tempo total: {elapsed:.1f}s")
+    logger.info("=" * 60)
+
+    report = {"seconds": round(elapsed, 3), "accounts": results}
+    with open(os.path.join(os.getcwd(), REPORT_FILE_NAME), "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+    return results
+
+
+def main():
+    from dotenv import load_dotenv
+    from app.utils.logger import configure_logging
+
+    load_dotenv()
+    configure_logging()
+
+    accounts = load_accounts(os.getenv("OMIE_ACCOUNTS_FILE") or ACCOUNTS_FILE)
+    # Defaults for every account (same variables as app.main); the accounts file can override them
+    settings = {
+        "max_inserts": env_number("MAX_INSERTS_PER_RUN", int),
+        "rate_limit": env_number("OMIE_RATE_LIMIT", float),
+        "rate_burst": env_number("OMIE_RATE_BURST", int),
+        "workers": env_number("INSERT_WORKERS", int),
+        "lot_size": env_number("OMIE_LOT_SIZE", int),
+        "list_workers": env_number("OMIE_LIST_WORKERS", int),
+        "priority": os.getenv("INSERT_PRIORITY") or None,
+        "full_refresh": os.getenv("OMIE_FULL_REFRESH", "").lower() in ("1", "true", "yes"),
+        "resume": os.getenv("SYNC_RESUME", "1").lower() not in ("0", "false", "no"),
+    }
+    try:
+        results = sync_accounts(
+            accounts,
+            XBZClient(token=os.getenv("XBZ_TOKEN"), cnpj=os.getenv("XBZ_CNPJ"), cache=XbzCatalogCache()),
+            settings=settings,
+            max_processes=env_number("MAX_ACCOUNT_PROCESSES", int),
+        )
+    finally:
+        flush_logs()
+    if any(result["error"] for result in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Field-level reconciliation between the XBZ catalog and OMIE.
+
+    python -m app.reconcile            # report only
+    python -m app.reconcile --apply    # also sends the update plan to OMIE
+
+Lists both catalogs, joins them on `codigo_produto_integracao` and writes:
+- reconciliation_report.json: totals, products missing in OMIE, products in
+  OMIE that are not in the XBZ catalog and mismatch counts per field;
+- reconciliation_mismatches.csv: one line per product and field that differs
+  (OMIE value and the value `map_product` would send);
+- reconciliation_update_plan.jsonl: the partial records that bring OMIE back
+  in line, applied with --apply.
+"""
+import argparse
+import os
+import time
+
+from app.clients.omie_client import OmieClient, OmieListingError
+from app.clients.xbz_client import XBZClient
+from app.core.product_sync import OMIE_LIST_WORKERS, OMIE_RATE_BURST, OMIE_REQUESTS_PER_SECOND
+from app.core.reconciliation import apply_update_plan, reconcile
+from app.core.stock_price_sync import STOCK_PRICE_LOT_SIZE
+from app.utils.logger import get_logger, flush_logs
+from app.utils.env import env_number
+from app.utils.rate_limiter import TokenBucket
+
+logger = get_logger(__name__)
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    from app.utils.logger import configure_logging
+
+    parser = argparse.ArgumentParser(description="Compara os catálogos da XBZ e da OMIE campo a campo.")
+    parser.add_argument("--apply", action="store_true", help="envia para a OMIE as correções do plano de atualização")
+    parser.add_argument("--output-dir", default=None, help="diretório dos arquivos gerados (padrão: o atual)")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    configure_logging()
+
+    limiter = TokenBucket(
+        rate=env_number("OMIE_RATE_LIMIT", float) or OMIE_REQUESTS_PER_SECOND,
+        burst=env_number("OMIE_RATE_BURST", int) or OMIE_RATE_BURST,
+    )
+    omie_client = OmieClient(app_key=os.getenv("OMIE_APP_KEY"), app_secret=os.getenv("OMIE_APP_SECRET"))
+    xbz_client = XBZClient(token=os.getenv("XBZ_TOKEN"), cnpj=os.getenv("XBZ_CNPJ"))
+    try:
+        logger.info("📦 Buscando produtos da OMIE...")
+        try:
+            omie_products = omie_client.list_products(
+                workers=env_number("OMIE_LIST_WORKERS", int) or OMIE_LIST_WORKERS, limiter=limiter)
+        except OmieListingError as e:
+            # A partial catalog would show most products as missing
+            logger.error(f"❌ Não foi possível carregar o catálogo completo da OMIE: {e}")
+            raise SystemExit(1)
+        logger.info("📦 Buscando produtos da XBZ...")
+        xbz_products = xbz_client.get_products()
+
+        started = time.perf_counter()
+        result = reconcile(xbz_products, omie_products)
+        summary = result.summary()
+        logger.info(f"🔎 Reconciliação de {summary['xbz_total']} produtos XBZ com {summary['omie_total']} da OMIE "
+                    f"em {time.perf_counter() - started:.1f}s:")
+        logger.info(f"   ✅ Iguais: {summary['in_sync']}")
+        logger.info(f"   ✏️ Com diferenças: {summary['with_mismatches']} "
+                    f"({', '.join(f'{field}: {count}' for field, count in summary['mismatches_by_field'].items()) or '-'})")
+        logger.info(f"   ➕ Faltando na OMIE: {summary['missing_in_omie']}")
+        logger.info(f"   ❓ Na OMIE mas não na XBZ: {summary['orphaned_in_omie']}")
+        if summary["unmappable"]:
+            logger.info(f"   🚫 Na XBZ com dados que não podem ser mapeados: {summary['unmappable']}")
+        if summary["sem_codigo_integracao"]:
+            logger.info(f"   ⚠️ Na OMIE sem código de integração (não comparados): {summary['sem_codigo_integracao']}")
+        paths = result.write(args.output_dir)
+        logger.info(f"📝 Relatório salvo em {', '.join(repr(os.path.basename(path)) for path in paths)}")
+
+        if args.apply:
+            plan = result.update_plan()
+            logger.info(f"🚀 Enviando {len(plan)} correções para a OMIE...")
+            counts = apply_update_plan(omie_client, plan, limiter,
+                                       lot_size=env_number("OMIE_LOT_SIZE", int) or STOCK_PRICE_LOT_SIZE)
+            logger.info(f"✅ {counts['updated']} produtos corrigidos, {counts['failed']} com erro, "
+                        f"{counts['not_sent']} não enviados.")
+    finally:
+        flush_logs()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
-import csv
 import os
 from datetime import datetime
 from typing import Dict
+from app.utils.logger import get_logger
+from app.utils.result_writer import get_writer
 
 LOG_DIR = "logs"
+# Base names: rows go to one file per day (e.g. logs/skipped_products_2025-12-01.csv)
 SKIPPED_FILE = os.path.join(LOG_DIR, "skipped_products.csv")
 ERROR_FILE = os.path.join(LOG_DIR, "error_products.csv")
 
@@ -11,31 +13,28 @@ ERROR_FILE = os.path.join(LOG_DIR, "error_products.csv")
 os.makedirs(LOG_DIR, exist_ok=True)
 
 def _write_to_csv(file_path: str, row: Dict):
-    file_exists = os.path.isfile(file_path)
-    with open(file_path, mode="a", newline="", encoding="utf-8") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=row.keys())
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow(row)
+    # One buffered handle per file, flushed in batches and closed at exit
+    get_writer(file_path, rotate="daily").write(row)
 
 def log_skip(product: Dict):
-    product["log_timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    _write_to_csv(SKIPPED_FILE, product)
+    row = {**product, "log_timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+    _write_to_csv(SKIPPED_FILE, row)
 
 def log_error(product: Dict, error_msg: str):
-    product["log_timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    product["error_message"] = error_msg
-    _write_to_csv(ERROR_FILE, product)
+    row = {**product, "log_timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "error_message": error_msg}
+    _write_to_csv(ERROR_FILE, row)
 
 # Wrappers opcionais para mensagens no terminal
+logger = get_logger(__name__)
+
 def info(msg: str):
-    print(f"ℹ️ {msg}")
+    logger.info(f"ℹ️ {msg}")
 
 def warning(msg: str):
-    print(f"⚠️ {msg}")
+    logger.warning(f"⚠️ {msg}")
 
 def error(msg: str):
-    print(f"❌ {msg}")
+    logger.error(f"❌ {msg}")
 
 def critical(msg: str):
-    print(f"🔥 {msg}")
+    logger.critical(f"🔥 {msg}")
@@ -0,0 +1,7 @@
+import os
+
+
+def env_number(name, cast):
+    """Reads an optional numeric setting; unset or empty gives None."""
+    value = os.getenv(name)
+    return cast(value) if value else None
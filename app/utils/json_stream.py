@@ -0,0 +1,60 @@
+import codecs
+import json
+import re
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_NUMBER_END = re.compile(r"[\s,\]]")
+
+
+def iter_json_array(chunks):
+    """Yields the objects of a top-level JSON array from an iterable of byte or text chunks.
+
+    Only the element being parsed (plus the current chunk) is kept in memory, so
+    large responses can be processed while they are still being downloaded.
+    """
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    started = False
+
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = utf8.decode(chunk)
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= len(buffer):
+                break
+
+            if not started:
+                if buffer[pos] == "\ufeff":
+                    pos += 1
+                    continue
+                if buffer[pos] != "[":
+                    raise ValueError(f"Esperado um array JSON, encontrado {buffer[pos]!r}")
+                started = True
+                pos += 1
+                continue
+
+            if buffer[pos] == ",":
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Element not fully downloaded yet
+                break
+            if type(item) in (int, float) and not _NUMBER_END.match(buffer, end):
+                # A number cut at the end of the chunk ("12" of 1234, "-5." of -5.0) may still continue
+                break
+            yield item
+            pos = end
+
+    raise ValueError("Resposta JSON incompleta: array não foi fechado")
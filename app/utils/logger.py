@@ -1,17 +1,167 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
 import sys
+from datetime import datetime
 
-def get_logger(name: str = "product-sync") -> logging.Logger:
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
+BASE_LOGGER = "product-sync"
 
-    if not logger.handlers:
-        handler = logging.StreamHandler(sys.stdout)
-        formatter = logging.Formatter(
-            fmt="🔹 [%(asctime)s] [%(levelname)s] → %(message)s",
-            datefmt="%Y-%m-%d %H:%M:%S"
-        )
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
+# LOG_LEVEL: DEBUG also dumps every OMIE payload and response
+# LOG_FORMAT: "text" (human readable) or "json" (one compact JSON object per line)
+DEFAULT_LEVEL = "INFO"
+DEFAULT_FORMAT = "text"
 
+# Records are written in batches by a background thread: when this many are
+# buffered, on warnings and errors, or once the log has been idle for a moment
+FLUSH_EVERY_RECORDS = 200
+FLUSH_IDLE_SECONDS = 0.5
+
+_listener = None
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """Writes to the current `sys.stdout` (so `contextlib.redirect_stdout` keeps working)."""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class _BatchingHandler(logging.handlers.MemoryHandler):
+    """Buffers records and writes them to the target in batches."""
+
+    def __init__(self, target, capacity=FLUSH_EVERY_RECORDS):
+        super().__init__(capacity, flushLevel=logging.WARNING, target=target, flushOnClose=True)
+
+    def flush(self):
+        super().flush()
+        if self.target is not None:
+            self.target.flush()
+
+
+class _BatchingListener(logging.handlers.QueueListener):
+    """Queue listener that also flushes its handlers whenever the queue goes idle."""
+
+    def __init__(self, log_queue, *handlers, idle_seconds=FLUSH_IDLE_SECONDS):
+        super().__init__(log_queue, *handlers)
+        self.idle_seconds = idle_seconds
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, timeout=self.idle_seconds)
+            except queue.Empty:
+                for handler in self.handlers:
+                    handler.flush()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message and the record's `fields`."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _ContextFilter(logging.Filter):
+    """Adds fixed `context` fields (e.g. the OMIE account) to every record."""
+
+    def __init__(self, context):
+        super().__init__()
+        self.context = context
+
+    def filter(self, record):
+        record.fields = {**self.context, **(getattr(record, "fields", None) or {})}
+        return True
+
+
+def _formatter(log_format, context=None):
+    if log_format == "json":
+        return JsonFormatter()
+    prefix = "".join(f"[{value}] " for value in (context or {}).values())
+    return logging.Formatter(
+        fmt=f"🔹 [%(asctime)s] [%(levelname)s] {prefix}→ %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+
+def configure_logging(level=None, log_format=None, context=None):
+    """(Re)configures the base logger: a non-blocking QueueHandler feeding a
+    background listener that writes batched lines to stdout.
+
+    `context` fields are added to every record (and shown before each text line).
+    """
+    global _listener
+    level = (level or os.getenv("LOG_LEVEL") or DEFAULT_LEVEL).upper()
+    log_format = (log_format or os.getenv("LOG_FORMAT") or DEFAULT_FORMAT).lower()
+
+    logger = logging.getLogger(BASE_LOGGER)
+    if _listener is not None:
+        _listener.stop()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    output = _StdoutHandler()
+    output.setFormatter(_formatter(log_format, context))
+    log_queue = queue.SimpleQueue()
+    _listener = _BatchingListener(log_queue, _BatchingHandler(output))
+    _listener.start()
+
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    if context:
+        queue_handler.addFilter(_ContextFilter(context))
+    logger.addHandler(queue_handler)
+    logger.setLevel(level)
+    logger.propagate = False
     return logger
+
+
+def flush_logs():
+    """Blocks until every record logged so far has been written."""
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.flush()
+        _listener.start()
+
+
+def _shutdown():
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+
+
+atexit.register(_shutdown)
+
+
+def get_logger(name: str = BASE_LOGGER) -> logging.Logger:
+    if _listener is None:
+        configure_logging()
+    if name == BASE_LOGGER or name.startswith(BASE_LOGGER + "."):
+        return logging.getLogger(name)
+    return logging.getLogger(f"{BASE_LOGGER}.{name}")
+
+
+def log_event(logger: logging.Logger, level: int, message: str, /, **fields):
+    """Logs `message` with structured `fields` (emitted as JSON keys with LOG_FORMAT=json)."""
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={"fields": fields})
@@ -0,0 +1,302 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from app.utils.logger import get_logger
+
+# Upper bounds (seconds) of the latency histogram buckets; OMIE calls range from
+# ~100ms to tens of seconds when retries and backoff kick in
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PROMETHEUS_FILE = "metrics.prom"
+REPORT_FILE = "run_report.json"
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: tuple, extra=()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _rounded(value, digits=3):
+    return None if value is None else round(value, digits)
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (the max when past the last bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges, latency histograms and phase timers for one run.
+
+    Exported as a Prometheus textfile (for node_exporter's textfile collector or
+    the CI artifacts) and as a JSON run report.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = datetime.now()
+            self._help = {}
+            self._counters = {}
+            self._gauges = {}
+            self._histograms = {}
+            self._phases = {}
+
+    def _register(self, name, help_text):
+        if help_text and name not in self._help:
+            self._help[name] = help_text
+
+    def inc(self, name, value=1, help_text=None, **labels):
+        with self._lock:
+            self._register(name, help_text)
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name, value, help_text=None, **labels):
+        with self._lock:
+            self._register(name, help_text)
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name, value, help_text=None, **labels):
+        with self._lock:
+            self._register(name, help_text)
+            series = self._histograms.setdefault(name, {})
+            key = _label_key(labels)
+            if key not in series:
+                series[key] = _Histogram(self.buckets)
+            series[key].observe(value)
+
+    def add_phase_time(self, phase, seconds):
+        with self._lock:
+            self._phases[phase] = self._phases.get(phase, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Adds the time spent in the block to phase `name` (phases can be entered many times)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase_time(name, time.perf_counter() - started)
+
+    def timed_iter(self, iterable, phase):
+        """Yields from `iterable`, charging only the time spent producing each item to `phase`.
+
+        Used for streamed sources, where downloading and processing interleave.
+        """
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_phase_time(phase, time.perf_counter() - started)
+                return
+            self.add_phase_time(phase, time.perf_counter() - started)
+            yield item
+
+    # -- API calls --------------------------------------------------------------------
+
+    def note_retry(self):
+        """Counts a retry for the innermost call being timed by `timed_call` on this thread."""
+        stack = getattr(self._local, "retries", None)
+        if stack:
+            stack[-1] += 1
+
+    def timed_call(self, method, outcome):
+        """Decorator recording the latency of an API call as `api_call_duration_seconds`.
+
+        `outcome` maps the call's return value (or raised exception) to a label such as
+        "success", "skipped", "rate_limited", "server_error", "timeout" or "error".
+        The retry count comes from `note_retry` calls made while it runs; the latency
+        includes retries and their backoff.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not hasattr(self._local, "retries"):
+                    self._local.retries = []
+                self._local.retries.append(0)
+                started = time.perf_counter()
+                result = error = None
+                try:
+                    result = func(*args, **kwargs)
+                    return result
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    retries = self._local.retries.pop()
+                    self.record_call(method, time.perf_counter() - started,
+                                     outcome(error if error is not None else result), retries)
+            return wrapper
+        return decorator
+
+    def record_call(self, method, seconds, outcome, retries=0):
+        self.observe("api_call_duration_seconds", seconds,
+                     help_text="Latency of OMIE API calls (including retries), by method, outcome and retry count",
+                     method=method, outcome=outcome, retries=retries)
+
+    # -- export -----------------------------------------------------------------------
+
+    def prometheus_text(self) -> str:
+        lines = []
+        with self._lock:
+            def header(name, metric_type):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {metric_type}")
+
+            for name, series in sorted(self._counters.items()):
+                header(name, "counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._gauges.items()):
+                header(name, "gauge")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                header(name, "histogram")
+                for key, histogram in sorted(series.items()):
+                    for bound, total in histogram.cumulative():
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', repr(bound))])} {total}")
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+            if self._phases:
+                lines.append("# HELP sync_phase_seconds Wall time spent in each phase of the sync")
+                lines.append("# TYPE sync_phase_seconds gauge")
+                for phase, seconds in sorted(self._phases.items()):
+                    lines.append(f'sync_phase_seconds{{phase="{phase}"}} {seconds:.6f}')
+        return "\n".join(lines) + "\n"
+
+    def report(self) -> dict:
+        with self._lock:
+            api_calls = {}
+            for key, histogram in self._histograms.get("api_call_duration_seconds", {}).items():
+                labels = dict(key)
+                entry = api_calls.setdefault(labels["method"], {}).setdefault(
+                    labels["outcome"], {"count": 0, "retries": 0, "total_s": 0.0, "max_s": 0.0, "histogram": None})
+                entry["count"] += histogram.count
+                entry["retries"] += histogram.count * int(labels["retries"])
+                entry["total_s"] = round(entry["total_s"] + histogram.sum, 3)
+                entry["max_s"] = round(max(entry["max_s"], histogram.max), 3)
+                if entry["histogram"] is None:
+                    entry["histogram"] = _Histogram(self.buckets)
+                merged = entry["histogram"]
+                merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+                merged.count += histogram.count
+                merged.max = max(merged.max, histogram.max)
+            for outcomes in api_calls.values():
+                for entry in outcomes.values():
+                    histogram = entry.pop("histogram")
+                    entry["p50_s"] = _rounded(histogram.quantile(0.5))
+                    entry["p95_s"] = _rounded(histogram.quantile(0.95))
+
+            return {
+                "started_at": self.started_at.isoformat(timespec="seconds"),
+                "finished_at": datetime.now().isoformat(timespec="seconds"),
+                "phases_s": {phase: round(seconds, 3) for phase, seconds in sorted(self._phases.items())},
+                "counters": {
+                    name: {",".join(f"{k}={v}" for k, v in key) or "total": value for key, value in sorted(series.items())}
+                    for name, series in sorted(self._counters.items())
+                },
+                "gauges": {
+                    name: {",".join(f"{k}={v}" for k, v in key) or "value": value for key, value in sorted(series.items())}
+                    for name, series in sorted(self._gauges.items())
+                },
+                "api_calls": api_calls,
+            }
+
+    def export(self, directory=None, prometheus_file=PROMETHEUS_FILE, report_file=REPORT_FILE):
+        """Writes the Prometheus textfile and the JSON run report (atomically) and returns their paths."""
+        directory = directory or os.getcwd()
+        paths = []
+        for file_name, content in ((prometheus_file, self.prometheus_text()),
+                                   (report_file, json.dumps(self.report(), indent=2, ensure_ascii=False))):
+            path = os.path.join(directory, file_name)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                file.write(content)
+            os.replace(tmp_path, path)
+            paths.append(path)
+        return paths
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Process-wide registry shared by the API clients and the sync."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry()
+        return _registry
+
+
+def exports_run_metrics(func):
+    """Decorator for a run entry point: starts it with an empty registry and exports
+    the metrics when it returns, including early returns and failures."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        registry = get_metrics()
+        registry.reset()
+        try:
+            with registry.phase("total"):
+                return func(*args, **kwargs)
+        finally:
+            try:
+                prometheus_path, report_path = registry.export()
+                get_logger(__name__).info(f"📈 Métricas salvas em '{os.path.basename(prometheus_path)}' e '{os.path.basename(report_path)}'")
+            except OSError as e:
+                get_logger(__name__).warning(f"⚠️ Não foi possível salvar as métricas: {e}")
+    return wrapper
@@ -0,0 +1,58 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every worker that talks to the OMIE API.
+
+    `rate` is the number of tokens refilled per second and `burst` the bucket
+    capacity, i.e. how many requests may go out back-to-back after an idle period.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate must be greater than zero")
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._updated_at = now
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self, stop_event: threading.Event = None) -> bool:
+        """Blocks until a token is available.
+
+        Returns False without consuming a token if `stop_event` gets set while waiting.
+        """
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                return False
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait_time = (1 - self._tokens) / self.rate
+            if stop_event is not None:
+                stop_event.wait(wait_time)
+            else:
+                time.sleep(wait_time)
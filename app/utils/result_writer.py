@@ -0,0 +1,352 @@
+import atexit
+import csv
+import gzip
+import importlib.util
+import os
+import threading
+from datetime import date
+
+FLUSH_EVERY_ROWS = 500
+SNAPSHOT_CHUNK_ROWS = 5000
+
+
+def _read_header(path):
+    try:
+        with open(path, newline="", encoding="utf-8") as file:
+            return next(csv.reader(file), None)
+    except FileNotFoundError:
+        return None
+
+
+class CsvResultWriter:
+    """Appends rows to a CSV file through one open, buffered handle.
+
+    - rows are buffered and written every `flush_every` rows (and on `flush`/`close`);
+    - the header is the union of the keys of every row written so far: when a
+      row brings a new column, the file is rewritten once with the wider header;
+    - with `rotate="daily"`, `path` is a base name and rows go to
+      `<name>_<YYYY-MM-DD><ext>`, switching files when the date changes.
+    """
+
+    def __init__(self, path, fieldnames=None, flush_every=FLUSH_EVERY_ROWS, rotate=None, mode="a"):
+        self.base_path = path
+        self.flush_every = flush_every
+        self.rotate = rotate
+        self.mode = mode
+        self._initial_fields = list(fieldnames or [])
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._file = None
+        self._writer = None
+        self._fieldnames = []
+        self._current_path = None
+        self._header_pending = False
+
+    def _path_for_today(self):
+        if self.rotate != "daily":
+            return self.base_path
+        root, ext = os.path.splitext(self.base_path)
+        return f"{root}_{date.today().isoformat()}{ext}"
+
+    @property
+    def path(self):
+        return self._current_path or self._path_for_today()
+
+    def _open(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        existing_header = _read_header(path) if self.mode == "a" else None
+        self._fieldnames = existing_header or []
+        for name in self._initial_fields:
+            if name not in self._fieldnames:
+                self._fieldnames.append(name)
+        if existing_header and self._fieldnames != existing_header:
+            self._rewrite(path)
+        self._file = open(path, self.mode, newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=self._fieldnames, restval="")
+        self._header_pending = not existing_header
+        self._current_path = path
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+    def _rewrite(self, path):
+        """Rewrites the rows already in `path` under the current (wider) header."""
+        tmp_path = f"{path}.tmp"
+        with open(path, newline="", encoding="utf-8") as source, \
+                open(tmp_path, "w", newline="", encoding="utf-8") as target:
+            reader = csv.DictReader(source)
+            writer = csv.DictWriter(target, fieldnames=self._fieldnames, restval="")
+            writer.writeheader()
+            writer.writerows(reader)
+        os.replace(tmp_path, path)
+
+    def _widen(self, rows):
+        new_fields = [key for row in rows for key in row if key not in self._fieldnames]
+        if not new_fields:
+            return
+        for key in dict.fromkeys(new_fields):
+            self._fieldnames.append(key)
+        if self._header_pending:
+            self._writer = csv.DictWriter(self._file, fieldnames=self._fieldnames, restval="")
+            return
+        self._file.close()
+        self._rewrite(self._current_path)
+        self._file = open(self._current_path, "a", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=self._fieldnames, restval="")
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        path = self._path_for_today()
+        if path != self._current_path:
+            self._close_file()
+            self._open(path)
+        rows, self._buffer = self._buffer, []
+        self._widen(rows)
+        if self._header_pending:
+            self._writer.writeheader()
+            self._header_pending = False
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def write(self, row: dict):
+        with self._lock:
+            self._buffer.append(dict(row))
+            if len(self._buffer) >= self.flush_every:
+                self._flush_locked()
+
+    def write_many(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            if self._file is None and self.mode == "w" and self._current_path is None and self._initial_fields:
+                # Nothing was written: still leave a file with just the header
+                self._open(self._path_for_today())
+                self._writer.writeheader()
+            self._close_file()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_csv(path, rows, fieldnames=None):
+    """Writes `rows` to `path` in one go (header = `fieldnames` plus any other key found in the rows)."""
+    with CsvResultWriter(path, fieldnames=fieldnames, mode="w") as writer:
+        writer.write_many(rows)
+    return path
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(path, **kwargs) -> CsvResultWriter:
+    """Shared appending writer for `path`, kept open until the process exits."""
+    with _writers_lock:
+        if path not in _writers:
+            _writers[path] = CsvResultWriter(path, **kwargs)
+        return _writers[path]
+
+
+def close_writers():
+    with _writers_lock:
+        for writer in _writers.values():
+            writer.close()
+        _writers.clear()
+
+
+atexit.register(close_writers)
+
+
+def parquet_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _as_text_or_none(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return value if isinstance(value, str) else str(value)
+
+
+def _arrow_column(values):
+    import pyarrow as pa
+
+    try:
+        return pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        # Mixed types (e.g. "" and numbers) are not a valid Parquet column: only this one is kept as text
+        return pa.array([_as_text_or_none(value) for value in values], type=pa.string())
+
+
+def _common_type(current, new):
+    import pyarrow as pa
+
+    if pa.types.is_null(current):
+        return new
+    if pa.types.is_null(new) or current == new:
+        return current
+    if {current, new} <= {pa.int64(), pa.float64()}:
+        return pa.float64()
+    return pa.string()
+
+
+def _conform(table, schema):
+    """`table` with the columns and types of `schema` (missing columns as nulls)."""
+    import pyarrow as pa
+
+    columns = []
+    for field in schema:
+        if field.name not in table.column_names:
+            columns.append(pa.nulls(len(table), field.type))
+            continue
+        column = table.column(field.name)
+        if column.type != field.type:
+            try:
+                column = column.cast(field.type)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                column = pa.array([_as_text_or_none(value) for value in column.to_pylist()], type=field.type)
+        columns.append(column)
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+class SnapshotWriter:
+    """Compressed dump of a full catalog, written while the catalog streams through.
+
+    Rows are buffered in chunks of `chunk_rows` and each chunk is appended to
+    `<base>.parquet` (zstd, one row group per chunk) when pyarrow is installed,
+    or to `<base>.csv.gz` otherwise, so memory stays at one chunk however large
+    the catalog is. Columns are the union of every row's keys and Parquet
+    columns keep their own types. A column that first shows up in a later
+    chunk (or a Parquet column whose type changes, e.g. all nulls and then
+    text) rewrites what was written so far once, under the wider header. The
+    file is moved to its final path on `close`.
+    """
+
+    def __init__(self, base_path, chunk_rows=SNAPSHOT_CHUNK_ROWS, format=None):
+        self.format = format or ("parquet" if parquet_available() else "csv.gz")
+        self.path = f"{base_path}.{self.format}"
+        self.chunk_rows = chunk_rows
+        self._tmp_path = f"{self.path}.tmp"
+        self._rows = []
+        self._columns = {}
+        self._file = None
+        self._writer = None
+        self._schema = None
+        self.count = 0
+
+    def write(self, row: dict):
+        self._rows.append(row)
+        self.count += 1
+        if len(self._rows) >= self.chunk_rows:
+            self._write_chunk()
+
+    def _write_chunk(self):
+        rows, self._rows = self._rows, []
+        new_columns = [key for key in dict.fromkeys(key for row in rows for key in row) if key not in self._columns]
+        self._columns.update(dict.fromkeys(new_columns))
+        if self.format == "parquet":
+            self._write_parquet(rows)
+        else:
+            self._write_csv(rows, widened=bool(new_columns))
+
+    def _write_csv(self, rows, widened):
+        if self._file is not None and widened:
+            self._rewrite_csv()
+        if self._file is None:
+            self._file = gzip.open(self._tmp_path, "wt", newline="", encoding="utf-8", compresslevel=5)
+            self._writer = csv.DictWriter(self._file, fieldnames=list(self._columns), restval="")
+            self._writer.writeheader()
+        self._writer.writerows(rows)
+
+    def _rewrite_csv(self):
+        """Rewrites the rows written so far under the current (wider) header."""
+        self._file.close()
+        rewrite_path = f"{self._tmp_path}.rewrite"
+        with gzip.open(self._tmp_path, "rt", newline="", encoding="utf-8") as source, \
+                gzip.open(rewrite_path, "wt", newline="", encoding="utf-8", compresslevel=5) as target:
+            writer = csv.DictWriter(target, fieldnames=list(self._columns), restval="")
+            writer.writeheader()
+            writer.writerows(csv.DictReader(source))
+        os.replace(rewrite_path, self._tmp_path)
+        # A gzip file may hold several members: later chunks are appended as a new one
+        self._file = gzip.open(self._tmp_path, "at", newline="", encoding="utf-8", compresslevel=5)
+        self._writer = csv.DictWriter(self._file, fieldnames=list(self._columns), restval="")
+
+    def _write_parquet(self, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table({column: _arrow_column([row.get(column) for row in rows]) for column in self._columns})
+        if self._writer is None:
+            self._schema = table.schema
+            self._writer = pq.ParquetWriter(self._tmp_path, self._schema, compression="zstd")
+        else:
+            schema = pa.schema([
+                pa.field(name, _common_type(self._schema.field(name).type, table.schema.field(name).type)
+                         if name in self._schema.names else table.schema.field(name).type)
+                for name in self._columns
+            ])
+            if schema != self._schema:
+                # Rewritten from the compact Arrow copy of what was written so far
+                self._writer.close()
+                written = _conform(pq.read_table(self._tmp_path), schema)
+                self._schema = schema
+                self._writer = pq.ParquetWriter(self._tmp_path, self._schema, compression="zstd")
+                self._writer.write_table(written)
+            table = _conform(table, self._schema)
+        self._writer.write_table(table)
+
+    def reset(self):
+        """Drops every row written so far (e.g. when the catalog has to be read again from another source)."""
+        if self._writer is not None and self.format == "parquet":
+            self._writer.close()
+        elif self._file is not None:
+            self._file.close()
+        self._file = self._writer = self._schema = None
+        self._rows = []
+        self._columns = {}
+        self.count = 0
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def close(self):
+        if self._rows:
+            self._write_chunk()
+        if self.format == "parquet":
+            if self._writer is None:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                pq.write_table(pa.table({}), self._tmp_path, compression="zstd")
+            else:
+                self._writer.close()
+        elif self._file is None:
+            with gzip.open(self._tmp_path, "wt", encoding="utf-8", compresslevel=5):
+                pass
+        else:
+            self._file.close()
+        self._file = self._writer = None
+        os.replace(self._tmp_path, self.path)
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
@@ -0,0 +1,11 @@
+import os
+
+# Directory for files that must survive between runs (catalog index, journals, ...).
+# The GitHub Actions workflow caches it between scheduled runs.
+DEFAULT_STATE_DIR = "state"
+
+
+def state_path(filename: str) -> str:
+    state_dir = os.getenv("SYNC_STATE_DIR", DEFAULT_STATE_DIR)
+    os.makedirs(state_dir, exist_ok=True)
+    return os.path.join(state_dir, filename)
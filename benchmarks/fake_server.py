@@ -0,0 +1,256 @@
+"""Local stand-in for the OMIE `produtos` endpoint and the XBZ `GetListaDeProdutos` endpoint.
+
+Used by the benchmarks to measure sync throughput offline. Point the clients at it with:
+
+    server = FakeApiServer(catalog_size=10_000).start()
+    omie_client = OmieClient("key", "secret")
+    omie_client.endpoint = server.omie_endpoint
+    xbz_client = XBZClient("token", "cnpj")
+    xbz_client.base_url = server.xbz_base_url
+"""
+import json
+import math
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+OMIE_PATH = "/api/v1/geral/produtos/"
+XBZ_PATH = "/api/clientes/GetListaDeProdutos"
+
+NCMS = ["39269090", "96081000", "73239300", "42022210", "O8471.60.52", "8523.51.10", "96170010"]
+CORES = ["AZUL", "PRETO", "BRANCO", "VERMELHO", " VERDE ", "AMARELO", ""]
+
+
+def fake_xbz_product(i: int, rng: random.Random) -> dict:
+    return {
+        "CodigoComposto": f"BENCH{i:06d}-{rng.choice(['AZU', 'PRE', 'BRA'])}",
+        "Nome": f"Produto de teste {i}",
+        "Descricao": "Produto gerado para benchmark. " * rng.randint(1, 4),
+        "CorWebPrincipal": rng.choice(CORES),
+        "Ncm": rng.choice(NCMS),
+        "PrecoVenda": round(rng.uniform(0.5, 300), 2),
+        "PrecoVendaFormatado": f"{rng.uniform(0.5, 300):.2f}".replace(".", ","),
+        "QuantidadeDisponivelEstoquePrincipal": rng.randint(0, 5000),
+        "Peso": rng.randint(5, 5000),
+        "Altura": rng.choice([0, 1.5, 10, 22.5]),
+        "Largura": rng.choice([0, 2, 8.5, 30]),
+        "Profundidade": rng.choice([0, 1, 4, 12]),
+    }
+
+
+def fake_omie_product(codigo_integracao: str, codigo_produto: int) -> dict:
+    now = datetime.now()
+    return {
+        "codigo": codigo_integracao,
+        "codigo_produto": codigo_produto,
+        "codigo_produto_integracao": codigo_integracao,
+        "descricao": f"Produto {codigo_integracao}",
+        "ncm": "3926.90.90",
+        "unidade": "UN",
+        "valor_unitario": 10.0,
+        "quantidade_estoque": 0,
+        "peso_bruto": 0.1,
+        "altura": 0.0,
+        "largura": 0.0,
+        "profundidade": 0.0,
+        "bloqueado": "N",
+        "inativo": "N",
+        "info": {"dAlt": now.strftime("%d/%m/%Y"), "hAlt": now.strftime("%H:%M:%S"),
+                 "dInc": now.strftime("%d/%m/%Y"), "hInc": now.strftime("%H:%M:%S")},
+        "recomendacoes_fiscais": {"origem_mercadoria": "0", "market_place": "N"},
+    }
+
+
+class FakeApiServer:
+    """Threaded HTTP server emulating the parts of the OMIE and XBZ APIs the sync uses.
+
+    - `catalog_size` XBZ products, of which the first `omie_existing` are already in OMIE
+    - `latency`: seconds added to every response
+    - `page_size`: caps `registros_por_pagina` for ListarProdutos
+    - `max_requests_per_second`: above this rate OMIE answers MISUSE_API_PROCESS and
+      blocks every call for `block_seconds`
+    - `server_fault_rate`: probability of a transient SOAP-ENV:Server fault
+    - already registered codes answer SOAP-ENV:Client-102
+    """
+
+    def __init__(self, catalog_size=1000, omie_existing=0, latency=0.0, page_size=500,
+                 max_requests_per_second=None, block_seconds=30, server_fault_rate=0.0, seed=42):
+        rng = random.Random(seed)
+        self.xbz_catalog = [fake_xbz_product(i, rng) for i in range(catalog_size)]
+        self.omie_catalog = {}
+        for product in self.xbz_catalog[:omie_existing]:
+            self._register(product["CodigoComposto"])
+        self.latency = latency
+        self.page_size = page_size
+        self.max_requests_per_second = max_requests_per_second
+        self.block_seconds = block_seconds
+        self.server_fault_rate = server_fault_rate
+        self._rng = random.Random(seed + 1)
+        self._lock = threading.Lock()
+        self._recent_requests = []
+        self._blocked_until = 0.0
+        self.stats = {"omie_requests": 0, "xbz_requests": 0, "misuse": 0, "server_faults": 0, "duplicates": 0}
+        self._httpd = None
+        self._thread = None
+
+    # -- lifecycle -------------------------------------------------------------------
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, data, status=200):
+                body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if not self.path.startswith(XBZ_PATH):
+                    self._send_json({"error": "not found"}, status=404)
+                    return
+                if server.latency:
+                    time.sleep(server.latency)
+                with server._lock:
+                    server.stats["xbz_requests"] += 1
+                self._send_json(server.xbz_catalog)
+
+            def do_POST(self):
+                if not self.path.startswith(OMIE_PATH):
+                    self._send_json({"error": "not found"}, status=404)
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if server.latency:
+                    time.sleep(server.latency)
+                response, status = server.handle_omie(request)
+                self._send_json(response, status=status)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def omie_endpoint(self):
+        return self.base_url + OMIE_PATH
+
+    @property
+    def xbz_base_url(self):
+        return self.base_url + "/api/clientes"
+
+    # -- OMIE emulation -------------------------------------------------------------
+
+    def _register(self, codigo):
+        if codigo not in self.omie_catalog:
+            self.omie_catalog[codigo] = fake_omie_product(codigo, 8_000_000_000 + len(self.omie_catalog))
+        return self.omie_catalog[codigo]
+
+    def _throttled(self):
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return True
+        if self.max_requests_per_second is None:
+            return False
+        self._recent_requests = [t for t in self._recent_requests if now - t < 1.0]
+        self._recent_requests.append(now)
+        if len(self._recent_requests) > self.max_requests_per_second:
+            self._blocked_until = now + self.block_seconds
+            return True
+        return False
+
+    def handle_omie(self, request):
+        with self._lock:
+            self.stats["omie_requests"] += 1
+            if self._throttled():
+                self.stats["misuse"] += 1
+                remaining = max(1, math.ceil(self._blocked_until - time.monotonic()))
+                return {
+                    "faultstring": f"ERROR: API bloqueada por consumo indevido. Tente novamente em {remaining} segundos.",
+                    "faultcode": "MISUSE_API_PROCESS",
+                }, 500
+            if self.server_fault_rate and self._rng.random() < self.server_fault_rate:
+                self.stats["server_faults"] += 1
+                return {"faultstring": "ERROR: Erro interno temporário.", "faultcode": "SOAP-ENV:Server"}, 500
+
+            call = request.get("call")
+            param = (request.get("param") or [{}])[0]
+            if call == "ListarProdutos":
+                return self._listar(param), 200
+            if call == "IncluirProduto":
+                return self._incluir(param)
+            if call == "UpsertProdutosLote":
+                for produto in param.get("produto_servico_cadastro", []):
+                    self._register(produto["codigo_produto_integracao"])
+                return {"lote": param.get("lote"), "codigo_status": "0",
+                        "descricao_status": "Lote processado com sucesso!"}, 200
+            if call == "AlterarProduto":
+                codigo = param.get("codigo_produto_integracao")
+                if codigo not in self.omie_catalog:
+                    return {"faultstring": f"ERROR: Produto [{codigo}] não cadastrado!",
+                            "faultcode": "SOAP-ENV:Client-103"}, 500
+                self.omie_catalog[codigo].update(param)
+                return {"codigo_produto": self.omie_catalog[codigo]["codigo_produto"],
+                        "codigo_produto_integracao": codigo, "codigo_status": "0",
+                        "descricao_status": "Produto alterado com sucesso!"}, 200
+            return {"faultstring": f"ERROR: Método [{call}] não suportado.", "faultcode": "SOAP-ENV:Client-1"}, 500
+
+    def _listar(self, param):
+        page_size = min(int(param.get("registros_por_pagina") or 50), self.page_size)
+        page = int(param.get("pagina") or 1)
+        produtos = list(self.omie_catalog.values())
+        if param.get("filtrar_por_data_de"):
+            desde = datetime.strptime(param["filtrar_por_data_de"], "%d/%m/%Y")
+            produtos = [p for p in produtos if datetime.strptime(p["info"]["dAlt"], "%d/%m/%Y") >= desde]
+        total_paginas = max(1, math.ceil(len(produtos) / page_size))
+        if not produtos or page > total_paginas:
+            return {"faultstring": f"ERROR: Não existem registros para a página [{page}]!",
+                    "faultcode": "SOAP-ENV:Client-5113"}
+        start = (page - 1) * page_size
+        registros = produtos[start:start + page_size]
+        return {
+            "pagina": page,
+            "total_de_paginas": total_paginas,
+            "registros": len(registros),
+            "total_de_registros": len(produtos),
+            "produto_servico_cadastro": registros,
+        }
+
+    def _incluir(self, param):
+        codigo = param.get("codigo_produto_integracao")
+        if not param.get("descricao") or not param.get("ncm"):
+            return {"faultstring": "ERROR: Campos obrigatórios não informados.", "faultcode": "SOAP-ENV:Client-8"}, 500
+        if codigo in self.omie_catalog:
+            self.stats["duplicates"] += 1
+            return {"faultstring": f"ERROR: Produto já cadastrado para o Código de Integração [{codigo}]!",
+                    "faultcode": "SOAP-ENV:Client-102"}, 500
+        produto = self._register(codigo)
+        return {"codigo_produto": produto["codigo_produto"], "codigo_produto_integracao": codigo,
+                "codigo_status": "0", "descricao_status": "Produto cadastrado com sucesso!"}, 200
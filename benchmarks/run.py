@@ -0,0 +1,147 @@
+"""Offline throughput benchmarks for the XBZ → OMIE sync.
+
+Runs `OmieClient.list_products` and `sync_products` against `FakeApiServer`
+for each catalog size and reports wall time, throughput and peak memory:
+
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes 1000 10000 100000 --latency 0.05 --rate 50
+    python -m benchmarks.run --throttle 30 --server-fault-rate 0.02 --stream
+
+Peak memory is measured with tracemalloc, which also slows the code under
+test down; compare runs made with the same options only.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from app.clients.omie_client import OmieClient
+from app.clients.transport import HttpTransport
+from app.clients.xbz_client import XBZClient
+from app.core.product_sync import sync_products
+from app.utils.logger import flush_logs
+from app.utils.rate_limiter import TokenBucket
+from benchmarks.fake_server import FakeApiServer
+
+
+@contextlib.contextmanager
+def measure(result: dict, trace_memory=True):
+    """Fills `result` with `wall_time_s` and `peak_memory_mb` for the enclosed block."""
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["wall_time_s"] = round(time.perf_counter() - started, 3)
+        if trace_memory:
+            result["peak_memory_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+            tracemalloc.stop()
+
+
+@contextlib.contextmanager
+def isolated_run():
+    """Runs the sync in throwaway working/state directories with its output silenced."""
+    previous_cwd = os.getcwd()
+    previous_state = os.environ.get("SYNC_STATE_DIR")
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.environ["SYNC_STATE_DIR"] = os.path.join(workdir, "state")
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                try:
+                    yield workdir
+                finally:
+                    flush_logs()
+        finally:
+            os.chdir(previous_cwd)
+            if previous_state is None:
+                os.environ.pop("SYNC_STATE_DIR", None)
+            else:
+                os.environ["SYNC_STATE_DIR"] = previous_state
+
+
+def make_clients(server: FakeApiServer):
+    transport = HttpTransport()
+    omie_client = OmieClient("bench-key", "bench-secret", transport=transport)
+    omie_client.endpoint = server.omie_endpoint
+    xbz_client = XBZClient("bench-token", "00000000000000", transport=transport)
+    xbz_client.base_url = server.xbz_base_url
+    return omie_client, xbz_client
+
+
+def bench_list_products(size, args):
+    with FakeApiServer(catalog_size=size, omie_existing=size, latency=args.latency,
+                       page_size=args.page_size) as server:
+        omie_client, _ = make_clients(server)
+        result = {"benchmark": "list_products", "catalog_size": size}
+        with isolated_run(), measure(result, trace_memory=not args.no_memory):
+            products = omie_client.list_products(workers=args.list_workers, limiter=TokenBucket(args.rate, args.burst))
+        result["items"] = len(products)
+        result["items_per_s"] = round(len(products) / result["wall_time_s"], 1)
+        result["requests"] = server.stats["omie_requests"]
+        return result
+
+
+def bench_sync_products(size, args):
+    existing = int(size * args.existing_ratio)
+    max_inserts = min(args.max_inserts, size - existing)
+    with FakeApiServer(catalog_size=size, omie_existing=existing, latency=args.latency,
+                       page_size=args.page_size, max_requests_per_second=args.throttle,
+                       server_fault_rate=args.server_fault_rate) as server:
+        omie_client, xbz_client = make_clients(server)
+        result = {"benchmark": "sync_products", "catalog_size": size, "already_in_omie": existing}
+        with isolated_run(), measure(result, trace_memory=not args.no_memory):
+            sync_products(
+                token=None, cnpj=None, omie_app_key=None, omie_app_secret=None,
+                max_inserts=max_inserts,
+                rate_limit=args.rate,
+                rate_burst=args.burst,
+                workers=args.workers,
+                lot_size=args.lot_size,
+                list_workers=args.list_workers,
+                stream=args.stream,
+                xbz_client=xbz_client,
+                omie_client=omie_client,
+            )
+        inserted = len(server.omie_catalog) - existing
+        result["inserted"] = inserted
+        result["inserts_per_s"] = round(inserted / result["wall_time_s"], 1)
+        result.update({key: value for key, value in server.stats.items() if value})
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every fake API response")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=200.0, help="client token bucket rate (requests/s)")
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--list-workers", type=int, default=4)
+    parser.add_argument("--lot-size", type=int, default=None)
+    parser.add_argument("--max-inserts", type=int, default=500)
+    parser.add_argument("--existing-ratio", type=float, default=0.9, help="share of the catalog already in OMIE")
+    parser.add_argument("--throttle", type=int, default=None, help="fake OMIE requests/s before MISUSE_API_PROCESS")
+    parser.add_argument("--server-fault-rate", type=float, default=0.0)
+    parser.add_argument("--stream", action="store_true", help="stream the XBZ catalog")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (faster, no peak memory)")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per result")
+    args = parser.parse_args(argv)
+
+    for size in args.sizes:
+        for bench in (bench_list_products, bench_sync_products):
+            result = bench(size, args)
+            if args.json:
+                print(json.dumps(result))
+            else:
+                print("  ".join(f"{key}={value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import pytest
+
+from benchmarks.fake_server import FakeApiServer
+from benchmarks.run import make_clients
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Runs the test from an empty directory with its own state directory."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("SYNC_STATE_DIR", str(tmp_path / "state"))
+    return tmp_path
+
+
+@pytest.fixture
+def fake_api():
+    """Local OMIE/XBZ stand-in (`benchmarks.fake_server`) with 30 XBZ products, 10 of them in OMIE."""
+    with FakeApiServer(catalog_size=30, omie_existing=10) as server:
+        yield server
+
+
+@pytest.fixture
+def clients(fake_api):
+    """(omie_client, xbz_client) pointed at `fake_api`."""
+    return make_clients(fake_api)
@@ -0,0 +1,110 @@
+import math
+
+import pytest
+
+from app.clients.records import XbzProduct
+from app.mappings.batch_mapping import map_products
+from app.mappings.mapping import map_product
+
+BASE = {
+    "CodigoComposto": "04031-AZU",
+    "Nome": "Caneta Metálica",
+    "Descricao": "Caneta esferográfica metálica com clip.",
+    "CorWebPrincipal": " AZUL ",
+    "Ncm": "9608.10.00",
+    "PrecoVenda": 3.9,
+    "QuantidadeDisponivelEstoquePrincipal": 1200,
+    "Peso": 12,
+    "Altura": 14.2,
+    "Largura": 1.1,
+    "Profundidade": 1.1,
+}
+
+CASES = {
+    "complete": {},
+    "ncm_with_letter_o": {"Ncm": "96O8.1O.OO"},
+    "ncm_too_long": {"Ncm": "9608.10.00.99"},
+    "ncm_missing": {"Ncm": None},
+    "ncm_numeric": {"Ncm": 96081000},
+    "color_missing": {"CorWebPrincipal": None},
+    "color_empty": {"CorWebPrincipal": ""},
+    "long_name": {"Nome": "Caneta " * 30},
+    "descricao_none": {"Descricao": None},
+    "price_int": {"PrecoVenda": 4},
+    "price_zero": {"PrecoVenda": 0},
+    "price_none": {"PrecoVenda": None},
+    "price_empty_string": {"PrecoVenda": ""},
+    "price_numeric_string": {"PrecoVenda": "12.5"},
+    "price_nan": {"PrecoVenda": math.nan},
+    "price_on_rounding_tie": {"PrecoVenda": 1.125, "QuantidadeDisponivelEstoquePrincipal": 0},
+    "stock_string": {"QuantidadeDisponivelEstoquePrincipal": "250"},
+    "stock_none": {"QuantidadeDisponivelEstoquePrincipal": None},
+    "weight_string": {"Peso": "1500"},
+    "weight_nan": {"Peso": math.nan},
+    "dimensions_empty": {"Altura": "", "Largura": None, "Profundidade": 0},
+    "dimensions_nan": {"Altura": math.nan},
+    "quantidade_present": {"quantidade": 7},
+}
+
+
+def _product(overrides):
+    product = {**BASE, **overrides}
+    return {key: value for key, value in product.items() if value is not _MISSING}
+
+
+_MISSING = object()
+MISSING_CASES = {
+    f"{field}_missing": {field: _MISSING}
+    for field in ("Ncm", "CorWebPrincipal", "PrecoVenda", "QuantidadeDisponivelEstoquePrincipal", "Peso",
+                  "Altura", "Largura", "Profundidade")
+}
+
+
+@pytest.mark.parametrize("overrides", [*CASES.values(), *MISSING_CASES.values()],
+                         ids=[*CASES, *MISSING_CASES])
+def test_single_product_matches_map_product(overrides):
+    product = _product(overrides)
+    assert map_products([product]) == [map_product(product)]
+
+
+def test_mixed_batch_matches_map_product():
+    # Columns missing from some rows become NaN in the frame
+    products = [_product(overrides) for overrides in [*CASES.values(), *MISSING_CASES.values()]]
+    assert map_products(products) == [map_product(product) for product in products]
+
+
+def test_records_match_dicts():
+    products = [_product(overrides) for overrides in [*CASES.values(), *MISSING_CASES.values()]]
+    records = [XbzProduct.from_dict(product) for product in products]
+    assert map_products(records) == [map_product(product) for product in products]
+
+
+UNMAPPABLE_CASES = {
+    "price_text": {"PrecoVenda": "abc"},
+    "stock_text": {"QuantidadeDisponivelEstoquePrincipal": "muitos"},
+    "weight_list": {"Peso": [12]},
+    "nome_missing": {"Nome": _MISSING},
+    "descricao_missing": {"Descricao": _MISSING},
+    "codigo_missing": {"CodigoComposto": _MISSING},
+}
+
+
+@pytest.mark.parametrize("overrides", UNMAPPABLE_CASES.values(), ids=UNMAPPABLE_CASES)
+def test_rows_map_product_rejects_are_none(overrides):
+    bad = _product(overrides)
+    with pytest.raises((KeyError, TypeError, ValueError)):
+        map_product(bad)
+    good = _product({})
+    assert map_products([good, bad, good]) == [map_product(good), None, map_product(good)]
+    assert map_products([XbzProduct.from_dict(bad)]) == [None]
+
+
+def test_types_of_pass_through_fields_are_kept():
+    product = _product({"Altura": 14, "quantidade": 7})
+    payload = map_products([product])[0]
+    assert type(payload["altura"]) is int
+    assert type(payload["quantidade_estoque"]) is int
+
+
+def test_empty_input():
+    assert map_products([]) == []
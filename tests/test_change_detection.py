@@ -0,0 +1,29 @@
+from app.utils.rate_limiter import TokenBucket
+
+
+def _update(omie_client, products):
+    omie_client.atualizar_produtos_existentes(products, limiter=TokenBucket(rate=500, burst=10))
+
+
+def test_unchanged_products_make_no_api_call(workdir, clients, fake_api):
+    omie_client, _ = clients
+    products = fake_api.xbz_catalog[:3]
+    _update(omie_client, products)
+    assert fake_api.stats["omie_requests"] == 3
+
+    _update(omie_client, products)
+    assert fake_api.stats["omie_requests"] == 3
+
+
+def test_only_changed_fields_are_sent(workdir, clients, fake_api):
+    omie_client, _ = clients
+    product = fake_api.xbz_catalog[0]
+    _update(omie_client, [product])
+    sent = []
+    omie_client._alterar_produto = lambda changes: sent.append(changes) or {"codigo_status": "0"}
+
+    _update(omie_client, [{**product, "QuantidadeDisponivelEstoquePrincipal": 4321, "PrecoVendaFormatado": "1,00"}])
+    assert len(sent) == 1
+    assert sent[0]["codigo_produto_integracao"] == product["CodigoComposto"]
+    assert sent[0]["quantidade_estoque"] == 4321
+    assert set(sent[0]) <= {"codigo_produto_integracao", "quantidade_estoque", "valor_unitario"}
@@ -0,0 +1,57 @@
+import time
+
+from app.core.preflight import Preflight
+from app.core.work_queue import WorkQueue
+from app.daemon import SyncDaemon
+
+
+class BrokenPreflight(Preflight):
+    """Raises an unexpected error for one product."""
+
+    def prepare(self, product, mapper=None):
+        if product.get("CodigoComposto") == "BROKEN-1":
+            raise RuntimeError("unexpected")
+        return super().prepare(product, mapper)
+
+
+def _wait_until_drained(daemon, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        counts = daemon.queue.counts()
+        if counts["done"] and not counts["pending"] and not counts["in_flight"]:
+            return counts
+        time.sleep(0.05)
+    raise AssertionError(f"queue not drained: {daemon.queue.counts()}")
+
+
+def test_writers_survive_failing_items(workdir, clients, fake_api, monkeypatch):
+    omie_client, xbz_client = clients
+    insert_product = omie_client.insert_product
+    codigo_error = fake_api.xbz_catalog[-1]["CodigoComposto"]
+
+    def flaky_insert(payload, governor=None):
+        if payload["codigo_produto_integracao"] == codigo_error:
+            raise ValueError("resposta inválida")
+        return insert_product(payload, governor=governor)
+
+    monkeypatch.setattr(omie_client, "insert_product", flaky_insert)
+    daemon = SyncDaemon(xbz_client, omie_client, rate_limit=500, rate_burst=10, workers=2, lot_size=0,
+                        refresh_seconds=1000, health_port=None, work_queue=WorkQueue(max_attempts=2),
+                        preflight=BrokenPreflight())
+    daemon.queue.enqueue([{"CodigoComposto": "BROKEN-1"}])
+    daemon.start()
+    try:
+        counts = _wait_until_drained(daemon)
+        health = daemon.health()
+    finally:
+        daemon.stop(timeout=5)
+
+    assert health["status"] == "ok"
+    assert counts["failed"] == 2
+    assert daemon.totals["inserted"] == 19
+    assert len(fake_api.omie_catalog) == 29
+    errors = dict(daemon.queue._conn.execute("SELECT codigo, last_error FROM items WHERE status = 'failed'"))
+    assert errors == {
+        "BROKEN-1": "mapping_error: RuntimeError: unexpected",
+        codigo_error: "exception: ValueError: resposta inválida",
+    }
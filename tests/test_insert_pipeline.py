@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+from app.core.insert_pipeline import response_status, run_insert_pipeline
+from app.utils.rate_limiter import TokenBucket
+
+
+def _products(count):
+    return [{"CodigoComposto": f"P{i:03d}"} for i in range(count)]
+
+
+def _mapper(product):
+    return {"codigo_produto_integracao": product["CodigoComposto"]}
+
+
+class FakeOmieClient:
+    """Records the calls and the highest number of concurrent requests."""
+
+    def __init__(self, latency=0.01, rate_limited_after=None):
+        self.latency = latency
+        self.rate_limited_after = rate_limited_after
+        self.sent = []
+        self.lots = []
+        self.times = []
+        self.max_concurrent = 0
+        self._concurrent = 0
+        self._lock = threading.Lock()
+
+    def _call(self, payloads):
+        with self._lock:
+            self._concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self._concurrent)
+            self.times.append(time.monotonic())
+            blocked = self.rate_limited_after is not None and len(self.sent) >= self.rate_limited_after
+            self.sent.extend(payload["codigo_produto_integracao"] for payload in payloads)
+        time.sleep(self.latency)
+        with self._lock:
+            self._concurrent -= 1
+        if blocked:
+            return [{"status": "rate_limited", "reason": "api_blocked"} for _ in payloads]
+        return [{"codigo_produto_integracao": payload["codigo_produto_integracao"], "codigo_status": "0"}
+                for payload in payloads]
+
+    def insert_product(self, payload, governor=None):
+        return self._call([payload])[0]
+
+    def upsert_products_batch(self, payloads, lot_size=50, limiter=None, governor=None):
+        self.lots.append(len(payloads))
+        return self._call(payloads)
+
+
+def _run(client, products, rate=1000, burst=100, max_inserts=1000, workers=4, **kwargs):
+    return list(run_insert_pipeline(client, products, TokenBucket(rate=rate, burst=burst), max_inserts,
+                                    workers=workers, mapper=_mapper, **kwargs))
+
+
+@pytest.mark.parametrize("lot_size", [None, 3])
+def test_every_product_is_reported_once(lot_size):
+    client = FakeOmieClient()
+    results = _run(client, _products(40), lot_size=lot_size)
+    codes = [product["CodigoComposto"] for product, _, _ in results]
+    assert sorted(codes) == [product["CodigoComposto"] for product in _products(40)]
+    assert sorted(client.sent) == sorted(codes)
+    for product, payload, response in results:
+        assert payload["codigo_produto_integracao"] == product["CodigoComposto"]
+        assert response["codigo_produto_integracao"] == product["CodigoComposto"]
+    assert client.max_concurrent <= 4
+
+
+def test_lots_use_one_token_each():
+    client = FakeOmieClient(latency=0)
+    started = time.monotonic()
+    _run(client, _products(10), rate=20, burst=1, workers=2, lot_size=5)
+    assert client.lots == [5, 5]
+    # Two lots: the second one waits for a single refill (1/20 s)
+    assert time.monotonic() - started < 0.5
+
+
+def test_requests_are_paced_by_the_token_bucket():
+    client = FakeOmieClient(latency=0)
+    _run(client, _products(11), rate=50, burst=1, workers=4)
+    assert len(client.sent) == 11
+    # One token up front, then one every 1/50 s
+    assert client.times[-1] - client.times[0] >= 10 / 50 * 0.9
+
+
+def test_max_inserts_caps_the_requests():
+    client = FakeOmieClient()
+    results = _run(client, _products(30), max_inserts=7)
+    assert len(client.sent) == 7
+    assert len(results) == 7
+
+
+def test_rate_limit_stops_the_pipeline():
+    client = FakeOmieClient(latency=0.02, rate_limited_after=5)
+    results = _run(client, _products(100), rate=200, burst=1, workers=2)
+    statuses = [response_status(response) for _, _, response in results]
+    assert "rate_limited" in statuses
+    # Only the requests already in flight when the block was seen are reported
+    assert len(client.sent) <= 5 + 2
+    assert len(results) == len(client.sent)
+    assert len({product["CodigoComposto"] for product, _, _ in results}) == len(results)
+
+
+def test_consumer_stopping_early_stops_sending():
+    client = FakeOmieClient(latency=0.01)
+    pipeline = run_insert_pipeline(client, _products(100), TokenBucket(rate=1000, burst=100), 1000, workers=2,
+                                   mapper=_mapper)
+    next(pipeline)
+    pipeline.close()
+    sent = len(client.sent)
+    time.sleep(0.05)
+    assert len(client.sent) == sent < 100
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from app.utils.json_stream import iter_json_array
+
+DOCUMENT = [
+    {"CodigoComposto": "04031-AZU", "Nome": "Caneta [azul], metálica", "PrecoVenda": 3.9},
+    {"CodigoComposto": "9001", "Nome": "Squeeze \"Sport\" 500ml – ação", "Ncm": None, "Ativo": True},
+    {"CodigoComposto": "9002", "Cores": ["AZUL", "VERDE"], "Dimensoes": {"Altura": 10, "Largura": 2.5}},
+    12345,
+    -0.5e3,
+    "texto com ] e , dentro",
+    [1, [2, 3]],
+    True,
+    None,
+]
+
+
+def _chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 100000])
+def test_matches_json_loads_for_any_chunk_size(size):
+    body = json.dumps(DOCUMENT, ensure_ascii=False, indent=1).encode("utf-8")
+    assert list(iter_json_array(_chunks(body, size))) == DOCUMENT
+
+
+def test_every_split_point():
+    body = json.dumps(DOCUMENT, ensure_ascii=False).encode("utf-8")
+    for split in range(1, len(body)):
+        assert list(iter_json_array([body[:split], body[split:]])) == DOCUMENT, split
+
+
+def test_multibyte_character_split_across_chunks():
+    body = json.dumps([{"Nome": "ação"}], ensure_ascii=False).encode("utf-8")
+    split = body.index("ç".encode("utf-8")) + 1
+    assert list(iter_json_array([body[:split], body[split:]])) == [{"Nome": "ação"}]
+
+
+def test_number_split_at_chunk_boundary():
+    assert list(iter_json_array([b"[12", b"34, 5", b"6]"])) == [1234, 56]
+
+
+@pytest.mark.parametrize("chunks, expected", [
+    ([b"[1", b"2.5e", b"3, 4]"], [12.5e3, 4]),
+    ([b"[12.", b"5e3 ,", b" 4]"], [12.5e3, 4]),
+    ([b"[-", b"12.5E+3\n, 4]"], [-12.5e3, 4]),
+    ([b"[12.5e+", b"3]", b"[7]"], [12.5e3]),
+])
+def test_number_split_across_two_reads(chunks, expected):
+    assert list(iter_json_array(chunks)) == expected
+
+
+def test_text_chunks_bom_and_whitespace():
+    assert list(iter_json_array(["﻿  [ ", "{\"a\": 1} ,\n", " {\"b\": 2}\n]  "])) == [{"a": 1}, {"b": 2}]
+
+
+def test_empty_array():
+    assert list(iter_json_array([b"[", b"]"])) == []
+
+
+def test_stops_at_closing_bracket():
+    assert list(iter_json_array([b"[1, 2]", b"ignored"])) == [1, 2]
+
+
+def test_not_an_array():
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'{"a": 1}']))
+
+
+@pytest.mark.parametrize("chunks", [[b"[1, 2"], [b'[{"a": 1}, {"b":'], [b""], []])
+def test_incomplete_array(chunks):
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunks))
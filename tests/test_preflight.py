@@ -0,0 +1,48 @@
+import pytest
+
+from app.core.preflight import Preflight, RejectionCache
+
+PRODUCT = {
+    "CodigoComposto": "04031-AZU",
+    "Nome": "Caneta Metálica",
+    "Descricao": "Caneta esferográfica metálica com clip.",
+    "CorWebPrincipal": "AZUL",
+    "Ncm": "9608.10.00",
+    "PrecoVenda": 3.9,
+    "QuantidadeDisponivelEstoquePrincipal": 1200,
+}
+
+
+@pytest.fixture
+def preflight(tmp_path):
+    preflight = Preflight(RejectionCache(str(tmp_path / "rejected_payloads.sqlite3")))
+    yield preflight
+    preflight.close()
+
+
+def test_valid_product_is_sent(preflight):
+    payload, rejection = preflight.prepare(PRODUCT)
+    assert rejection is None
+    assert payload["codigo_produto_integracao"] == "04031-AZU"
+
+
+@pytest.mark.parametrize("field", ["Nome", "Descricao", "CodigoComposto"])
+def test_product_that_cannot_be_mapped_is_held_back(preflight, field):
+    product = {key: value for key, value in PRODUCT.items() if key != field}
+    payload, rejection = preflight.prepare(product)
+    assert payload is None
+    assert rejection["reason"] == "invalid_payload"
+    assert field in rejection["message"]
+
+
+def test_invalid_payload_is_held_back(preflight):
+    payload, rejection = preflight.prepare({**PRODUCT, "Ncm": ""})
+    assert payload["ncm"] == ""
+    assert rejection["reason"] == "invalid_payload"
+
+
+def test_known_rejection_until_the_payload_changes(preflight):
+    payload, _ = preflight.prepare(PRODUCT)
+    preflight.record(payload, "error", {"status": "error", "reason": "client_error", "message": "NCM inexistente"})
+    assert preflight.prepare(PRODUCT)[1]["reason"] == "known_rejection"
+    assert preflight.prepare({**PRODUCT, "Ncm": "9608.20.00"})[1] is None
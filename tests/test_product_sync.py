@@ -0,0 +1,77 @@
+import csv
+
+import requests
+
+from app.core.journal import SyncJournal
+from app.core.product_sync import sync_products
+from app.core.rate_governor import RateGovernor
+from app.utils.rate_limiter import TokenBucket
+
+
+def _sync(clients, **kwargs):
+    omie_client, xbz_client = clients
+    settings = {"max_inserts": 100, "rate_limit": 500, "rate_burst": 10, **kwargs}
+    sync_products(token=None, cnpj=None, omie_app_key=None, omie_app_secret=None,
+                  xbz_client=xbz_client, omie_client=omie_client, **settings)
+
+
+def _governor():
+    return RateGovernor(TokenBucket(rate=50, burst=10))
+
+
+def test_failed_probe_does_not_record_a_block(workdir, clients, fake_api, monkeypatch):
+    omie_client, _ = clients
+
+    def timeout(*args, **kwargs):
+        raise requests.exceptions.ReadTimeout("read timed out")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(omie_client.transport, "post", timeout)
+        assert omie_client.check_api_status() == {"available": False, "blocked": False, "message": "read timed out"}
+    monkeypatch.setattr(omie_client, "check_api_status", lambda: {"available": False, "blocked": False,
+                                                                  "message": "read timed out"})
+    _sync(clients, rate_limit=50)
+    governor = _governor()
+    assert governor.blocked_remaining() == 0
+    assert governor.rate == 50
+    assert len(fake_api.omie_catalog) == 10
+
+
+def test_blocked_probe_records_the_block(workdir, clients, fake_api):
+    omie_client, _ = clients
+    fake_api.max_requests_per_second = 0
+    status = omie_client.check_api_status()
+    assert status["available"] is False and status["blocked"] is True
+
+    fake_api.max_requests_per_second = None
+    fake_api._blocked_until = 0
+    omie_client.check_api_status = lambda: status
+    _sync(clients)
+    assert _governor().blocked_remaining() > 0
+
+
+def _csv_codes(path):
+    with open(path, newline="", encoding="utf-8") as file:
+        return [row["codigo"] for row in csv.DictReader(file)]
+
+
+def test_interrupted_run_is_resumed_from_the_journal(workdir, clients, fake_api):
+    _sync(clients, max_inserts=3)
+    state = SyncJournal().load()
+    assert len(fake_api.omie_catalog) == 13
+    assert len(state.pending) == 17
+    skipped_before = _csv_codes("skipped_products.csv")
+    assert skipped_before
+
+    # Registered in OMIE by someone else meanwhile: the resumed run skips it through the API
+    registered = sorted(state.pending)[0]
+    fake_api._register(registered)
+
+    xbz_requests = fake_api.stats["xbz_requests"]
+    _sync(clients)
+    assert fake_api.stats["xbz_requests"] == xbz_requests
+    assert len(fake_api.omie_catalog) == 30
+    assert fake_api.stats["duplicates"] == 1
+    assert not SyncJournal().load().pending
+    # The skipped rows of the interrupted run are kept
+    assert _csv_codes("skipped_products.csv") == skipped_before + [registered]
@@ -0,0 +1,62 @@
+import pytest
+
+from app.clients.omie_client import report_to_governor
+from app.core.rate_governor import RateGovernor, parse_block_seconds
+from app.utils.rate_limiter import TokenBucket
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("Consumo redundante detectado. Tente novamente em 1800 segundos.", 1800),
+    ("Aguarde 30 minutos para fazer uma nova requisição", 30 * 60),
+    ("Bloqueado por 2 horas", 2 * 3600),
+    ("Tente novamente em 1 segundo", 1),
+    ("Tente novamente em 45 seg", 45),
+    ("Aguarde 10min", 600),
+    ("Bloqueio de 1h", 3600),
+    ("Tente novamente em 90s.", 90),
+    ("AGUARDE 5 MINUTOS", 300),
+])
+def test_parse_block_seconds(message, expected):
+    assert parse_block_seconds(message) == expected
+
+
+@pytest.mark.parametrize("message", [None, "", "API bloqueada por consumo indevido.", "Erro 500 no servidor"])
+def test_parse_block_seconds_without_wait_time(message):
+    assert parse_block_seconds(message) is None
+
+
+@pytest.fixture
+def governor(tmp_path):
+    return RateGovernor(TokenBucket(rate=1.0, burst=1), path=str(tmp_path / "rate_governor.json"))
+
+
+def test_failed_lot_slows_down_once(governor):
+    lot = [{"status": "error", "reason": "server_error", "message": "SOAP-ENV:Server"} for _ in range(50)]
+    report_to_governor(governor, lot)
+    assert governor.rate == pytest.approx(0.8)
+
+
+def test_clean_lot_counts_as_one_call(governor):
+    governor.limiter.set_rate(0.5)
+    report_to_governor(governor, [{"codigo_status": "0"} for _ in range(50)])
+    assert governor.rate == pytest.approx(0.5)
+    for _ in range(governor.increase_after - 1):
+        report_to_governor(governor, {"codigo_status": "0"})
+    assert governor.rate == pytest.approx(0.5 + governor.step)
+
+
+def test_blocked_lot_records_the_block(governor):
+    lot = [{"status": "rate_limited", "reason": "api_blocked", "message": "Tente novamente em 600 segundos"}] * 3
+    report_to_governor(governor, lot)
+    assert 590 < governor.blocked_remaining() <= 600
+    assert governor.rate == pytest.approx(0.5)
+
+
+def test_client_errors_do_not_change_the_rate(governor):
+    report_to_governor(governor, {"status": "error", "reason": "client_error", "message": "NCM inválido"})
+    assert governor.rate == pytest.approx(1.0)
+
+
+def test_without_governor_result_is_returned():
+    result = {"codigo_status": "0"}
+    assert report_to_governor(None, result) is result
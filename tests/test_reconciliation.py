@@ -0,0 +1,43 @@
+import math
+
+from app.core.reconciliation import reconcile
+from app.mappings.mapping import map_product
+
+XBZ = {
+    "CodigoComposto": "06520-AZU",
+    "Nome": "Garrafa Térmica",
+    "Descricao": "Garrafa térmica de inox.",
+    "CorWebPrincipal": "AZUL",
+    "Ncm": "7013.00.00",
+    "PrecoVenda": 20.0,
+    "QuantidadeDisponivelEstoquePrincipal": 300,
+}
+
+
+def test_omie_products_without_integration_code_are_only_counted():
+    omie = [
+        {"codigo_produto_integracao": "", "descricao": "Garrafa térmica"},
+        {"codigo_produto_integracao": None, "descricao": "KIT ONE"},
+        {"codigo_produto_integracao": math.nan, "descricao": "Caneca"},
+        {**map_product(XBZ), "quantidade_estoque": 300},
+        {"codigo_produto_integracao": "99999-PRE", "descricao": "Fora da XBZ"},
+    ]
+    result = reconcile([XBZ], omie)
+    summary = result.summary()
+    assert summary["sem_codigo_integracao"] == 3
+    assert summary["omie_total"] == 2
+    assert summary["in_sync"] == 1
+    assert result.orphaned_in_omie == ["99999-PRE"]
+    assert result.missing_in_omie == []
+
+
+def test_unmappable_xbz_products_are_reported_instead_of_raising():
+    bad = {**XBZ, "CodigoComposto": "06521-PRE", "PrecoVenda": "abc"}
+    omie = [{**map_product(XBZ), "quantidade_estoque": 300},
+            {"codigo_produto_integracao": "06521-PRE", "descricao": "Garrafa preta"}]
+    result = reconcile([XBZ, bad], omie)
+    summary = result.summary()
+    assert result.unmappable == ["06521-PRE"]
+    assert summary["xbz_total"] == 2 and summary["unmappable"] == 1
+    assert summary["in_sync"] == 1
+    assert result.orphaned_in_omie == [] and result.missing_in_omie == []
@@ -0,0 +1,73 @@
+import csv
+import gzip
+
+import pytest
+
+from app.utils.result_writer import SnapshotWriter
+
+ROWS = [
+    {"codigo": "A", "preco": None},
+    {"codigo": "B", "preco": None},
+    {"codigo": "C", "preco": 1.5, "cor": "AZUL"},
+    {"codigo": "D", "preco": "", "extra": {"k": 1}},
+    {"codigo": "E", "preco": 2},
+]
+
+
+def _write(tmp_path, format, rows=ROWS):
+    with SnapshotWriter(str(tmp_path / "snapshot"), chunk_rows=2, format=format) as writer:
+        for row in rows:
+            writer.write(row)
+    return writer
+
+
+def test_csv_snapshot_is_written_per_chunk_with_the_union_of_columns(tmp_path):
+    writer = _write(tmp_path, "csv.gz")
+    assert writer.count == len(ROWS)
+    with gzip.open(writer.path, "rt", newline="", encoding="utf-8") as file:
+        rows = list(csv.DictReader(file))
+    assert list(rows[0]) == ["codigo", "preco", "cor", "extra"]
+    assert [row["codigo"] for row in rows] == ["A", "B", "C", "D", "E"]
+    assert rows[2]["cor"] == "AZUL" and rows[0]["cor"] == ""
+    assert not (tmp_path / "snapshot.csv.gz.tmp").exists()
+
+
+def test_parquet_snapshot_keeps_types_and_nulls(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    writer = _write(tmp_path, "parquet", ROWS[:3] + ROWS[4:])
+    table = pq.read_table(writer.path)
+    assert table.column_names == ["codigo", "preco", "cor"]
+    assert table.column("preco").to_pylist() == [None, None, 1.5, 2.0]
+    assert table.column("cor").to_pylist() == [None, None, "AZUL", None]
+
+
+def test_parquet_mixed_column_falls_back_to_text(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    table = pq.read_table(_write(tmp_path, "parquet").path)
+    assert table.column("preco").to_pylist() == [None, None, "1.5", "", "2"]
+    assert table.column("codigo").to_pylist() == ["A", "B", "C", "D", "E"]
+
+
+@pytest.mark.parametrize("format", ["csv.gz", "parquet"])
+def test_empty_snapshot(tmp_path, format):
+    if format == "parquet":
+        pytest.importorskip("pyarrow")
+    writer = _write(tmp_path, format, [])
+    assert writer.count == 0
+    assert (tmp_path / f"snapshot.{format}").exists()
+
+
+@pytest.mark.parametrize("format", ["csv.gz", "parquet"])
+def test_reset_drops_rows_already_written(tmp_path, format):
+    pq = pytest.importorskip("pyarrow.parquet") if format == "parquet" else None
+    with SnapshotWriter(str(tmp_path / "snapshot"), chunk_rows=2, format=format) as writer:
+        for row in ROWS[:3]:
+            writer.write(row)
+        writer.reset()
+        writer.write({"codigo": "Z", "preco": 9.9})
+    assert writer.count == 1
+    if pq is not None:
+        assert pq.read_table(writer.path).to_pylist() == [{"codigo": "Z", "preco": 9.9}]
+    else:
+        with gzip.open(writer.path, "rt", newline="", encoding="utf-8") as file:
+            assert list(csv.DictReader(file)) == [{"codigo": "Z", "preco": "9.9"}]
@@ -0,0 +1,19 @@
+import pytest
+
+from app.core.shared_catalog import SharedCatalog
+from app.mappings.mapping import map_product
+
+PRODUCTS = [
+    {"CodigoComposto": "A", "Nome": "Caneta", "Descricao": "Caneta azul", "Ncm": "9608.10.00", "PrecoVenda": 3.9},
+    {"CodigoComposto": "B", "Nome": "Caneca", "Descricao": "Caneca branca", "Ncm": "6912.00.00", "PrecoVenda": "abc"},
+]
+
+
+def test_unmappable_product_is_kept_and_fails_like_map_product(tmp_path):
+    path = SharedCatalog.write(str(tmp_path / "catalog.jsonl"), PRODUCTS)
+    with SharedCatalog(path) as catalog:
+        products = list(catalog)
+        assert [product["CodigoComposto"] for product in products] == ["A", "B"]
+        assert catalog.payload_for(products[0]) == map_product(PRODUCTS[0])
+        with pytest.raises(ValueError):
+            catalog.payload_for(products[1])
@@ -0,0 +1,79 @@
+import pytest
+
+from app.clients.omie_client import UPSERT_REQUIRED_FIELDS
+from app.core import stock_price_sync
+from app.core.catalog_index import CatalogIndex
+from app.core.stock_price_sync import sync_stock_and_prices
+
+
+@pytest.fixture
+def catalog_index(workdir, fake_api):
+    index = CatalogIndex()
+    for codigo in fake_api.omie_catalog:
+        index.add(codigo)
+    yield index
+    index.close()
+
+
+@pytest.fixture
+def sent(clients, monkeypatch):
+    """The OMIE calls made, as (call, param)."""
+    omie_client, _ = clients
+    calls = []
+    post = omie_client.transport.post
+
+    def recording_post(url, json=None, **kwargs):
+        calls.append((json["call"], json["param"][0]))
+        return post(url, json=json, **kwargs)
+
+    monkeypatch.setattr(omie_client.transport, "post", recording_post)
+    return calls
+
+
+@pytest.fixture
+def events(monkeypatch):
+    logged = []
+    log_event = stock_price_sync.log_event
+
+    def recording_log_event(logger, level, message, /, **fields):
+        logged.append(fields)
+        log_event(logger, level, message, **fields)
+
+    monkeypatch.setattr(stock_price_sync, "log_event", recording_log_event)
+    return logged
+
+
+def _sync(clients, catalog_index):
+    omie_client, xbz_client = clients
+    return sync_stock_and_prices(xbz_client, omie_client, rate_limit=500, rate_burst=10, lot_size=4,
+                                 catalog_index=catalog_index)
+
+
+def test_lots_carry_the_required_fields_and_only_stock_and_price(clients, catalog_index, sent, fake_api):
+    assert _sync(clients, catalog_index) == 10
+    lots = [param for call, param in sent if call == "UpsertProdutosLote"]
+    assert len(lots) == 3
+    for record in (record for lot in lots for record in lot["produto_servico_cadastro"]):
+        assert set(record) == {*UPSERT_REQUIRED_FIELDS, "quantidade_estoque", "valor_unitario"}
+        assert all(record[field] for field in UPSERT_REQUIRED_FIELDS)
+        assert record["codigo"] == record["codigo_produto_integracao"]
+
+    sent.clear()
+    assert _sync(clients, catalog_index) == 0
+    assert sent == []
+
+
+def test_rejected_lots_are_resent_individually_and_counted(clients, catalog_index, sent, events, fake_api,
+                                                           monkeypatch):
+    handle_omie = fake_api.handle_omie
+
+    def reject_lots(request):
+        if request.get("call") == "UpsertProdutosLote":
+            return {"faultstring": "ERROR: Campo inválido.", "faultcode": "SOAP-ENV:Client-8"}, 500
+        return handle_omie(request)
+
+    monkeypatch.setattr(fake_api, "handle_omie", reject_lots)
+    assert _sync(clients, catalog_index) == 10
+    assert [call for call, _ in sent].count("AlterarProduto") == 10
+    summary = next(fields for fields in events if fields.get("event") == "stock_price_summary")
+    assert summary["updated"] == 10 and summary["sent_individually"] == 10
@@ -0,0 +1,106 @@
+import pytest
+
+from app.core.work_queue import WorkQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite3"), max_attempts=2)
+    yield queue
+    queue.close()
+
+
+def _product(codigo, **fields):
+    return {"CodigoComposto": codigo, "Nome": f"Produto {codigo}", **fields}
+
+
+def _codes(products):
+    return [product["CodigoComposto"] for product in products]
+
+
+def _row(queue, codigo):
+    return queue._conn.execute("SELECT status, attempts, last_error FROM items WHERE codigo = ?",
+                               (codigo,)).fetchone()
+
+
+def test_enqueue_adds_new_products_only(queue):
+    assert queue.enqueue([_product("A"), _product("B"), {"Nome": "sem código"}]) == 2
+    assert queue.enqueue([_product("B", Nome="novo nome"), _product("C")]) == 1
+    assert queue.counts() == {"pending": 3, "in_flight": 0, "done": 0, "failed": 0}
+    # Pending products get the latest XBZ data
+    assert {p["CodigoComposto"]: p["Nome"] for p in queue.claim(3)}["B"] == "novo nome"
+
+
+def test_claim_follows_priority_then_age(queue):
+    queue.enqueue([_product("A", preco=1), _product("B", preco=3), _product("C", preco=2)],
+                  priority=lambda product: product["preco"])
+    assert _codes(queue.claim(2)) == ["B", "C"]
+    assert queue.counts()["in_flight"] == 2
+    assert _codes(queue.claim(5)) == ["A"]
+    assert queue.claim(5) == []
+
+
+def test_complete_inserted_and_skipped(queue):
+    queue.enqueue([_product("A"), _product("B")])
+    queue.claim(2)
+    queue.complete("A", "inserted")
+    queue.complete("B", "skipped", "already_exists")
+    assert _row(queue, "A") == ("done", 1, None)
+    assert _row(queue, "B") == ("done", 1, "already_exists")
+
+
+def test_retryable_failure_is_retried_until_max_attempts(queue):
+    queue.enqueue([_product("A")])
+    queue.claim()
+    queue.complete("A", "failed", "timeout", "read timed out")
+    assert _row(queue, "A") == ("pending", 1, "timeout: read timed out")
+
+    assert _codes(queue.claim()) == ["A"]
+    queue.complete("A", "failed", "timeout", "read timed out")
+    assert _row(queue, "A")[:2] == ("failed", 2)
+    assert queue.claim() == []
+
+
+def test_permanent_failure_goes_straight_to_failed(queue):
+    queue.enqueue([_product("A")])
+    queue.claim()
+    queue.complete("A", "failed", "invalid_payload", "NCM ausente")
+    assert _row(queue, "A") == ("failed", 1, "invalid_payload: NCM ausente")
+
+
+def test_failed_product_is_retried_when_its_data_changes(queue):
+    queue.enqueue([_product("A")])
+    queue.claim()
+    queue.complete("A", "failed", "invalid_payload")
+    queue.enqueue([_product("A")])
+    assert _row(queue, "A")[0] == "failed"
+    queue.enqueue([_product("A", Nome="corrigido")])
+    assert _row(queue, "A")[:2] == ("pending", 0)
+
+
+def test_release_does_not_count_the_attempt(queue):
+    queue.enqueue([_product("A")])
+    queue.claim()
+    queue.release(["A"])
+    assert _row(queue, "A")[:2] == ("pending", 0)
+
+
+def test_recover_requeues_items_in_flight(tmp_path):
+    path = str(tmp_path / "queue.sqlite3")
+    queue = WorkQueue(path)
+    queue.enqueue([_product("A"), _product("B")])
+    queue.claim(2)
+    queue.close()
+
+    restarted = WorkQueue(path)
+    assert restarted.recover() == 2
+    assert sorted(_codes(restarted.claim(2))) == ["A", "B"]
+    restarted.close()
+
+
+def test_discard_only_touches_pending_items(queue):
+    queue.enqueue([_product("A"), _product("B")])
+    assert _codes(queue.claim()) == ["A"]
+    assert queue.discard(["A", "B", "Z"]) == 1
+    assert _row(queue, "B") == ("done", 0, "already_exists")
+    assert _row(queue, "A")[0] == "in_flight"
@@ -0,0 +1,143 @@
+import json
+import random
+
+import pytest
+import requests
+
+from app.clients.xbz_cache import XbzCatalogCache
+from app.clients.xbz_client import XBZClient
+from app.core.product_sync import sync_products
+from benchmarks.fake_server import fake_xbz_product
+
+
+def _body(count=3, seed=0):
+    rng = random.Random(seed)
+    return json.dumps([fake_xbz_product(i, rng) for i in range(count)]).encode("utf-8")
+
+
+class StubResponse:
+    def __init__(self, status_code=200, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Server Error")
+
+
+class StubTransport:
+    """Answers each GET with the next queued response (or raises it) and records the headers sent."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.headers = []
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        self.headers.append(headers or {})
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.fixture
+def cache(workdir):
+    return XbzCatalogCache(ttl=0)
+
+
+def _client(cache, *responses):
+    return XBZClient("token", "cnpj", transport=StubTransport(*responses), cache=cache)
+
+
+def _codes(products):
+    return [product["CodigoComposto"] for product in products]
+
+
+def test_200_stores_body_and_validators(cache):
+    body = _body()
+    client = _client(cache, StubResponse(200, body, {"ETag": '"v1"', "Last-Modified": "Sat, 17 Oct 2026 10:00:00 GMT"}))
+    products = client.get_products()
+    assert len(products) == 3
+    assert client.last_fetch_status == "changed"
+    assert client.transport.headers == [{}]
+    assert cache.load_body() == body
+    assert cache.validators() == {"If-None-Match": '"v1"', "If-Modified-Since": "Sat, 17 Oct 2026 10:00:00 GMT"}
+
+
+def test_304_is_served_from_the_cache(cache):
+    cache.store(_body(), etag='"v1"')
+    client = _client(cache, StubResponse(304))
+    products = client.get_products()
+    assert client.transport.headers == [{"If-None-Match": '"v1"'}]
+    assert client.last_fetch_status == "not_modified"
+    assert _codes(products) == _codes(json.loads(_body()))
+
+
+def test_same_content_without_validators_is_unchanged(cache):
+    cache.store(_body())
+    client = _client(cache, StubResponse(200, _body()))
+    client.get_products()
+    assert client.last_fetch_status == "unchanged"
+    client.transport.responses.append(StubResponse(200, _body(4)))
+    client.get_products()
+    assert client.last_fetch_status == "changed"
+
+
+@pytest.mark.parametrize("failure", [
+    StubResponse(503),
+    requests.exceptions.ConnectTimeout("connect timed out"),
+    StubResponse(200, b'[{"CodigoComposto": "truncad'),
+])
+def test_upstream_error_falls_back_to_the_cache(cache, failure):
+    cache.store(_body(), etag='"v1"')
+    client = _client(cache, failure)
+    products = client.get_products()
+    assert client.last_fetch_status == "fallback"
+    assert len(products) == 3
+    # The broken response did not replace the good copy
+    assert cache.load_body() == _body()
+
+
+def test_upstream_error_without_usable_cache_raises(workdir):
+    client = _client(XbzCatalogCache(ttl=0), StubResponse(503))
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get_products()
+
+    stale = XbzCatalogCache(ttl=0, max_stale=0)
+    stale.store(_body())
+    stale.meta["checked_at"] = "2000-01-01T00:00:00"
+    client = _client(stale, requests.exceptions.ConnectTimeout("connect timed out"))
+    with pytest.raises(requests.exceptions.ConnectTimeout):
+        client.get_products()
+
+
+def test_fresh_cache_skips_the_request(workdir):
+    cache = XbzCatalogCache(ttl=3600)
+    cache.store(_body())
+    client = _client(cache)
+    assert len(client.get_products()) == 3
+    assert client.last_fetch_status == "cached"
+    assert client.transport.headers == []
+
+
+def test_sync_stops_early_on_an_unchanged_processed_catalog(workdir, clients, fake_api):
+    omie_client, xbz_client = clients
+    xbz_client.cache = XbzCatalogCache(ttl=0)
+    settings = dict(token=None, cnpj=None, omie_app_key=None, omie_app_secret=None, max_inserts=100,
+                    rate_limit=500, rate_burst=10, xbz_client=xbz_client, omie_client=omie_client)
+    sync_products(**settings)
+    assert len(fake_api.omie_catalog) == 30
+    assert xbz_client.cache.is_processed()
+
+    omie_requests = fake_api.stats["omie_requests"]
+    sync_products(**settings)
+    assert xbz_client.last_fetch_status == "unchanged"
+    assert fake_api.stats["omie_requests"] == omie_requests
+
+    # A changed catalog is synced again
+    fake_api.xbz_catalog.append(fake_xbz_product(99, random.Random(1)))
+    sync_products(**settings)
+    assert xbz_client.last_fetch_status == "changed"
+    assert fake_api.stats["omie_requests"] > omie_requests
+    assert len(fake_api.omie_catalog) == 31